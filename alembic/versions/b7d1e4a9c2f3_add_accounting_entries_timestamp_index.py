@@ -0,0 +1,28 @@
+"""add timestamp index to accounting_entries
+
+Revision ID: b7d1e4a9c2f3
+Revises: e5f6c7a8d9b0
+Create Date: 2026-10-17 00:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = 'b7d1e4a9c2f3'
+down_revision: Union[str, None] = 'e5f6c7a8d9b0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('accounting_entries', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_accounting_entries_timestamp_scope',
+            ['timestamp', 'username', 'caller_name', 'project', 'model'],
+            unique=False,
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('accounting_entries', schema=None) as batch_op:
+        batch_op.drop_index('ix_accounting_entries_timestamp_scope')
@@ -57,17 +57,32 @@ class LLMAccounting:
         audit_backend: Optional[AuditBackend] = None,
         enforce_project_names: bool = False,
         enforce_user_names: bool = False,
+        track_rolling_usage_in_memory: bool = False,
+        cache_limit_headroom: bool = False,
+        cache_usage_queries: bool = False,
     ):
         """Initialize with optional backends.
 
         ``backend`` is used for accounting and quota operations. ``audit_backend``
         controls where audit log entries are stored.  If ``audit_backend`` is not
         provided, ``backend`` is used for both.
+
+        ``track_rolling_usage_in_memory`` lets rolling limits be checked against
+        usage tracked by this instance instead of querying the backend, and
+        ``cache_limit_headroom`` lets requests that fit each limit's remaining
+        quota skip usage queries, and ``cache_usage_queries`` reuses usage
+        query results until the next ``track_usage`` call. Only use them when
+        no other process writes usage to the same backend.
         """
 
         self.backend = backend or SQLiteBackend()
         self.audit_backend = audit_backend or self.backend
-        self.quota_service = QuotaService(self.backend)
+        self.quota_service = QuotaService(
+            self.backend,
+            track_rolling_usage_in_memory=track_rolling_usage_in_memory,
+            cache_limit_headroom=cache_limit_headroom,
+            cache_usage_queries=cache_usage_queries,
+        )
         self.project_name = project_name
         self.app_name = app_name
         self.user_name = user_name
@@ -151,6 +166,7 @@ class LLMAccounting:
             project=project if project is not None else self.project_name,  # Use instance default
         )
         self.backend.insert_usage(entry)
+        self.quota_service.record_usage(entry)
 
     def track_usage_with_remaining_limits(
         self,
@@ -231,6 +247,7 @@ class LLMAccounting:
         """Delete all usage entries from the backend"""
         self.backend._ensure_connected()
         self.backend.purge()
+        self.quota_service.clear_usage_window()
 
     def tail(self, n: int = 10) -> List[UsageEntry]:
         """Get the n most recent usage entries"""
@@ -1,9 +1,9 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
 
-from ..models.limits import LimitScope, LimitType, UsageLimitDTO
+from ..models.limits import LimitScope, LimitType, TimeInterval, UsageLimitDTO
 
 
 @dataclass
@@ -113,9 +113,31 @@ class UserRecord:
     last_disabled_at: Optional[datetime] = None
 
 
+class UsageQuerySpec(NamedTuple):
+    """Arguments of a single ``get_accounting_entries_for_quota`` call.
+
+    Specs are hashable, so identical usage queries collapse to one dictionary
+    key in ``get_accounting_entries_for_quota_batch`` results.
+    """
+
+    start_time: datetime
+    end_time: datetime
+    limit_type: LimitType
+    interval_unit: TimeInterval
+    model: Optional[str] = None
+    username: Optional[str] = None
+    caller_name: Optional[str] = None
+    project_name: Optional[str] = None
+    filter_project_null: Optional[bool] = None
+
+
 class TransactionalBackend(ABC):
     """Interface for transactional database operations."""
 
+    # Backends that answer get_accounting_entries_for_quota_batch in fewer
+    # roundtrips than one query per spec set this to True.
+    supports_batched_quota_queries: bool = False
+
     @abstractmethod
     def initialize(self) -> None:
         """Initialize the backend (create tables, etc.)"""
@@ -196,6 +218,20 @@ class TransactionalBackend(ABC):
         """Retrieve aggregated API request data for quota calculation."""
         pass
 
+    def get_accounting_entries_for_quota_batch(
+        self, specs: Sequence[UsageQuerySpec]
+    ) -> Dict[UsageQuerySpec, float]:
+        """Retrieve aggregated usage for several quota queries at once.
+
+        The default implementation issues one ``get_accounting_entries_for_quota``
+        call per distinct spec; backends can override it with a single query.
+        """
+        results: Dict[UsageQuerySpec, float] = {}
+        for spec in specs:
+            if spec not in results:
+                results[spec] = self.get_accounting_entries_for_quota(**spec._asdict())
+        return results
+
     @abstractmethod
     def insert_usage_limit(self, limit: UsageLimitDTO) -> None:
         """Insert a new usage limit entry."""
@@ -3,7 +3,7 @@ import os
 import psycopg2
 import psycopg2.extras
 import psycopg2.extensions
-from typing import Optional, List, Tuple, Dict, Any
+from typing import Optional, List, Sequence, Tuple, Dict, Any
 from datetime import datetime, timezone
 import json
 from pathlib import Path
@@ -11,7 +11,7 @@ from pathlib import Path
 from sqlalchemy import create_engine, inspect
 from llm_accounting.models.base import Base  # Corrected based on original
 
-from .base import BaseBackend, UsageEntry, UsageStats, AuditLogEntry, UserRecord
+from .base import BaseBackend, UsageEntry, UsageStats, AuditLogEntry, UserRecord, UsageQuerySpec
 from ..models.limits import UsageLimitDTO, LimitScope, LimitType
 from ..db_migrations import run_migrations, get_head_revision, stamp_db_head
 from ..version_cache import should_run_migrations, update_migration_cache_after_success
@@ -21,6 +21,7 @@ from .postgresql_backend_parts.schema_manager import SchemaManager
 from .postgresql_backend_parts.data_inserter import DataInserter
 from .postgresql_backend_parts.data_deleter import DataDeleter
 from .postgresql_backend_parts.query_executor import QueryExecutor
+from .postgresql_backend_parts.quota_reader import QUOTA_AGGREGATES
 from .postgresql_backend_parts.limit_manager import LimitManager
 from .postgresql_backend_parts.project_manager import ProjectManager
 from .postgresql_backend_parts.user_manager import UserManager
@@ -32,6 +33,7 @@ POSTGRES_MIGRATION_CACHE_PATH = "data/postgresql_migration_cache.json"
 
 class PostgreSQLBackend(BaseBackend):
     conn: Optional[psycopg2.extensions.connection] = None  # Retained for type hinting, but managed by ConnectionManager
+    supports_batched_quota_queries = True
 
     def __init__(self, postgresql_connection_string: Optional[str] = None):
         if postgresql_connection_string:
@@ -221,25 +223,49 @@ class PostgreSQLBackend(BaseBackend):
         if active_conn is None:
             raise ConnectionError("Database connection is not established.")
 
-        agg_field_map = {
-            LimitType.REQUESTS: "COUNT(*)",
-            LimitType.INPUT_TOKENS: "COALESCE(SUM(prompt_tokens), 0)",
-            LimitType.OUTPUT_TOKENS: "COALESCE(SUM(completion_tokens), 0)",
-            LimitType.COST: "COALESCE(SUM(cost), 0.0)",
-            # Add other limit types here if necessary
-        }
-        agg_field = agg_field_map.get(limit_type)
+        agg_field = QUOTA_AGGREGATES.get(limit_type)
         if agg_field is None:
             logger.error(f"Unsupported LimitType for quota aggregation: {limit_type}")
             raise ValueError(f"Unsupported LimitType for quota aggregation: {limit_type}")
 
         base_query = f"SELECT {agg_field} AS aggregated_value FROM accounting_entries"  # nosec B608
-        conditions: List[str] = []
-        params: List[Any] = []
+        conditions, params = self._quota_conditions(
+            start_time, model, username, caller_name, project_name, filter_project_null
+        )
+
+        query = base_query
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += ";"
+
+        try:
+            with active_conn.cursor() as cur:
+                cur.execute(query, tuple(params))
+                result = cur.fetchone()
+                return float(result[0]) if result and result[0] is not None else 0.0
+        except psycopg2.Error as e:
+            logger.error(f"Error getting accounting entries for quota (type: {limit_type.value}): {e}")
+            if active_conn and not active_conn.closed:
+                active_conn.rollback()
+            raise
+        except Exception as e:
+            logger.error(f"An unexpected error occurred getting accounting entries for quota (type: {limit_type.value}): {e}")
+            if active_conn and not active_conn.closed:
+                active_conn.rollback()
+            raise
 
+    @staticmethod
+    def _quota_conditions(
+            start_time: datetime,
+            model: Optional[str],
+            username: Optional[str],
+            caller_name: Optional[str],
+            project_name: Optional[str],
+            filter_project_null: Optional[bool]) -> Tuple[List[str], List[Any]]:
+        """WHERE conditions and their parameters for a quota aggregation."""
         # Always filter by start_time
-        conditions.append("timestamp >= %s")
-        params.append(start_time)
+        conditions: List[str] = ["timestamp >= %s"]
+        params: List[Any] = [start_time]
 
         filter_map = {
             "model_name": model,
@@ -260,27 +286,58 @@ class PostgreSQLBackend(BaseBackend):
             # otherwise the specific project_name filter takes precedence.
             if project_name is None:
                 conditions.append("project IS NOT NULL")
+        return conditions, params
+
+    def get_accounting_entries_for_quota_batch(
+            self, specs: Sequence[UsageQuerySpec]) -> Dict[UsageQuerySpec, float]:
+        """Aggregate usage for several quota queries in one roundtrip.
+
+        Each distinct spec becomes one ``SELECT`` tagged with its position; they
+        are combined with ``UNION ALL`` and the rows mapped back by that tag.
+        """
+        unique_specs = list(dict.fromkeys(specs))
+        if not unique_specs:
+            return {}
+        self._ensure_connected()
+        active_conn = self.connection_manager.conn
+        if active_conn is None:
+            raise ConnectionError("Database connection is not established.")
 
-        query = base_query
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
-        query += ";"
+        selects: List[str] = []
+        params: List[Any] = []
+        for spec_index, spec in enumerate(unique_specs):
+            agg_field = QUOTA_AGGREGATES.get(spec.limit_type)
+            if agg_field is None:
+                logger.error(f"Unsupported LimitType for quota aggregation: {spec.limit_type}")
+                raise ValueError(f"Unsupported LimitType for quota aggregation: {spec.limit_type}")
+            conditions, spec_params = self._quota_conditions(
+                spec.start_time, spec.model, spec.username, spec.caller_name, spec.project_name,
+                spec.filter_project_null,
+            )
+            selects.append(
+                f"SELECT {spec_index} AS spec_index, {agg_field} AS aggregated_value "  # nosec B608
+                f"FROM accounting_entries WHERE {' AND '.join(conditions)}"
+            )
+            params.extend(spec_params)
+        query = " UNION ALL ".join(selects) + ";"
 
+        results: Dict[UsageQuerySpec, float] = dict.fromkeys(unique_specs, 0.0)
         try:
             with active_conn.cursor() as cur:
                 cur.execute(query, tuple(params))
-                result = cur.fetchone()
-                return float(result[0]) if result and result[0] is not None else 0.0
+                for spec_index, value in cur.fetchall():
+                    results[unique_specs[spec_index]] = float(value) if value is not None else 0.0
         except psycopg2.Error as e:
-            logger.error(f"Error getting accounting entries for quota (type: {limit_type.value}): {e}")
+            logger.error(f"Error getting batched accounting entries for quota: {e}")
             if active_conn and not active_conn.closed:
                 active_conn.rollback()
             raise
         except Exception as e:
-            logger.error(f"An unexpected error occurred getting accounting entries for quota (type: {limit_type.value}): {e}")
+            logger.error(f"An unexpected error occurred getting batched accounting entries for quota: {e}")
             if active_conn and not active_conn.closed:
                 active_conn.rollback()
             raise
+        return results
 
     def execute_query(self, query: str) -> List[Dict[str, Any]]:
         self._ensure_connected()
@@ -1,13 +1,22 @@
 import logging
 import psycopg2
 import psycopg2.extras  # For RealDictCursor
-from typing import Optional, List, Any
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 
 from ...models.limits import LimitType
 
 logger = logging.getLogger(__name__)
 
+# Aggregate selected for each limit type.
+QUOTA_AGGREGATES: Dict[LimitType, str] = {
+    LimitType.REQUESTS: "COUNT(*)",
+    LimitType.INPUT_TOKENS: "COALESCE(SUM(prompt_tokens), 0)",
+    LimitType.OUTPUT_TOKENS: "COALESCE(SUM(completion_tokens), 0)",
+    LimitType.TOTAL_TOKENS: "COALESCE(SUM(total_tokens), 0)",
+    LimitType.COST: "COALESCE(SUM(cost), 0.0)",
+}
+
 
 class QuotaReader:
     def __init__(self, backend_instance):
@@ -46,14 +55,7 @@ class QuotaReader:
         self.backend._ensure_connected()
         assert self.backend.conn is not None  # Pylance: self.conn is guaranteed to be not None here.
 
-        agg_field_map = {
-            LimitType.REQUESTS: "COUNT(*)",
-            LimitType.INPUT_TOKENS: "COALESCE(SUM(prompt_tokens), 0)",
-            LimitType.OUTPUT_TOKENS: "COALESCE(SUM(completion_tokens), 0)",
-            LimitType.TOTAL_TOKENS: "COALESCE(SUM(total_tokens), 0)",
-            LimitType.COST: "COALESCE(SUM(cost), 0.0)",
-        }
-        agg_field = agg_field_map.get(limit_type)
+        agg_field = QUOTA_AGGREGATES.get(limit_type)
         if agg_field is None:
             logger.error(f"Unsupported LimitType for quota aggregation: {limit_type}")
             raise ValueError(f"Unsupported LimitType for quota aggregation: {limit_type}")
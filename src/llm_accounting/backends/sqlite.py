@@ -1,11 +1,11 @@
 import logging
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Dict, List, Optional, Sequence, Tuple, Any
 
 from sqlalchemy import text
 from ..models.limits import LimitScope, LimitType, UsageLimitDTO
-from .base import BaseBackend, UsageEntry, UsageStats, AuditLogEntry, UserRecord
+from .base import BaseBackend, UsageEntry, UsageQuerySpec, UsageStats, AuditLogEntry, UserRecord
 from .sqlite_utils import validate_db_filename
 from .sqlite_backend_parts.connection_manager import SQLiteConnectionManager
 from .sqlite_backend_parts.query_executor import SQLiteQueryExecutor
@@ -22,6 +22,8 @@ DEFAULT_DB_PATH = "data/accounting.sqlite"
 
 
 class SQLiteBackend(BaseBackend):
+    supports_batched_quota_queries = True
+
     def __init__(self, db_path: Optional[str] = None):
         actual_db_path = db_path if db_path is not None else DEFAULT_DB_PATH
         validate_db_filename(actual_db_path)
@@ -125,6 +127,12 @@ class SQLiteBackend(BaseBackend):
             conn, start_time, end_time, limit_type, interval_unit, model, username, caller_name, project_name, filter_project_null
         )
 
+    def get_accounting_entries_for_quota_batch(
+        self, specs: Sequence[UsageQuerySpec]
+    ) -> Dict[UsageQuerySpec, float]:
+        conn = self.connection_manager.get_connection()
+        return self.usage_manager.get_accounting_entries_for_quota_batch(conn, specs)
+
     def delete_usage_limit(self, limit_id: int) -> None:
         """Delete a usage limit entry by its ID."""
         self.limit_manager.delete_usage_limit(limit_id)
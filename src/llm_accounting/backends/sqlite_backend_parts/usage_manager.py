@@ -1,9 +1,10 @@
 import logging
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple, Any
-from sqlalchemy import text
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple, Any
+from sqlalchemy import TextClause, text
 from sqlalchemy.engine import Connection  # Import Connection for type hinting
-from ..base import UsageEntry, UsageStats
+from ..base import UsageEntry, UsageQuerySpec, UsageStats
 from ..sqlite_queries import (get_model_rankings_query, get_model_stats_query,
                               get_period_stats_query, insert_usage_query,
                               tail_query)
@@ -11,6 +12,81 @@ from llm_accounting.models.limits import LimitType
 
 logger = logging.getLogger(__name__)
 
+# SQLite caps the number of terms in a compound SELECT (500 by default), so
+# batched quota queries are split into chunks of at most this many specs.
+QUOTA_BATCH_MAX_QUERIES = 200
+
+# Aggregate expression per limit type. A batched quota query computes all of
+# them at once for every distinct (window, filters) combination.
+QUOTA_AGGREGATES: Dict[LimitType, str] = {
+    LimitType.REQUESTS: "COUNT(*)",
+    LimitType.INPUT_TOKENS: "SUM(prompt_tokens)",
+    LimitType.OUTPUT_TOKENS: "SUM(completion_tokens)",
+    LimitType.TOTAL_TOKENS: "SUM(total_tokens)",
+    LimitType.COST: "SUM(cost)",
+}
+
+# The same aggregates restricted to rows from a later window start, so windows
+# sharing their filters and end time can be summed in one scan.
+QUOTA_WINDOW_AGGREGATES: Dict[LimitType, str] = {
+    LimitType.REQUESTS: "COUNT(CASE WHEN timestamp >= :{start} THEN 1 END)",
+    LimitType.INPUT_TOKENS: "SUM(CASE WHEN timestamp >= :{start} THEN prompt_tokens END)",
+    LimitType.OUTPUT_TOKENS: "SUM(CASE WHEN timestamp >= :{start} THEN completion_tokens END)",
+    LimitType.TOTAL_TOKENS: "SUM(CASE WHEN timestamp >= :{start} THEN total_tokens END)",
+    LimitType.COST: "SUM(CASE WHEN timestamp >= :{start} THEN cost END)",
+}
+
+# Position of each limit type among the aggregate columns of one window.
+QUOTA_SCAN_COLUMN_INDEX: Dict[LimitType, int] = {
+    limit_type: index for index, limit_type in enumerate(QUOTA_AGGREGATES)
+}
+
+# Upper bound on the windows summed by one scan, keeping compound SELECT terms
+# well below SQLite's column limit.
+QUOTA_SCAN_MAX_WINDOWS = 32
+
+
+def _quota_timestamp(value: datetime) -> str:
+    """``value`` in the format usage timestamps are stored and compared in."""
+    return value.replace(tzinfo=None).strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+@lru_cache(maxsize=1024)
+def _quota_where_clause(
+    param_suffix: str,
+    filter_model: bool,
+    filter_username: bool,
+    filter_caller_name: bool,
+    filter_project: bool,
+    filter_project_null: Optional[bool],
+) -> str:
+    """WHERE clause of a quota query constraining the given columns.
+
+    The clause only depends on which filters are set, so it is built once
+    per combination and the values are bound as parameters.
+    """
+    conditions = [f"timestamp >= :start_time{param_suffix}", f"timestamp <= :end_time{param_suffix}"]
+    if filter_model:
+        conditions.append(f"model = :model{param_suffix}")
+    if filter_username:
+        conditions.append(f"username = :username{param_suffix}")
+    if filter_caller_name:
+        conditions.append(f"caller_name = :caller_name{param_suffix}")
+
+    if filter_project:
+        conditions.append(f"project = :project_name{param_suffix}")
+    elif filter_project_null is True:
+        conditions.append("project IS NULL")
+    elif filter_project_null is False:
+        conditions.append("project IS NOT NULL")
+    return " AND ".join(conditions)
+
+
+@lru_cache(maxsize=256)
+def _quota_statement(select_clause: str, where_clause: str) -> TextClause:
+    """Single quota query statement, reused so it is not rebuilt per call."""
+    return text(f"SELECT {select_clause} FROM accounting_entries WHERE {where_clause}")  # nosec B608
+
 # Removed first definition of SQLiteUsageManager and redundant Connection import
 
 
@@ -38,6 +114,48 @@ class SQLiteUsageManager:
     def tail(self, conn: Connection, n: int = 10) -> List[UsageEntry]:
         return tail_query(conn, n)
 
+    @staticmethod
+    def _build_quota_query(
+        start_time: datetime,
+        end_time: datetime,
+        limit_type: LimitType,
+        model: Optional[str],
+        username: Optional[str],
+        caller_name: Optional[str],
+        project_name: Optional[str],
+        filter_project_null: Optional[bool],
+        param_suffix: str = "",
+    ) -> Tuple[str, str, Dict[str, Any]]:
+        """Return the aggregate expression, WHERE clause and parameters of a quota query.
+
+        ``param_suffix`` is appended to every bind parameter name so several
+        queries can share one statement.
+        """
+        select_clause = QUOTA_AGGREGATES.get(limit_type)
+        if select_clause is None:
+            raise ValueError(f"Unknown limit type: {limit_type}")
+
+        filter_project = project_name is not None
+        where_clause = _quota_where_clause(
+            param_suffix, bool(model), bool(username), bool(caller_name), filter_project,
+            None if filter_project else filter_project_null,
+        )
+
+        params_dict: Dict[str, Any] = {
+            f"start_time{param_suffix}": _quota_timestamp(start_time),
+            f"end_time{param_suffix}": _quota_timestamp(end_time),
+        }
+        if model:
+            params_dict[f"model{param_suffix}"] = model
+        if username:
+            params_dict[f"username{param_suffix}"] = username
+        if caller_name:
+            params_dict[f"caller_name{param_suffix}"] = caller_name
+        if filter_project:
+            params_dict[f"project_name{param_suffix}"] = project_name
+
+        return select_clause, where_clause, params_dict
+
     def get_accounting_entries_for_quota(
         self,
         conn: Connection,
@@ -51,61 +169,85 @@ class SQLiteUsageManager:
         project_name: Optional[str] = None,
         filter_project_null: Optional[bool] = None,
     ) -> float:
-        if limit_type == LimitType.REQUESTS:
-            select_clause = "COUNT(*)"
-        elif limit_type == LimitType.INPUT_TOKENS:
-            select_clause = "SUM(prompt_tokens)"
-        elif limit_type == LimitType.OUTPUT_TOKENS:
-            select_clause = "SUM(completion_tokens)"
-        elif limit_type == LimitType.TOTAL_TOKENS:
-            select_clause = "SUM(total_tokens)"
-        elif limit_type == LimitType.COST:
-            select_clause = "SUM(cost)"
-        else:
-            raise ValueError(f"Unknown limit type: {limit_type}")
+        select_clause, where_clause, params_dict = self._build_quota_query(
+            start_time, end_time, limit_type, model, username, caller_name, project_name, filter_project_null
+        )
+        statement = _quota_statement(select_clause, where_clause)
 
-        end_time_operator = "<="
+        logger.debug("Executing SQL query: %s", statement)
+        logger.debug("With parameters: %s", params_dict)
 
-        query_base = f"SELECT {select_clause} FROM accounting_entries WHERE timestamp >= :start_time AND timestamp {end_time_operator} :end_time"  # nosec B608
-
-        params_dict: Dict[str, Any] = {
-            "start_time": start_time.replace(tzinfo=None).strftime('%Y-%m-%d %H:%M:%S.%f'),
-            "end_time": end_time.replace(tzinfo=None).strftime('%Y-%m-%d %H:%M:%S.%f')
-        }
-        conditions = []
+        result = conn.execute(statement, params_dict)
+        scalar_result = result.scalar_one_or_none()
 
-        if model:
-            conditions.append("model = :model")
-            params_dict["model"] = model
-        if username:
-            conditions.append("username = :username")
-            params_dict["username"] = username
-        if caller_name:
-            conditions.append("caller_name = :caller_name")
-            params_dict["caller_name"] = caller_name
+        logger.debug("Raw scalar result from DB: %s", scalar_result)
 
-        if project_name is not None:
-            conditions.append("project = :project_name")
-            params_dict["project_name"] = project_name
-        elif filter_project_null is True:
-            conditions.append("project IS NULL")
-        elif filter_project_null is False:
-            conditions.append("project IS NOT NULL")
+        final_result = float(scalar_result) if scalar_result is not None else 0.0
+        logger.debug("Returning final_result: %s for limit_type: %s, model: %s, username: %s, caller: %s, project: %s",
+                     final_result, limit_type.value, model, username, caller_name, project_name)
+        return final_result
 
-        if conditions:
-            query_base += " AND " + " AND ".join(conditions)
+    def get_accounting_entries_for_quota_batch(
+        self, conn: Connection, specs: Sequence[UsageQuerySpec]
+    ) -> Dict[UsageQuerySpec, float]:
+        """Answer several quota queries with one ``UNION ALL`` statement per chunk.
 
-        logger.debug(f"Executing SQL query: {query_base}")
-        logger.debug(f"With parameters: {params_dict}")
+        Specs that share their filters and end time share one scan: the
+        earliest window start bounds the scan and every aggregate is computed
+        for each distinct window start (limit type and interval unit do not
+        affect the query).
+        """
+        windows_by_scan: Dict[UsageQuerySpec, Dict[str, List[UsageQuerySpec]]] = {}
+        for spec in specs:
+            if spec.limit_type not in QUOTA_AGGREGATES:
+                raise ValueError(f"Unknown limit type: {spec.limit_type}")
+            scan = spec._replace(start_time=None, limit_type=LimitType.REQUESTS, interval_unit=None)
+            window_specs = windows_by_scan.setdefault(scan, {}).setdefault(_quota_timestamp(spec.start_time), [])
+            if spec not in window_specs:
+                window_specs.append(spec)
 
-        result = conn.execute(text(query_base), params_dict)
-        scalar_result = result.scalar_one_or_none()
+        # Each scan covers up to QUOTA_SCAN_MAX_WINDOWS window starts, earliest first
+        scans: List[Tuple[UsageQuerySpec, List[List[UsageQuerySpec]]]] = []
+        for scan, windows in windows_by_scan.items():
+            window_specs_by_start = [windows[start] for start in sorted(windows)]
+            for offset in range(0, len(window_specs_by_start), QUOTA_SCAN_MAX_WINDOWS):
+                scans.append((scan, window_specs_by_start[offset:offset + QUOTA_SCAN_MAX_WINDOWS]))
 
-        logger.debug(f"Raw scalar result from DB: {scalar_result}")
+        aggregates_per_window = len(QUOTA_AGGREGATES)
+        results: Dict[UsageQuerySpec, float] = {}
+        for offset in range(0, len(scans), QUOTA_BATCH_MAX_QUERIES):
+            chunk = scans[offset:offset + QUOTA_BATCH_MAX_QUERIES]
+            # Compound SELECT terms must have the same number of columns
+            window_count = max(len(window_specs_by_start) for _, window_specs_by_start in chunk)
+            selects = []
+            params_dict: Dict[str, Any] = {}
+            for index, (scan, window_specs_by_start) in enumerate(chunk):
+                earliest = window_specs_by_start[0][0]
+                _, where_clause, scan_params = self._build_quota_query(
+                    earliest.start_time, scan.end_time, scan.limit_type, scan.model, scan.username,
+                    scan.caller_name, scan.project_name, scan.filter_project_null, param_suffix=f"_{index}",
+                )
+                # The earliest window is the whole scan, so its aggregates need no condition
+                columns = list(QUOTA_AGGREGATES.values())
+                for window_index, window_specs in enumerate(window_specs_by_start[1:], start=1):
+                    start_param = f"window_start_{index}_{window_index}"
+                    scan_params[start_param] = _quota_timestamp(window_specs[0].start_time)
+                    columns.extend(aggregate.format(start=start_param) for aggregate in QUOTA_WINDOW_AGGREGATES.values())
+                columns.extend(["NULL"] * ((window_count - len(window_specs_by_start)) * aggregates_per_window))
+                selects.append(
+                    f"SELECT {index} AS scan_index, {', '.join(columns)} FROM accounting_entries WHERE {where_clause}"  # nosec B608
+                )
+                params_dict.update(scan_params)
 
-        final_result = float(scalar_result) if scalar_result is not None else 0.0
-        logger.debug(f"Returning final_result: {final_result} for limit_type: {limit_type.value}, model: {model}, username: {username}, caller: {caller_name}, project: {project_name}")
-        return final_result
+            query = " UNION ALL ".join(selects)
+            logger.debug("Executing batched quota query for %d scans", len(chunk))
+            for row in conn.execute(text(query), params_dict):
+                for window_index, window_specs in enumerate(chunk[row[0]][1]):
+                    first_column = 1 + window_index * aggregates_per_window
+                    for spec in window_specs:
+                        usage = row[first_column + QUOTA_SCAN_COLUMN_INDEX[spec.limit_type]]
+                        results[spec] = float(usage) if usage is not None else 0.0
+        return results
 
     def get_usage_costs(self, conn: Connection, user_id: str, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> float:
         query_base = "SELECT SUM(cost) FROM accounting_entries WHERE username = :user_id"
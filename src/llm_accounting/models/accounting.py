@@ -1,6 +1,6 @@
 from datetime import datetime, timezone
 
-from sqlalchemy import Column, DateTime, Float, Integer, String
+from sqlalchemy import DDL, Column, DateTime, Float, Integer, String, event
 
 from llm_accounting.models.base import Base
 
@@ -32,3 +32,15 @@ class AccountingEntry(Base):
             f"<AccountingEntry(id={self.id}, timestamp='{self.timestamp}', model='{self.model}', "
             f"project='{self.project}', cost={self.cost})>"
         )
+
+
+# Quota queries select a time range first and then filter on the scope columns.
+# Created with IF NOT EXISTS by an event listener, like the usage_limits indices.
+event.listen(
+    AccountingEntry.__table__,
+    "after_create",
+    DDL(
+        "CREATE INDEX IF NOT EXISTS ix_accounting_entries_timestamp_scope "
+        "ON accounting_entries (timestamp, username, caller_name, project, model)"
+    ).execute_if(dialect=("sqlite", "postgresql")),
+)
@@ -1,6 +1,7 @@
+import sys
 from datetime import datetime, timedelta, timezone
 from enum import Enum
-from typing import Optional
+from typing import Any, Dict, Optional
 from dataclasses import dataclass
 
 from sqlalchemy import Column, DateTime, Float, Integer, String, event, DDL
@@ -40,17 +41,26 @@ class TimeInterval(Enum):
     MONTH_ROLLING = "monthly_rolling"
 
     def is_rolling(self) -> bool:
-        return self in [
-            TimeInterval.SECOND_ROLLING,
-            TimeInterval.MINUTE_ROLLING,
-            TimeInterval.HOUR_ROLLING,
-            TimeInterval.DAY_ROLLING,
-            TimeInterval.WEEK_ROLLING,
-            TimeInterval.MONTH_ROLLING,
-        ]
+        return self in ROLLING_INTERVALS
 
 
-@dataclass
+# Hot paths test membership directly instead of calling ``is_rolling``.
+ROLLING_INTERVALS = frozenset({
+    TimeInterval.SECOND_ROLLING,
+    TimeInterval.MINUTE_ROLLING,
+    TimeInterval.HOUR_ROLLING,
+    TimeInterval.DAY_ROLLING,
+    TimeInterval.WEEK_ROLLING,
+    TimeInterval.MONTH_ROLLING,
+})
+
+
+# ``slots=True`` is only understood by dataclasses on Python 3.10+; older
+# interpreters fall back to a regular ``__dict__``-backed instance.
+_DATACLASS_SLOTS: Dict[str, Any] = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**_DATACLASS_SLOTS)
 class UsageLimitDTO:
     scope: str
     limit_type: str
@@ -2,33 +2,122 @@ import logging
 from typing import Optional, Tuple, Dict, List
 from datetime import datetime, timezone  # Import datetime and timezone
 
-from ..backends.base import TransactionalBackend
+from ..backends.base import TransactionalBackend, UsageEntry
 from ..models.limits import LimitScope, UsageLimitDTO
 
 from .quota_service_parts._cache_manager import QuotaServiceCacheManager
+from .quota_service_parts._headroom_cache import LimitHeadroomCache
 from .quota_service_parts._limit_evaluator import QuotaServiceLimitEvaluator
+from .quota_service_parts._rejection_stats import LimitRejectionStats
+from .quota_service_parts._usage_query_cache import UsageQueryCache
+from .quota_service_parts._usage_window import RollingUsageWindow
 
 logger = logging.getLogger(__name__)
 
 
 class QuotaService:
-    def __init__(self, backend: TransactionalBackend):
-        self.backend = backend
-        self.cache_manager = QuotaServiceCacheManager(backend)
-        self.limit_evaluator = QuotaServiceLimitEvaluator(backend)
+    __slots__ = (
+        "backend", "cache_manager", "limit_evaluator", "usage_window", "headroom_cache", "rejection_stats",
+        "usage_query_cache", "_denial_cache",
+    )
+
+    def __init__(
+        self,
+        backend: TransactionalBackend,
+        limits_ttl_seconds: Optional[float] = None,
+        track_rolling_usage_in_memory: bool = False,
+        cache_limit_headroom: bool = False,
+        refresh_limits_in_background: bool = False,
+        order_limits_by_rejections: bool = False,
+        cache_usage_queries: bool = False,
+    ) -> None:
+        """Create the service.
+
+        ``limits_ttl_seconds`` bounds how long cached limits are trusted before
+        they are reloaded from the backend; by default they are only reloaded
+        through ``refresh_limits_cache``. With ``refresh_limits_in_background``
+        a daemon thread reloads them every ``limits_ttl_seconds`` instead, so
+        quota checks never wait on the backend for limits; call ``close`` to
+        stop it.
+
+        With ``track_rolling_usage_in_memory``, usage passed to ``record_usage``
+        is kept in per-second buckets and rolling limits are evaluated from them
+        once their whole window has been observed. With ``cache_limit_headroom``,
+        each limit's remaining quota is remembered after evaluation and reduced
+        by recorded usage, and requests that fit every remaining quota skip the
+        usage queries. With ``cache_usage_queries``, usage query results are
+        reused until the next ``record_usage`` call. Only enable these options
+        when every usage entry is tracked through this service's process.
+
+        With ``order_limits_by_rejections``, limits that recently rejected
+        requests are evaluated first, and the most frequently rejecting one is
+        queried on its own before the rest are fetched, so denials usually need
+        a single usage query even on backends that batch them. A request
+        exceeding several limits is then reported against the most frequently
+        rejecting one instead of the most specific one.
+        """
+        self.backend: TransactionalBackend = backend
+        self.cache_manager: QuotaServiceCacheManager = QuotaServiceCacheManager(
+            backend, limits_ttl_seconds, refresh_in_background=refresh_limits_in_background
+        )
+        self.limit_evaluator: QuotaServiceLimitEvaluator = QuotaServiceLimitEvaluator(backend)
+        self.limit_evaluator.cache_manager = self.cache_manager
+        self.usage_window: Optional[RollingUsageWindow] = (
+            RollingUsageWindow() if track_rolling_usage_in_memory else None
+        )
+        self.limit_evaluator.usage_window = self.usage_window
+        self.headroom_cache: Optional[LimitHeadroomCache] = (
+            LimitHeadroomCache() if cache_limit_headroom else None
+        )
+        self.limit_evaluator.headroom_cache = self.headroom_cache
+        self.rejection_stats: Optional[LimitRejectionStats] = (
+            LimitRejectionStats() if order_limits_by_rejections else None
+        )
+        self.limit_evaluator.rejection_stats = self.rejection_stats
+        self.usage_query_cache: Optional[UsageQueryCache] = (
+            UsageQueryCache() if cache_usage_queries else None
+        )
+        self.limit_evaluator.usage_query_cache = self.usage_query_cache
         # Cache for storing recent denials and their retry-after timestamps
         # Key: tuple of (model, username, caller_name, project_name)
         # Value: tuple of (reason_message, reset_timestamp_utc)
         self._denial_cache: Dict[Tuple[Optional[str], Optional[str], Optional[str], Optional[str]], Tuple[str, datetime]] = {}
         self._denial_cache = {}  # Ensure it's empty on initialization
-        logger.info(f"QuotaService initialized. _denial_cache is empty: {not bool(self._denial_cache)}")
+        logger.info("QuotaService initialized. _denial_cache is empty: %s", not bool(self._denial_cache))
 
     def refresh_limits_cache(self) -> None:
         """Refreshes the limits cache from the backend and clears the denial cache."""
         self.cache_manager.refresh_limits_cache()
         self._denial_cache.clear()  # Clear the denial cache
+        if self.headroom_cache is not None:
+            self.headroom_cache.clear()
         logger.info("Denial cache cleared due to limits cache refresh.")
 
+    def close(self) -> None:
+        """Stops the background limits refresh, if enabled."""
+        self.cache_manager.stop_background_refresh()
+
+    def record_usage(self, entry: UsageEntry) -> None:
+        """Feeds a tracked usage entry to the in-memory usage state, if enabled."""
+        usage_query_cache = self.usage_query_cache
+        if usage_query_cache is not None:
+            usage_query_cache.invalidate()
+        usage_window = self.usage_window
+        if usage_window is not None:
+            usage_window.record(entry, self.cache_manager.max_rolling_window_seconds)
+        headroom_cache = self.headroom_cache
+        if headroom_cache is not None:
+            headroom_cache.consume(entry)
+
+    def clear_usage_window(self) -> None:
+        """Discards in-memory usage state, e.g. after usage data was purged."""
+        if self.usage_window is not None:
+            self.usage_window.reset()
+        if self.headroom_cache is not None:
+            self.headroom_cache.clear()
+        if self.usage_query_cache is not None:
+            self.usage_query_cache.invalidate()
+
     def refresh_projects_cache(self) -> None:
         """Refreshes the projects cache from the backend."""
         self.cache_manager.refresh_projects_cache()
@@ -126,13 +215,18 @@ class QuotaService:
         completion_tokens: int = 0,
         cost: float = 0.0,
     ) -> List[Tuple[UsageLimitDTO, float]]:
-        """Return remaining quota for all limits applicable to the request."""
-        if self.cache_manager.limits_cache is None:
-            self.cache_manager._load_limits_from_backend()
+        """Return remaining quota for all limits applicable to the request.
 
+        Limits are taken from the per-fingerprint applicable-limits index, so the
+        result is ordered most specific first. All limits are evaluated as of
+        the same moment.
+        """
+        limits = self._get_applicable_limits(model, username, caller_name, project_name)
+        calculate_remaining = self.limit_evaluator.calculate_remaining_after_usage
         remaining_info: List[Tuple[UsageLimitDTO, float]] = []
-        for limit in self.cache_manager.limits_cache:
-            remaining = self.limit_evaluator.calculate_remaining_after_usage(
+        now = datetime.now(timezone.utc)
+        for limit in limits:
+            remaining = calculate_remaining(
                 limit,
                 model,
                 username,
@@ -141,11 +235,39 @@ class QuotaService:
                 input_tokens,
                 completion_tokens,
                 cost,
+                now=now,
             )
             if remaining is not None:
                 remaining_info.append((limit, remaining))
         return remaining_info
 
+    def _get_applicable_limits(
+        self,
+        model: Optional[str],
+        username: Optional[str],
+        caller_name: Optional[str],
+        project_name: Optional[str],
+    ) -> List[UsageLimitDTO]:
+        """Return the cached limits applying to a request, most specific first.
+
+        The filtered and sorted list is memoized per request fingerprint in the
+        cache manager's ``applicable_limits_index`` so repeated requests with the
+        same (model, username, caller_name, project_name) skip filtering and
+        sorting entirely. Every reload of the limits starts a fresh index.
+        """
+        cache_manager = self.cache_manager
+        if cache_manager.maybe_refresh_limits():
+            # Denials were computed against the previous limits. Headroom is
+            # tied to the previous limit objects and would be ignored anyway;
+            # clearing it just frees the entries.
+            self._denial_cache.clear()
+            if self.headroom_cache is not None:
+                self.headroom_cache.clear()
+
+        return cache_manager.applicable_limits(
+            model, username, caller_name, project_name, self.limit_evaluator._should_skip_limit
+        )
+
     # --- Enhanced Check Methods ---
 
     def check_quota_enhanced(
@@ -166,16 +288,21 @@ class QuotaService:
         ``self._denial_cache``. Subsequent requests hit the cache and return the
         cached denial until the stored timestamp expires. The cache therefore
         acts as a TTL store keyed by ``(model, username, caller_name,
-        project_name)`` so we avoid redundant backend queries while the caller
-        must wait anyway.
+        project_name)`` so we avoid redundant
+        backend queries while the caller must wait anyway.
+
+        The current time is only read when it is actually needed: to compare
+        against a cached denial or to compute ``retry_after`` for a new one.
         """
         # Generate a cache key from the request parameters
         cache_key = (model, username, caller_name, project_name)
-        now = datetime.now(timezone.utc)
+        denial_cache = self._denial_cache
 
         # 1. Check cache first
-        if cache_key in self._denial_cache:
-            cached_reason, cached_reset_timestamp = self._denial_cache[cache_key]
+        cached_denial = denial_cache.get(cache_key)
+        if cached_denial is not None:
+            cached_reason, cached_reset_timestamp = cached_denial
+            now = datetime.now(timezone.utc)
 
             # Calculate remaining retry_after time
             remaining_seconds = max(0, int((cached_reset_timestamp - now).total_seconds()))
@@ -185,31 +312,25 @@ class QuotaService:
                 return False, cached_reason, remaining_seconds
             else:
                 # Cache expired, remove it. Then, proceed to re-evaluate limits.
-                del self._denial_cache[cache_key]
+                del denial_cache[cache_key]
                 # Continue to re-evaluate limits after cache expiration
 
-        # Ensure cache is loaded before starting checks
-        if self.cache_manager.limits_cache is None:
-            self.cache_manager._load_limits_from_backend()
-
-        # Pass all limits from the cache to the evaluator, which handles filtering
-        all_applicable_limits = sorted(
-            self.cache_manager.limits_cache,
-            key=lambda limit_dto: sum(
-                1
-                for v in [limit_dto.model, limit_dto.username, limit_dto.caller_name, limit_dto.project_name]
-                if v in (None, "*")
-            ),
-        )
+        all_applicable_limits = self._get_applicable_limits(model, username, caller_name, project_name)
+        if not all_applicable_limits:
+            # Nothing can deny the request; skip the evaluator call entirely
+            return True, None, None
 
-        # Evaluate all collected limits at once
-        allowed, reason, reset_timestamp = self.limit_evaluator._evaluate_limits_enhanced(
-            all_applicable_limits, model, username, caller_name, project_name, input_tokens, cost, completion_tokens
+        evaluator = self.limit_evaluator
+        allowed, reason, reset_timestamp = evaluator._evaluate_limits_enhanced(
+            all_applicable_limits, model, username, caller_name, project_name, input_tokens, cost, completion_tokens,
+            limits_prefiltered=True,
         )
 
         if not allowed:
-            if reset_timestamp:
-                self._denial_cache[cache_key] = (reason, reset_timestamp)
+            now = datetime.now(timezone.utc)
+            retry_after_seconds: int
+            if reset_timestamp and reason is not None:
+                denial_cache[cache_key] = (reason, reset_timestamp)
                 retry_after_seconds = max(0, int((reset_timestamp - now).total_seconds()))
             else:
                 retry_after_seconds = 0
@@ -217,192 +338,3 @@ class QuotaService:
                 self.backend.log_quota_rejection(session, reason, created_at=now)
             return False, reason, retry_after_seconds
         return True, None, None
-
-    # TODO: Vulture - Dead code? Verify if used externally or planned for future use before removing.
-    # def _check_global_limits_enhanced(
-    #     self,
-    #     model: Optional[str],
-    #     username: Optional[str],
-    #     caller_name: Optional[str],
-    #     input_tokens: int,
-    #     cost: float,
-    #     completion_tokens: int,
-    #     project_name: Optional[str],
-    # ) -> Tuple[bool, Optional[str], Optional[int]]:
-    #     limits_to_evaluate = [
-    #         limit for limit in self.cache_manager.limits_cache if
-    #         LimitScope(limit.scope) == LimitScope.GLOBAL
-    #     ]
-    #     return self.limit_evaluator._evaluate_limits_enhanced(
-    #         limits_to_evaluate, model, username, caller_name, project_name, input_tokens, cost, completion_tokens
-    #     )
-
-    # TODO: Vulture - Dead code? Verify if used externally or planned for future use before removing.
-    # def _check_model_limits_enhanced(
-    #     self,
-    #     model: Optional[str],
-    #     username: Optional[str],
-    #     caller_name: Optional[str],
-    #     input_tokens: int,
-    #     cost: float,
-    #     completion_tokens: int,
-    #     project_name: Optional[str],
-    # ) -> Tuple[bool, Optional[str], Optional[int]]:
-    #     if not model:
-    #         return True, None, None
-    #
-    #     limits_to_evaluate = [
-    #         limit
-    #         for limit in self.cache_manager.limits_cache
-    #         if LimitScope(limit.scope) == LimitScope.MODEL
-    #         and (
-    #             limit.model == model
-    #             or limit.model == "*"
-    #             or limit.model is None
-    #         )
-    #     ]
-    #     limits_to_evaluate.sort(
-    #         key=lambda limit_dto: 1 if limit_dto.model in (None, "*") else 0
-    #     )
-    #     return self.limit_evaluator._evaluate_limits_enhanced(limits_to_evaluate, model, username, caller_name, project_name, input_tokens, cost, completion_tokens)
-
-    # TODO: Vulture - Dead code? Verify if used externally or planned for future use before removing.
-    # def _check_project_limits_enhanced(
-    #     self,
-    #     model: Optional[str],
-    #     username: Optional[str],
-    #     caller_name: Optional[str],
-    #     input_tokens: int,
-    #     cost: float,
-    #     completion_tokens: int,
-    #     project_name: Optional[str],
-    # ) -> Tuple[bool, Optional[str], Optional[int]]:
-    #     if not project_name:
-    #         return True, None, None
-    #
-    #     limits_to_evaluate = [
-    #         limit
-    #         for limit in self.cache_manager.limits_cache
-    #         if LimitScope(limit.scope) == LimitScope.PROJECT
-    #         and (
-    #             (limit.project_name == project_name)
-    #             or limit.project_name == "*"
-    #             or (limit.project_name is None and project_name is None)
-    #         )
-    #     ]
-    #     limits_to_evaluate.sort(
-    #         key=lambda limit_dto: 1 if limit_dto.project_name in (None, "*") else 0
-    #     )
-    #     return self.limit_evaluator._evaluate_limits_enhanced(limits_to_evaluate, model, username, caller_name, project_name, input_tokens, cost, completion_tokens)
-
-    # TODO: Vulture - Dead code? Verify if used externally or planned for future use before removing.
-    # def _check_user_limits_enhanced(
-    #     self,
-    #     model: Optional[str],
-    #     username: Optional[str],
-    #     caller_name: Optional[str],
-    #     input_tokens: int,
-    #     cost: float,
-    #     completion_tokens: int,
-    #     project_name: Optional[str],
-    # ) -> Tuple[bool, Optional[str], Optional[int]]:
-    #     if not username:
-    #         return True, None, None
-    #
-    #     limits_to_evaluate = [
-    #         limit
-    #         for limit in self.cache_manager.limits_cache
-    #         if LimitScope(limit.scope) == LimitScope.USER
-    #         and (
-    #             limit.username == username
-    #             or limit.username == "*"
-    #             or limit.username is None
-    #         )
-    #     ]
-    #     limits_to_evaluate.sort(
-    #         key=lambda limit_dto: 1 if limit_dto.username in (None, "*") else 0
-    #     )
-    #     return self.limit_evaluator._evaluate_limits_enhanced(
-    #         limits_to_evaluate, model, username, caller_name, project_name, input_tokens, cost, completion_tokens
-    #     )
-
-    # TODO: Vulture - Dead code? Verify if used externally or planned for future use before removing.
-    # def _check_caller_limits_enhanced(
-    #     self,
-    #     model: Optional[str],
-    #     username: Optional[str],  # This username is for the request, not the limit's username field here.
-    #     caller_name: Optional[str],
-    #     input_tokens: int,
-    #     cost: float,
-    #     completion_tokens: int,
-    #     project_name: Optional[str],
-    # ) -> Tuple[bool, Optional[str], Optional[int]]:
-    #     if not caller_name:
-    #         return True, None, None
-    #
-    #     # For CALLER scope limits that are *not* specific to a user (i.e., limit.username is None)
-    #     limits_to_evaluate = [
-    #         limit
-    #         for limit in self.cache_manager.limits_cache
-    #         if LimitScope(limit.scope) == LimitScope.CALLER
-    #         and (
-    #             limit.caller_name == caller_name
-    #             or limit.caller_name == "*"
-    #             or limit.caller_name is None
-    #         )
-    #         and limit.username is None
-    #     ]
-    #     limits_to_evaluate.sort(
-    #         key=lambda limit_dto: 1 if limit_dto.caller_name in (None, "*") else 0
-    #     )
-    #     return self.limit_evaluator._evaluate_limits_enhanced(
-    #         limits_to_evaluate,
-    #         model,
-    #         username,
-    #         caller_name,
-    #         project_name,
-    #         input_tokens,
-    #         cost,
-    #         completion_tokens,
-    #         limit_scope_for_message=f"CALLER (caller: {caller_name})",
-    #     )
-
-    # TODO: Vulture - Dead code? Verify if used externally or planned for future use before removing.
-    # def _check_user_caller_limits_enhanced(
-    #     self,
-    #     model: Optional[str],
-    #     username: Optional[str],
-    #     caller_name: Optional[str],
-    #     input_tokens: int,
-    #     cost: float,
-    #     completion_tokens: int,
-    #     project_name: Optional[str],
-    # ) -> Tuple[bool, Optional[str], Optional[int]]:
-    #     if not username or not caller_name:
-    #         return True, None, None
-
-    #     # For CALLER scope limits that *are* specific to a user (limit.username is not None)
-    #     limits_to_evaluate = [
-    #         limit
-    #         for limit in self.cache_manager.limits_cache
-    #         if LimitScope(limit.scope) == LimitScope.CALLER
-    #         and (
-    #             limit.username == username
-    #             or limit.username == "*"
-    #             or limit.username is None
-    #         )
-    #         and (
-    #             limit.caller_name == caller_name
-    #             or limit.caller_name == "*"
-    #             or limit.caller_name is None
-    #         )
-    #     ]
-    #     limits_to_evaluate.sort(
-    #         key=lambda limit_dto: (
-    #             1 if limit_dto.username in (None, "*") else 0,
-    #             1 if limit_dto.caller_name in (None, "*") else 0,
-    #         )
-    #     )
-    #     return self.limit_evaluator._evaluate_limits_enhanced(
-    #         limits_to_evaluate, model, username, caller_name, project_name, input_tokens, cost, completion_tokens
-    #     )
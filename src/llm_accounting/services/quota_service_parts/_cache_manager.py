@@ -1,21 +1,389 @@
-from typing import Optional, List
+import logging
+import threading
+import time
+import weakref
+from collections import defaultdict
+from functools import lru_cache
+from itertools import count, product
+from typing import Callable, DefaultDict, Dict, NamedTuple, Optional, List, Tuple
+
+from cachetools import LRUCache
+
 from ...backends.base import TransactionalBackend
-from ...models.limits import UsageLimitDTO
+from ...models.limits import LimitScope, LimitType, TimeInterval, UsageLimitDTO
+from ._usage_window import UsageFilter, rolling_window_seconds
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on the number of distinct request fingerprints whose applicable
+# limits are memoized between limit refreshes.
+APPLICABLE_LIMITS_INDEX_SIZE = 1024
+
+RequestFingerprint = Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]
+
+# Position of each limit type's request value in the tuple
+# (1, input_tokens, completion_tokens, input_tokens + completion_tokens, cost)
+# the evaluator builds once per request.
+REQUEST_VALUE_INDEX = {
+    LimitType.REQUESTS: 0,
+    LimitType.INPUT_TOKENS: 1,
+    LimitType.OUTPUT_TOKENS: 2,
+    LimitType.TOTAL_TOKENS: 3,
+    LimitType.COST: 4,
+}
+
+
+@lru_cache(maxsize=None)
+def _scope_of(scope: str) -> LimitScope:
+    return LimitScope(scope)
+
+
+@lru_cache(maxsize=None)
+def _limit_type_of(limit_type: str) -> LimitType:
+    return LimitType(limit_type)
+
+
+@lru_cache(maxsize=None)
+def _interval_unit_of(interval_unit: str) -> TimeInterval:
+    return TimeInterval(interval_unit)
+
+
+def _match_key(limit: UsageLimitDTO, scope_enum: LimitScope) -> RequestFingerprint:
+    """Index key of ``limit``: its constrained dimensions, with wildcards as None.
+
+    GLOBAL limits apply to every request regardless of their fields.
+    """
+    if scope_enum == LimitScope.GLOBAL:
+        return (None, None, None, None)
+    model, username, caller_name, project_name = limit.model, limit.username, limit.caller_name, limit.project_name
+    return (
+        None if model == "*" else model or None,
+        None if username == "*" else username or None,
+        None if caller_name == "*" else caller_name or None,
+        None if project_name == "*" else project_name or None,
+    )
+
+
+def _match_mask(limit: UsageLimitDTO, scope_enum: LimitScope) -> Tuple[bool, bool, bool, bool]:
+    """Which request dimensions ``limit`` constrains, aligned with its match key.
+
+    A PROJECT limit without a project constrains the request's project to None,
+    which its match key already holds.
+    """
+    if scope_enum == LimitScope.GLOBAL:
+        return (False, False, False, False)
+    model, username, caller_name, project_name = _match_key(limit, scope_enum)
+    return (
+        model is not None,
+        username is not None,
+        caller_name is not None,
+        project_name is not None or (scope_enum == LimitScope.PROJECT and limit.project_name is None),
+    )
+
+
+def _usage_query_filter(limit: UsageLimitDTO, limit_scope_enum: LimitScope) -> UsageFilter:
+    """(model, username, caller_name, project_name, filter_project_null) to sum ``limit``'s usage over."""
+    final_usage_query_model: Optional[str] = None
+    final_usage_query_username: Optional[str] = None
+    final_usage_query_caller_name: Optional[str] = None
+    final_usage_query_project_name: Optional[str] = None
+    final_usage_query_filter_project_null: Optional[bool] = None
+
+    if limit_scope_enum != LimitScope.GLOBAL:
+        if limit.model is not None and limit.model != "*":
+            final_usage_query_model = limit.model
+        if limit.username is not None and limit.username != "*":
+            final_usage_query_username = limit.username
+        if limit.caller_name is not None and limit.caller_name != "*":
+            final_usage_query_caller_name = limit.caller_name
+
+        if limit.project_name is not None and limit.project_name != "*":
+            final_usage_query_project_name = limit.project_name
+        elif limit_scope_enum == LimitScope.PROJECT and limit.project_name is None:
+            # Only filter for NULL project if the limit is specifically a PROJECT scope limit with no project_name
+            final_usage_query_filter_project_null = True
+        # If it's not a PROJECT scope limit, but project_name is None on the limit,
+        # it means this limit applies regardless of the request's project (unless project_name is specified on limit).
+        # If project_name is '*' on the limit, it also applies regardless of request's project.
+        # These cases are implicitly handled by not setting final_usage_query_project_name,
+        # thus not filtering by project in the consuming query.
+
+    return (final_usage_query_model, final_usage_query_username, final_usage_query_caller_name,
+            final_usage_query_project_name, final_usage_query_filter_project_null)
+
+
+def _user_scope_message(limit: UsageLimitDTO) -> str:
+    return f"USER (user: {limit.username})" if limit.username else "USER"
+
+
+def _model_scope_message(limit: UsageLimitDTO) -> str:
+    return f"MODEL (model: {limit.model})" if limit.model else "MODEL"
+
+
+def _caller_scope_message(limit: UsageLimitDTO) -> str:
+    if limit.username and limit.caller_name:
+        return f"CALLER (user: {limit.username}, caller: {limit.caller_name})"
+    return f"CALLER (caller: {limit.caller_name})" if limit.caller_name else "CALLER"
+
+
+def _project_scope_message(limit: UsageLimitDTO) -> str:
+    return f"PROJECT (project: {limit.project_name})" if limit.project_name else "PROJECT (no project)"
+
+
+_SCOPE_MESSAGE_FNS: Dict[str, Callable[[UsageLimitDTO], str]] = {
+    LimitScope.USER.value: _user_scope_message,
+    LimitScope.MODEL.value: _model_scope_message,
+    LimitScope.CALLER.value: _caller_scope_message,
+    LimitScope.PROJECT.value: _project_scope_message,
+}
+
+
+def _scope_message(limit: UsageLimitDTO) -> str:
+    """Scope description used in quota violation messages, e.g. ``USER (user: alice)``."""
+    scope_message_fn = _SCOPE_MESSAGE_FNS.get(limit.scope)
+    if scope_message_fn is None:
+        return limit.scope  # Defaults to raw scope string
+    return scope_message_fn(limit)
+
+
+def _limit_message(limit: UsageLimitDTO) -> str:
+    """Static part of a violation message, e.g. ``limit: 10.00 cost per 1 day``."""
+    return f"limit: {limit.max_value:.2f} {limit.limit_type} per {limit.interval_value} {limit.interval_unit}"
+
+
+def _wildcard_count(limit: UsageLimitDTO) -> int:
+    """Number of unconstrained dimensions on ``limit``; lower means more specific."""
+    count = 0
+    for value in (limit.model, limit.username, limit.caller_name, limit.project_name):
+        if value is None or value == "*":
+            count += 1
+    return count
+
+
+class PreparedLimit(NamedTuple):
+    """Values derived from a limit that the quota evaluator reads instead of recomputing."""
+
+    limit: UsageLimitDTO
+    scope: LimitScope
+    limit_type: LimitType
+    # Position of the limit type's request value; None for unknown types.
+    request_value_index: Optional[int]
+    interval_unit: TimeInterval
+    # (interval_unit, interval_value); limits sharing it share a period start.
+    period_key: Tuple[TimeInterval, int]
+    wildcard_count: int
+    scope_message: str
+    limit_message: str
+    usage_filter: UsageFilter
+    max_value_rounded: float
+    match_mask: Tuple[bool, bool, bool, bool]
+    match_key: RequestFingerprint
+
+
+def _prepare_limit(limit: UsageLimitDTO) -> PreparedLimit:
+    """Derive everything the quota evaluator needs from ``limit``."""
+    scope_enum = _scope_of(limit.scope)
+    limit_type_enum = _limit_type_of(limit.limit_type)
+    interval_unit_enum = _interval_unit_of(limit.interval_unit)
+    return PreparedLimit(
+        limit,
+        scope_enum,
+        limit_type_enum,
+        REQUEST_VALUE_INDEX.get(limit_type_enum),
+        interval_unit_enum,
+        (interval_unit_enum, limit.interval_value),
+        _wildcard_count(limit),
+        _scope_message(limit),
+        _limit_message(limit),
+        _usage_query_filter(limit, scope_enum),
+        round(float(limit.max_value), 6),
+        _match_mask(limit, scope_enum),
+        _match_key(limit, scope_enum),
+    )
+
+
+def prepared_limit(prepared_limits: Dict[int, PreparedLimit], limit: UsageLimitDTO) -> PreparedLimit:
+    """The prepared form of ``limit`` from ``prepared_limits``, or a fresh one for other limits."""
+    prepared = prepared_limits.get(id(limit))
+    if prepared is None or prepared.limit is not limit:
+        # Limits built outside the cache manager, or from a replaced load
+        prepared = _prepare_limit(limit)
+    return prepared
+
+
+class _LimitsSnapshot(NamedTuple):
+    """One load of the usage limits together with every index derived from it.
+
+    A snapshot is built completely before it is published with a single
+    reference assignment, so a reader that grabs it once sees limits, indices
+    and generation from the same load.
+    """
+
+    limits: Optional[List[UsageLimitDTO]]
+    loaded_at: float
+    sorted_limits: List[UsageLimitDTO]
+    # Every limit's derived values, keyed by id(). Entries hold their limit,
+    # so the ids stay unique while the snapshot is alive.
+    prepared_limits: Dict[int, PreparedLimit]
+    # Maps each limit's match key (see _match_key) to the limits sharing it.
+    limits_by_match_key: Dict[RequestFingerprint, List[UsageLimitDTO]]
+    # Every limit's position in sorted_limits, keyed by id().
+    limit_rank: Dict[int, int]
+    # Longest rolling window among the limits, in seconds.
+    max_rolling_window_seconds: int
+    # Maps (model, username, caller_name, project_name) to the pre-filtered,
+    # pre-sorted limits that apply to such a request.
+    applicable_index: "LRUCache[RequestFingerprint, List[UsageLimitDTO]]"
+    generation: int
+
+
+def _empty_snapshot(generation: int) -> _LimitsSnapshot:
+    return _LimitsSnapshot(
+        None, 0.0, [], {}, {}, {}, 0, LRUCache(maxsize=APPLICABLE_LIMITS_INDEX_SIZE), generation,
+    )
 
 
 class QuotaServiceCacheManager:
-    def __init__(self, backend: TransactionalBackend):
-        self.backend = backend
-        self.limits_cache: Optional[List[UsageLimitDTO]] = None
+    __slots__ = (
+        "backend",
+        "limits_ttl_seconds",
+        "_snapshot",
+        "_generations",
+        "_seen_generation",
+        "_refresh_stop",
+        "__weakref__",
+        "_applicable_limits_lock",
+        "projects_cache",
+        "users_cache",
+    )
+
+    def __init__(
+        self,
+        backend: TransactionalBackend,
+        limits_ttl_seconds: Optional[float] = None,
+        refresh_in_background: bool = False,
+    ) -> None:
+        self.backend: TransactionalBackend = backend
+        # When set, cached limits older than this are reloaded on next use, or
+        # every limits_ttl_seconds by a daemon thread with refresh_in_background.
+        self.limits_ttl_seconds: Optional[float] = limits_ttl_seconds
+        # Incremented on every load; see maybe_refresh_limits. next() on a
+        # count is atomic, so concurrent loads never share a generation.
+        self._generations = count(1)
+        self._snapshot: _LimitsSnapshot = _empty_snapshot(0)
+        # LRUCache reorders entries even on lookups, so every access to a
+        # snapshot's applicable index happens under this lock.
+        self._applicable_limits_lock = threading.Lock()
         self.projects_cache: Optional[List[str]] = None
         self.users_cache: Optional[List[str]] = None
         self._load_limits_from_backend()
         self._load_projects_from_backend()
         self._load_users_from_backend()
+        self._seen_generation: int = self.limits_generation
+        self._refresh_stop: Optional[threading.Event] = None
+        if refresh_in_background:
+            if limits_ttl_seconds is None:
+                raise ValueError("refresh_in_background requires limits_ttl_seconds")
+            self._start_background_refresh(limits_ttl_seconds)
+
+    @property
+    def limits_cache(self) -> Optional[List[UsageLimitDTO]]:
+        return self._snapshot.limits
+
+    @limits_cache.setter
+    def limits_cache(self, limits: Optional[List[UsageLimitDTO]]) -> None:
+        if limits is None:
+            # Forget the loaded limits; the next check reloads them.
+            self._snapshot = _empty_snapshot(self._snapshot.generation)
+        else:
+            self._build_limit_indices(limits)
+
+    @property
+    def sorted_limits_cache(self) -> List[UsageLimitDTO]:
+        return self._snapshot.sorted_limits
+
+    @property
+    def prepared_limits(self) -> Dict[int, PreparedLimit]:
+        return self._snapshot.prepared_limits
+
+    @property
+    def max_rolling_window_seconds(self) -> int:
+        return self._snapshot.max_rolling_window_seconds
+
+    @property
+    def applicable_limits_index(self) -> "LRUCache[RequestFingerprint, List[UsageLimitDTO]]":
+        return self._snapshot.applicable_index
+
+    @property
+    def limits_generation(self) -> int:
+        return self._snapshot.generation
 
     def _load_limits_from_backend(self) -> None:
         """Loads all usage limits from the backend into the cache."""
-        self.limits_cache = self.backend.get_usage_limits()
+        self._build_limit_indices(self.backend.get_usage_limits())
+
+    def _build_limit_indices(self, limits: List[UsageLimitDTO]) -> None:
+        """Builds every index derived from ``limits`` in a single pass, then publishes them.
+
+        The new snapshot, including a fresh applicable-limits index, replaces
+        the previous one in a single assignment. The previous limits stay
+        readable until then, so concurrent checks never wait on or observe a
+        half-built cache, and a check still running against the previous
+        snapshot can only populate its discarded index.
+        """
+        loaded_at = time.monotonic()
+        prepared_limits: Dict[int, PreparedLimit] = {}
+        limits_by_match_key: DefaultDict[RequestFingerprint, List[UsageLimitDTO]] = defaultdict(list)
+
+        max_rolling_window_seconds = 0
+
+        for limit in limits:
+            prepared = prepared_limits[id(limit)] = _prepare_limit(limit)
+            max_rolling_window_seconds = max(
+                max_rolling_window_seconds, rolling_window_seconds(prepared.interval_unit, limit.interval_value)
+            )
+            limits_by_match_key[prepared.match_key].append(limit)
+
+        # sorted() is stable, so limits of equal specificity keep backend order.
+        sorted_limits = sorted(limits, key=lambda limit: prepared_limits[id(limit)].wildcard_count)
+        limit_rank = {id(limit): rank for rank, limit in enumerate(sorted_limits)}
+
+        self._snapshot = _LimitsSnapshot(
+            limits,
+            loaded_at,
+            sorted_limits,
+            prepared_limits,
+            dict(limits_by_match_key),
+            limit_rank,
+            max_rolling_window_seconds,
+            LRUCache(maxsize=APPLICABLE_LIMITS_INDEX_SIZE),
+            next(self._generations),
+        )
+
+    def _start_background_refresh(self, interval_seconds: float) -> None:
+        stop = self._refresh_stop = threading.Event()
+        # The thread only holds a weak reference so an abandoned manager can
+        # still be garbage collected; the loop ends once it is gone.
+        manager_ref = weakref.ref(self)
+
+        def refresh_loop() -> None:
+            while not stop.wait(interval_seconds):
+                manager = manager_ref()
+                if manager is None:
+                    return
+                try:
+                    manager._load_limits_from_backend()
+                except Exception:
+                    logger.exception("Background refresh of usage limits failed; keeping the cached limits.")
+                del manager
+
+        threading.Thread(target=refresh_loop, name="llm-accounting-limits-refresh", daemon=True).start()
+
+    def stop_background_refresh(self) -> None:
+        """Stops the background refresh thread, if one is running."""
+        if self._refresh_stop is not None:
+            self._refresh_stop.set()
+            self._refresh_stop = None
 
     def _load_projects_from_backend(self) -> None:
         """Loads allowed project names from the backend."""
@@ -31,9 +399,89 @@ class QuotaServiceCacheManager:
 
     def refresh_limits_cache(self) -> None:
         """Refreshes the limits cache from the backend."""
-        self.limits_cache = None
         self._load_limits_from_backend()
 
+    def candidate_limits(
+        self,
+        model: Optional[str],
+        username: Optional[str],
+        caller_name: Optional[str],
+        project_name: Optional[str],
+        snapshot: Optional[_LimitsSnapshot] = None,
+    ) -> List[UsageLimitDTO]:
+        """Return the limits that may apply to a request, most specific first.
+
+        Each request dimension matches either its own value or a wildcard, so at
+        most 16 match-key buckets are consulted instead of scanning every limit.
+        Callers still apply the exact applicability rules to the result.
+        """
+        if snapshot is None:
+            snapshot = self._snapshot
+        limits_by_match_key = snapshot.limits_by_match_key
+        candidates: List[UsageLimitDTO] = []
+        for key in product(
+            (None, model) if model else (None,),
+            (None, username) if username else (None,),
+            (None, caller_name) if caller_name else (None,),
+            (None, project_name) if project_name else (None,),
+        ):
+            bucket = limits_by_match_key.get(key)
+            if bucket:
+                candidates.extend(bucket)
+        if len(candidates) > 1:
+            limit_rank = snapshot.limit_rank
+            candidates.sort(key=lambda limit: limit_rank[id(limit)])
+        return candidates
+
+    def applicable_limits(
+        self,
+        model: Optional[str],
+        username: Optional[str],
+        caller_name: Optional[str],
+        project_name: Optional[str],
+        should_skip_limit: Callable[..., bool],
+    ) -> List[UsageLimitDTO]:
+        """Return the limits applying to a request, most specific first, memoized per fingerprint.
+
+        ``should_skip_limit`` is called as ``(limit, model, username, caller_name,
+        project_name)`` on each candidate and drops the limits that do not apply.
+        """
+        fingerprint = (model, username, caller_name, project_name)
+        snapshot = self._snapshot
+        applicable_index = snapshot.applicable_index
+        with self._applicable_limits_lock:
+            applicable: Optional[List[UsageLimitDTO]] = applicable_index.get(fingerprint)
+        if applicable is None:
+            # Candidates come back ordered most specific first; the exact
+            # applicability rules only need to run on that small subset.
+            applicable = [
+                limit
+                for limit in self.candidate_limits(model, username, caller_name, project_name, snapshot)
+                if not should_skip_limit(limit, model, username, caller_name, project_name)
+            ]
+            with self._applicable_limits_lock:
+                applicable_index[fingerprint] = applicable
+        return applicable
+
+    def maybe_refresh_limits(self) -> bool:
+        """Loads limits if missing or, without a background refresh, older than ``limits_ttl_seconds``.
+
+        Returns True when the limits were (re)loaded since the previous call,
+        including loads done by the background thread.
+        """
+        snapshot = self._snapshot
+        if snapshot.limits is None:
+            self._load_limits_from_backend()
+        else:
+            ttl = self.limits_ttl_seconds
+            if self._refresh_stop is None and ttl is not None and time.monotonic() - snapshot.loaded_at > ttl:
+                self.refresh_limits_cache()
+        generation = self.limits_generation
+        if generation == self._seen_generation:
+            return False
+        self._seen_generation = generation
+        return True
+
     def refresh_projects_cache(self) -> None:
         """Refreshes the project name cache from the backend."""
         self.projects_cache = None
@@ -0,0 +1,88 @@
+import threading
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional
+
+from ...backends.base import UsageEntry, UsageQuerySpec
+from ...models.limits import ROLLING_INTERVALS, UsageLimitDTO
+from ._usage_window import LIMIT_TYPE_FIELD, UsageFilter, entry_aggregate, usage_matches_filter
+
+
+class _Headroom(NamedTuple):
+    limit: UsageLimitDTO
+    period_start: datetime
+    is_rolling: bool
+    field_index: int
+    usage_filter: UsageFilter
+    remaining: float
+
+
+class LimitHeadroomCache:
+    """Remaining quota per limit, learned from evaluations and reduced by tracked usage.
+
+    After a limit has been evaluated against the backend, its headroom
+    (``max_value - current_usage``) is kept and every usage entry recorded
+    through ``consume`` is subtracted from it. While a request fits within the
+    headroom of every applicable limit it can be allowed without querying usage.
+
+    For fixed intervals the headroom is only valid within the period it was
+    computed for. Rolling windows only shed usage as they slide, so their
+    headroom stays a safe lower bound. Either way the bound only holds if all
+    usage is recorded through this process.
+
+    Headroom is tied to the limit object it was computed for, so once limits
+    are reloaded, headroom stored by a check still running against the
+    previous load is never applied to the new limits.
+    """
+
+    __slots__ = ("_lock", "_headroom")
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._headroom: Dict[int, _Headroom] = {}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._headroom.clear()
+
+    def remaining(self, limit: UsageLimitDTO, period_start: datetime) -> Optional[float]:
+        """Known headroom of ``limit`` for the period starting at ``period_start``."""
+        if limit.id is None:
+            return None
+        headroom = self._headroom.get(limit.id)
+        if headroom is None or headroom.limit is not limit:
+            return None
+        if not headroom.is_rolling and headroom.period_start != period_start:
+            return None
+        return headroom.remaining
+
+    def store(self, limit: UsageLimitDTO, spec: UsageQuerySpec, current_usage: float,
+              usage_filter: Optional[UsageFilter] = None) -> None:
+        """Remember the headroom of ``limit`` given its usage evaluated for ``spec``.
+
+        ``usage_filter`` is the filter ``spec`` was built from, if the caller has it.
+        """
+        field_index = LIMIT_TYPE_FIELD.get(spec.limit_type)
+        if limit.id is None or field_index is None:
+            return
+        if usage_filter is None:
+            usage_filter = (spec.model, spec.username, spec.caller_name, spec.project_name, spec.filter_project_null)
+        with self._lock:
+            self._headroom[limit.id] = _Headroom(
+                limit,
+                spec.start_time,
+                spec.interval_unit in ROLLING_INTERVALS,
+                field_index,
+                usage_filter,
+                float(limit.max_value) - current_usage,
+            )
+
+    def consume(self, entry: UsageEntry) -> None:
+        """Subtract a tracked usage entry from the headroom of every limit it counts against."""
+        key, usage = entry_aggregate(entry)
+        with self._lock:
+            headroom_by_limit = self._headroom
+            for limit_id, headroom in list(headroom_by_limit.items()):
+                if usage_matches_filter(headroom.usage_filter, key):
+                    headroom_by_limit[limit_id] = headroom._replace(
+                        remaining=headroom.remaining - usage[headroom.field_index]
+                    )
@@ -1,154 +1,325 @@
 import logging  # Added logging import
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Tuple, List
-
-from ...backends.base import TransactionalBackend
-from ...models.limits import LimitType, TimeInterval, UsageLimitDTO, LimitScope
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Tuple, List
+
+from ...backends.base import TransactionalBackend, UsageQuerySpec
+from ...models.limits import ROLLING_INTERVALS, LimitType, TimeInterval, UsageLimitDTO, LimitScope
+from ._cache_manager import (
+    REQUEST_VALUE_INDEX,
+    PreparedLimit,
+    QuotaServiceCacheManager,
+    _usage_query_filter,
+    prepared_limit,
+)
+from ._headroom_cache import LimitHeadroomCache
+from ._rejection_stats import LimitRejectionStats
+from ._usage_query_cache import UsageQueryCache
+from ._usage_window import RollingUsageWindow, UsageFilter
 
 logger = logging.getLogger(__name__)
 
+# Width in seconds of the bucket within which a fixed interval's period start
+# cannot change: the interval's smallest aligned unit.
+_FIXED_INTERVAL_BUCKET_SECONDS = {
+    TimeInterval.SECOND: 1,
+    TimeInterval.MINUTE: 60,
+    TimeInterval.HOUR: 3600,
+    TimeInterval.DAY: 86400,
+    TimeInterval.WEEK: 86400,
+    TimeInterval.MONTH: 86400,
+}
+
+
+def _request_values(request_input_tokens: int, request_completion_tokens: int,
+                    request_cost: float) -> Tuple[float, int, int, int, float]:
+    """What a request adds to each limit type, ordered as ``REQUEST_VALUE_INDEX``."""
+    return (
+        1.0,
+        request_input_tokens,
+        request_completion_tokens,
+        request_input_tokens + request_completion_tokens,
+        request_cost,
+    )
+
+
+_EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_EPOCH_WEEK_UTC = datetime(1970, 1, 5, tzinfo=timezone.utc)  # The first Monday after the epoch
+
+# Length of one unit of the fixed intervals whose periods have a constant length.
+_FIXED_INTERVAL_DELTAS = {
+    TimeInterval.SECOND: timedelta(seconds=1),
+    TimeInterval.MINUTE: timedelta(minutes=1),
+    TimeInterval.HOUR: timedelta(hours=1),
+    TimeInterval.DAY: timedelta(days=1),
+    TimeInterval.WEEK: timedelta(weeks=1),
+}
+
+# Length of one unit of each rolling interval except the calendar-based MONTH_ROLLING.
+_ROLLING_INTERVAL_DELTAS = {
+    TimeInterval.SECOND_ROLLING: timedelta(seconds=1),
+    TimeInterval.MINUTE_ROLLING: timedelta(minutes=1),
+    TimeInterval.HOUR_ROLLING: timedelta(hours=1),
+    TimeInterval.DAY_ROLLING: timedelta(days=1),
+    TimeInterval.WEEK_ROLLING: timedelta(weeks=1),
+}
+
+# Position of the only fractional limit type in the request values tuple.
+_COST_VALUE_INDEX = REQUEST_VALUE_INDEX[LimitType.COST]
+
+
+# What a single request adds to each limit type, for callers looking at one limit.
+_REQUEST_VALUE_FNS: Dict[LimitType, Callable[[int, int, float], float]] = {
+    LimitType.REQUESTS: lambda input_tokens, completion_tokens, cost: 1.0,
+    LimitType.INPUT_TOKENS: lambda input_tokens, completion_tokens, cost: float(input_tokens),
+    LimitType.OUTPUT_TOKENS: lambda input_tokens, completion_tokens, cost: float(completion_tokens),
+    LimitType.TOTAL_TOKENS: lambda input_tokens, completion_tokens, cost: float(input_tokens + completion_tokens),
+    LimitType.COST: lambda input_tokens, completion_tokens, cost: cost,
+}
+
+
+def _second_period_start(current_time_truncated: datetime, interval_value: int) -> datetime:
+    return current_time_truncated.replace(second=current_time_truncated.second - (current_time_truncated.second % interval_value), microsecond=0)
+
+
+def _minute_period_start(current_time_truncated: datetime, interval_value: int) -> datetime:
+    return current_time_truncated.replace(minute=current_time_truncated.minute - (current_time_truncated.minute % interval_value), second=0, microsecond=0)
+
+
+def _hour_period_start(current_time_truncated: datetime, interval_value: int) -> datetime:
+    return current_time_truncated.replace(hour=current_time_truncated.hour - (current_time_truncated.hour % interval_value), minute=0, second=0, microsecond=0)
+
+
+def _day_period_start(current_time_truncated: datetime, interval_value: int) -> datetime:
+    start_of_current_day = current_time_truncated.replace(hour=0, minute=0, second=0, microsecond=0)
+    days_since_epoch = (start_of_current_day - _EPOCH_UTC).days
+    days_offset = days_since_epoch % interval_value
+    return start_of_current_day - timedelta(days=days_offset)
+
+
+def _week_period_start(current_time_truncated: datetime, interval_value: int) -> datetime:
+    start_of_day = current_time_truncated.replace(hour=0, minute=0, second=0, microsecond=0)
+    start_of_current_iso_week = start_of_day - timedelta(days=start_of_day.weekday())
+    if interval_value == 1:
+        return start_of_current_iso_week
+    weeks_since_epoch = (start_of_current_iso_week - _EPOCH_WEEK_UTC).days // 7
+    weeks_offset = weeks_since_epoch % interval_value
+    return start_of_current_iso_week - timedelta(weeks=weeks_offset)
+
+
+def _month_period_start(current_time_truncated: datetime, interval_value: int) -> datetime:
+    year, month = current_time_truncated.year, current_time_truncated.month
+    total_months_since_epoch = year * 12 + month - 1
+    interval_start_month_index = (total_months_since_epoch // interval_value) * interval_value
+    start_year, start_month = divmod(interval_start_month_index, 12)
+    return current_time_truncated.replace(year=start_year, month=start_month + 1, day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _month_rolling_period_start(current_time_truncated: datetime, interval_value: int) -> datetime:
+    target_month_index = current_time_truncated.year * 12 + current_time_truncated.month - 1 - interval_value
+    target_year_val, target_month_val = divmod(target_month_index, 12)
+    return current_time_truncated.replace(year=target_year_val, month=target_month_val + 1, day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _period_end(period_start_time: datetime, interval_unit: TimeInterval, interval_value: int) -> datetime:
+    """End of the period that starts at ``period_start_time``, i.e. when its usage stops counting."""
+    if interval_unit == TimeInterval.MONTH:
+        next_period_month_index = period_start_time.year * 12 + period_start_time.month - 1 + interval_value
+        next_period_year, next_period_month = divmod(next_period_month_index, 12)
+        return datetime(next_period_year, next_period_month + 1, 1, 0, 0, 0, tzinfo=period_start_time.tzinfo)
+    if interval_unit == TimeInterval.MONTH_ROLLING:
+        target_month_index = period_start_time.year * 12 + period_start_time.month - 1 + interval_value
+        target_year_val, target_month_val = divmod(target_month_index, 12)
+        return period_start_time.replace(year=target_year_val, month=target_month_val + 1)
+
+    base_delta = _FIXED_INTERVAL_DELTAS.get(interval_unit) or _ROLLING_INTERVAL_DELTAS.get(interval_unit)
+    if base_delta is None:
+        raise ValueError(f"Unsupported time interval unit for period end: {interval_unit.value}")
+    return period_start_time + base_delta * interval_value
+
+
+PeriodStartFn = Callable[[datetime, int], datetime]
+
+# Period start per interval unit; each takes the current time truncated to the
+# second and the interval value.
+_FIXED_PERIOD_START: Dict[TimeInterval, PeriodStartFn] = {
+    TimeInterval.SECOND: _second_period_start,
+    TimeInterval.MINUTE: _minute_period_start,
+    TimeInterval.HOUR: _hour_period_start,
+    TimeInterval.DAY: _day_period_start,
+    TimeInterval.WEEK: _week_period_start,
+    TimeInterval.MONTH: _month_period_start,
+}
+_ROLLING_PERIOD_START: Dict[TimeInterval, PeriodStartFn] = {
+    TimeInterval.SECOND_ROLLING: lambda now, value: now - timedelta(seconds=value),
+    TimeInterval.MINUTE_ROLLING: lambda now, value: now - timedelta(minutes=value),
+    TimeInterval.HOUR_ROLLING: lambda now, value: now - timedelta(hours=value),
+    TimeInterval.DAY_ROLLING: lambda now, value: now - timedelta(days=value),
+    TimeInterval.WEEK_ROLLING: lambda now, value: now - timedelta(weeks=value),
+    TimeInterval.MONTH_ROLLING: _month_rolling_period_start,
+}
+
+
+# Every unit's period start rule, for instants not expressed in UTC.
+_PERIOD_START: Dict[TimeInterval, PeriodStartFn] = {**_FIXED_PERIOD_START, **_ROLLING_PERIOD_START}
+
+
+def _fixed_period_start(current_time_truncated: datetime, interval_unit: TimeInterval, interval_value: int) -> datetime:
+    """Start of the fixed (calendar-aligned) period containing ``current_time_truncated``."""
+    period_start_fn = _FIXED_PERIOD_START.get(interval_unit)
+    if period_start_fn is None:
+        raise ValueError(f"Unsupported fixed time interval unit: {interval_unit}")
+    return period_start_fn(current_time_truncated, interval_value)
+
+
+# Integer equivalents of the fixed-interval rules for UTC epoch seconds. The
+# Unix epoch (1970-01-01) is a Thursday, i.e. ISO weekday index 3, and
+# 1970-01-05 (epoch day 4) is the Monday multi-week periods align to.
+_EPOCH_FIXED_PERIOD_START: Dict[TimeInterval, Callable[[int, int], int]] = {
+    TimeInterval.SECOND: lambda ts, value: ts - (ts % 60) % value,
+    TimeInterval.MINUTE: lambda ts, value: ts - ts % 60 - ((ts // 60) % 60) % value * 60,
+    TimeInterval.HOUR: lambda ts, value: ts - ts % 3600 - ((ts // 3600) % 24) % value * 3600,
+    TimeInterval.DAY: lambda ts, value: (ts // 86400 - (ts // 86400) % value) * 86400,
+    TimeInterval.WEEK: lambda ts, value: _epoch_week_period_start(ts // 86400, value) * 86400,
+}
+
+
+def _epoch_week_period_start(day: int, interval_value: int) -> int:
+    monday = day - (day + 3) % 7
+    if interval_value == 1:
+        return monday
+    return monday - ((monday - 4) // 7) % interval_value * 7
+
+
+# Length of one unit of each rolling interval except the calendar-based MONTH_ROLLING.
+_ROLLING_UNIT_SECONDS = {
+    TimeInterval.SECOND_ROLLING: 1,
+    TimeInterval.MINUTE_ROLLING: 60,
+    TimeInterval.HOUR_ROLLING: 3600,
+    TimeInterval.DAY_ROLLING: 86400,
+    TimeInterval.WEEK_ROLLING: 7 * 86400,
+}
+
+
+@lru_cache(maxsize=1024)
+def _utc_month_start(month_index: int) -> datetime:
+    """Midnight UTC on the 1st of month ``year * 12 + month - 1``; a lazily filled table."""
+    year, month = divmod(month_index, 12)
+    return datetime(year, month + 1, 1, tzinfo=timezone.utc)
+
+
+def _utc_month_index(epoch_day: int) -> int:
+    """``year * 12 + month - 1`` of the UTC day ``epoch_day``."""
+    day = datetime.fromtimestamp(epoch_day * 86400, tz=timezone.utc)
+    return day.year * 12 + day.month - 1
+
+
+@lru_cache(maxsize=256)
+def _cached_month_rolling_period_start(interval_value: int, epoch_day: int) -> datetime:
+    """MONTH_ROLLING period start, which only changes with the UTC day."""
+    return _utc_month_start(_utc_month_index(epoch_day) - interval_value)
+
+
+@lru_cache(maxsize=256)
+def _cached_fixed_period_start(interval_unit: TimeInterval, interval_value: int, bucket_index: int) -> datetime:
+    """Memoized ``_fixed_period_start`` for the UTC bucket ``bucket_index``."""
+    bucket_start = bucket_index * _FIXED_INTERVAL_BUCKET_SECONDS[interval_unit]
+    epoch_period_start = _EPOCH_FIXED_PERIOD_START.get(interval_unit)
+    if epoch_period_start is not None:
+        return datetime.fromtimestamp(epoch_period_start(bucket_start, interval_value), tz=timezone.utc)
+    # MONTH buckets are days; months are irregular, so look up their starts
+    month_index = _utc_month_index(bucket_index)
+    return _utc_month_start(month_index - month_index % interval_value)
+
+
+def _utc_period_start(epoch_seconds: int, interval_unit: TimeInterval, interval_value: int) -> Optional[datetime]:
+    """Period start for the UTC instant ``epoch_seconds``, or None for an unknown unit."""
+    bucket_seconds = _FIXED_INTERVAL_BUCKET_SECONDS.get(interval_unit)
+    if bucket_seconds is not None:
+        # Fixed intervals only change when their base bucket rolls over, so
+        # requests share one memoized result per bucket.
+        return _cached_fixed_period_start(interval_unit, interval_value, epoch_seconds // bucket_seconds)
+    unit_seconds = _ROLLING_UNIT_SECONDS.get(interval_unit)
+    if unit_seconds is not None:
+        return datetime.fromtimestamp(epoch_seconds - interval_value * unit_seconds, tz=timezone.utc)
+    if interval_unit == TimeInterval.MONTH_ROLLING:
+        return _cached_month_rolling_period_start(interval_value, epoch_seconds // 86400)
+    return None
+
 
 class QuotaServiceLimitEvaluator:
-    def __init__(self, backend: TransactionalBackend):
-        self.backend = backend
+    def __init__(self, backend: TransactionalBackend) -> None:
+        self.backend: TransactionalBackend = backend
+        # Optional in-memory source for rolling-window usage, set by QuotaService
+        self.usage_window: Optional[RollingUsageWindow] = None
+        # Optional per-limit remaining quota used to skip usage queries, set by QuotaService
+        self.headroom_cache: Optional[LimitHeadroomCache] = None
+        # Optional rejection counts used to order evaluation, set by QuotaService
+        self.rejection_stats: Optional[LimitRejectionStats] = None
+        # Optional usage query results reused until usage is recorded, set by QuotaService
+        self.usage_query_cache: Optional[UsageQueryCache] = None
+        # Source of the derived values of loaded limits, set by QuotaService
+        self.cache_manager: Optional[QuotaServiceCacheManager] = None
+
+    def _prepared_limits(self) -> Dict[int, PreparedLimit]:
+        cache_manager = self.cache_manager
+        return cache_manager.prepared_limits if cache_manager is not None else {}
 
     def _prepare_usage_query_params(self, limit: UsageLimitDTO, limit_scope_enum: LimitScope) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[str], Optional[bool]]:
-        final_usage_query_model: Optional[str] = None
-        final_usage_query_username: Optional[str] = None
-        final_usage_query_caller_name: Optional[str] = None
-        final_usage_query_project_name: Optional[str] = None
-        final_usage_query_filter_project_null: Optional[bool] = None
-
-        if limit_scope_enum != LimitScope.GLOBAL:
-            if limit.model is not None and limit.model != "*":
-                final_usage_query_model = limit.model
-            if limit.username is not None and limit.username != "*":
-                final_usage_query_username = limit.username
-            if limit.caller_name is not None and limit.caller_name != "*":
-                final_usage_query_caller_name = limit.caller_name
-
-            if limit.project_name is not None and limit.project_name != "*":
-                final_usage_query_project_name = limit.project_name
-            elif limit_scope_enum == LimitScope.PROJECT and limit.project_name is None:
-                # Only filter for NULL project if the limit is specifically a PROJECT scope limit with no project_name
-                final_usage_query_filter_project_null = True
-            # If it's not a PROJECT scope limit, but project_name is None on the limit,
-            # it means this limit applies regardless of the request's project (unless project_name is specified on limit).
-            # If project_name is '*' on the limit, it also applies regardless of request's project.
-            # These cases are implicitly handled by not setting final_usage_query_project_name,
-            # thus not filtering by project in the consuming query.
-
-        return (final_usage_query_model, final_usage_query_username, final_usage_query_caller_name,
-                final_usage_query_project_name, final_usage_query_filter_project_null)
+        return _usage_query_filter(limit, limit_scope_enum)
 
     def _calculate_request_value(self, limit_type_enum: LimitType, request_input_tokens: int,
                                  request_completion_tokens: int, request_cost: float) -> Optional[float]:
-        if limit_type_enum == LimitType.REQUESTS:
-            return 1.0
-        elif limit_type_enum == LimitType.INPUT_TOKENS:
-            return float(request_input_tokens)
-        elif limit_type_enum == LimitType.OUTPUT_TOKENS:
-            return float(request_completion_tokens)
-        elif limit_type_enum == LimitType.TOTAL_TOKENS:
-            return float(request_input_tokens + request_completion_tokens)
-        elif limit_type_enum == LimitType.COST:
-            return request_cost
-        else:
+        request_value_fn = _REQUEST_VALUE_FNS.get(limit_type_enum)
+        if request_value_fn is None:
             return None
+        return request_value_fn(request_input_tokens, request_completion_tokens, request_cost)
 
     def _format_exceeded_reason_message(self, limit: UsageLimitDTO,
                                         limit_scope_for_message: Optional[str],
                                         current_usage: float, request_value: float) -> str:
-        if limit_scope_for_message:
-            scope_msg_str = limit_scope_for_message
-        else:
-            scope_details_map = {
-                LimitScope.USER.value: f"USER (user: {limit.username})" if limit.username else "USER",
-                LimitScope.MODEL.value: f"MODEL (model: {limit.model})" if limit.model else "MODEL",
-                LimitScope.CALLER.value: f"CALLER (user: {limit.username}, caller: {limit.caller_name})" if limit.username and limit.caller_name else (f"CALLER (caller: {limit.caller_name})" if limit.caller_name else "CALLER"),
-                LimitScope.PROJECT.value: f"PROJECT (project: {limit.project_name})" if limit.project_name else "PROJECT (no project)",
-            }
-            scope_msg_str = scope_details_map.get(limit.scope, limit.scope)  # Defaults to raw scope string
-
+        # Both static parts are precomputed when limits are loaded
+        prepared = prepared_limit(self._prepared_limits(), limit)
+        scope_msg_str = limit_scope_for_message or prepared.scope_message
+        limit_msg_str = prepared.limit_message
         reason_message = (
-            f"{scope_msg_str} limit: {limit.max_value:.2f} {limit.limit_type} per {limit.interval_value} {limit.interval_unit}"
+            f"{scope_msg_str} {limit_msg_str}"
             f" exceeded. Current usage: {current_usage:.2f}, request: {request_value:.2f}."
         )
         return reason_message
 
     def _should_skip_limit(self, limit: UsageLimitDTO, request_model: Optional[str],
                            request_username: Optional[str], request_caller_name: Optional[str],
-                           project_name_for_usage_sum: Optional[str]) -> bool:
-        limit_scope_enum = LimitScope(limit.scope)
-        if limit_scope_enum != LimitScope.GLOBAL:
-            if limit.model and limit.model != "*" and limit.model != request_model:
-                return True
-            if limit.username and limit.username != "*" and limit.username != request_username:
-                return True
-            if limit.caller_name and limit.caller_name != "*" and limit.caller_name != request_caller_name:
-                return True
-
-            if limit.project_name:
-                if limit.project_name != "*" and limit.project_name != project_name_for_usage_sum:
-                    return True
-            elif limit_scope_enum == LimitScope.PROJECT and limit.project_name is None:
-                if project_name_for_usage_sum is not None:
-                    return True
-        return False  # Do not skip
+                           project_name_for_usage_sum: Optional[str],
+                           prepared: Optional[PreparedLimit] = None) -> bool:
+        if prepared is None:
+            prepared = prepared_limit(self._prepared_limits(), limit)
+        constrains_model, constrains_username, constrains_caller_name, constrains_project = prepared.match_mask
+        # The request, reduced to the dimensions the limit constrains, must equal its match key
+        return (
+            request_model if constrains_model else None,
+            request_username if constrains_username else None,
+            request_caller_name if constrains_caller_name else None,
+            project_name_for_usage_sum if constrains_project else None,
+        ) != prepared.match_key
+
+    def _classify_limit(self, limit: UsageLimitDTO, request_model: Optional[str],
+                        request_username: Optional[str], request_caller_name: Optional[str],
+                        project_name_for_usage_sum: Optional[str],
+                        prepared: Optional[PreparedLimit] = None) -> Optional[UsageFilter]:
+        """Usage query filter of ``limit``, or None when it does not apply to the request."""
+        if prepared is None:
+            prepared = prepared_limit(self._prepared_limits(), limit)
+        if self._should_skip_limit(limit, request_model, request_username, request_caller_name,
+                                   project_name_for_usage_sum, prepared):
+            return None
+        return prepared.usage_filter
 
     def _calculate_reset_timestamp(self, period_start_time: datetime,
                                    limit: UsageLimitDTO, interval_unit_enum: TimeInterval) -> datetime:
-        _reset_timestamp: datetime
-        if interval_unit_enum.is_rolling():
-            period_end_for_retry: datetime
-            if interval_unit_enum == TimeInterval.MONTH_ROLLING:
-                year = period_start_time.year
-                month = period_start_time.month
-                target_month_val = month + limit.interval_value
-                target_year_val = year
-                while target_month_val > 12:
-                    target_month_val -= 12
-                    target_year_val += 1
-                period_end_for_retry = period_start_time.replace(year=target_year_val, month=target_month_val)
-            elif interval_unit_enum == TimeInterval.WEEK_ROLLING:
-                period_end_for_retry = period_start_time + timedelta(weeks=limit.interval_value)
-            elif interval_unit_enum == TimeInterval.DAY_ROLLING:
-                period_end_for_retry = period_start_time + timedelta(days=limit.interval_value)
-            elif interval_unit_enum == TimeInterval.HOUR_ROLLING:
-                period_end_for_retry = period_start_time + timedelta(hours=limit.interval_value)
-            elif interval_unit_enum == TimeInterval.MINUTE_ROLLING:
-                period_end_for_retry = period_start_time + timedelta(minutes=limit.interval_value)
-            elif interval_unit_enum == TimeInterval.SECOND_ROLLING:
-                period_end_for_retry = period_start_time + timedelta(seconds=limit.interval_value)
-            else:
-                raise ValueError(f"Unsupported rolling time interval unit for retry calculation: {interval_unit_enum.value}")
-            _reset_timestamp = period_end_for_retry
-        else:  # Non-rolling (fixed) intervals
-            duration: timedelta
-            if interval_unit_enum == TimeInterval.MONTH:
-                start_year = period_start_time.year
-                start_month = period_start_time.month
-                next_period_raw_month = start_month + limit.interval_value
-                next_period_year = start_year + (next_period_raw_month - 1) // 12
-                next_period_month = (next_period_raw_month - 1) % 12 + 1
-                _reset_timestamp = datetime(next_period_year, next_period_month, 1, 0, 0, 0, tzinfo=period_start_time.tzinfo)
-            elif interval_unit_enum == TimeInterval.WEEK:
-                duration = timedelta(weeks=limit.interval_value)
-                _reset_timestamp = period_start_time + duration
-            else:  # SECOND, MINUTE, HOUR, DAY
-                simple_interval_map = {
-                    TimeInterval.SECOND.value: timedelta(seconds=1),
-                    TimeInterval.MINUTE.value: timedelta(minutes=1),
-                    TimeInterval.HOUR.value: timedelta(hours=1),
-                    TimeInterval.DAY.value: timedelta(days=1),
-                }
-                base_delta = simple_interval_map.get(interval_unit_enum.value)
-                if not base_delta:
-                    raise ValueError(f"Unsupported fixed time interval unit for duration: {interval_unit_enum.value}")
-                duration = base_delta * limit.interval_value
-                _reset_timestamp = period_start_time + duration
-
-        return _reset_timestamp.replace(microsecond=0)
+        period_end = _period_end(period_start_time, interval_unit_enum, limit.interval_value)
+        # Period starts computed by the evaluator are already whole seconds
+        return period_end.replace(microsecond=0) if period_end.microsecond else period_end
 
     def _evaluate_limits_enhanced(
         self,
@@ -161,66 +332,196 @@ class QuotaServiceLimitEvaluator:
         request_cost: float,
         request_completion_tokens: int,
         limit_scope_for_message: Optional[str] = None,
+        limits_prefiltered: bool = False,
+        now: Optional[datetime] = None,
     ) -> Tuple[bool, Optional[str], Optional[datetime]]: # Changed return type
-        now = datetime.now(timezone.utc) # Keep timezone-aware
+        """Evaluate ``limits`` in order against the request.
+
+        With ``limits_prefiltered`` the caller guarantees every limit applies to
+        the request (as the cache manager's applicable-limits index does), so
+        the per-limit applicability check is skipped. ``now`` lets callers
+        evaluating several requests share one UTC timestamp; it defaults to the
+        current time.
+        """
+        if not limits:
+            return True, None, None
+        if now is None:
+            now = datetime.now(timezone.utc) # Keep timezone-aware
+        elif now.tzinfo is not timezone.utc:
+            # Period starts are derived from UTC; naive timestamps are taken as UTC
+            now = now.astimezone(timezone.utc) if now.tzinfo is not None else now.replace(tzinfo=timezone.utc)
+        # Period starts only depend on the whole UTC second, computed once per check
+        now_seconds = int(now.timestamp() // 1)
+        classify_limit = None if limits_prefiltered else self._classify_limit
+
+        # Resolve every applicable limit into its usage query up front. An
+        # unlimited (-1) limit allows the request outright, so nothing after it
+        # needs to be planned; it is kept as a (limit, None) marker.
+        planned: List[Tuple[PreparedLimit, Optional[UsageQuerySpec]]] = []
+        # Limits sharing an interval share its period start within this check
+        period_starts: Dict[Tuple[TimeInterval, int], datetime] = {}
+        prepared_limits = self._prepared_limits()
         for limit in limits:
-            if self._should_skip_limit(limit, request_model, request_username, request_caller_name, project_name_for_usage_sum):
+            prepared = prepared_limit(prepared_limits, limit)
+            if limit.max_value == -1:
+                # GLOBAL limits apply to every request, so no applicability check is needed
+                if classify_limit is None or prepared.scope is LimitScope.GLOBAL:
+                    planned.append((prepared, None))
+                    break
+                if not self._should_skip_limit(
+                    limit, request_model, request_username, request_caller_name, project_name_for_usage_sum, prepared
+                ):
+                    planned.append((prepared, None))
+                    break
                 continue
 
-            if limit.max_value == -1:
-                return True, None, None
+            # One pass decides applicability and yields the usage query filter
+            if classify_limit is not None and classify_limit(
+                limit, request_model, request_username, request_caller_name, project_name_for_usage_sum, prepared
+            ) is None:
+                continue
 
-            limit_scope_enum = LimitScope(limit.scope) # Define limit_scope_enum here
-            interval_unit_enum = TimeInterval(limit.interval_unit) # Get enum member
-            period_start_time = self._get_period_start(now, interval_unit_enum, limit.interval_value)
-
-            reset_timestamp = self._calculate_reset_timestamp(period_start_time, limit, interval_unit_enum)
-
-            (final_usage_query_model, final_usage_query_username, final_usage_query_caller_name,
-             final_usage_query_project_name, final_usage_query_filter_project_null) = \
-                self._prepare_usage_query_params(limit, limit_scope_enum)
-
-            # Add logging here
-            # import logging # Moved to top-level
-            logger = logging.getLogger(__name__)
-            logger.debug(f"Evaluating limit: {limit.limit_type} for {limit.scope} (model: {limit.model}, user: {limit.username}, project: {limit.project_name})")
-            logger.debug(f"Period start: {period_start_time}, Query end (now): {now}")
-
-            current_usage = self.backend.get_accounting_entries_for_quota(
-                start_time=period_start_time,
-                end_time=now,  # Always query up to 'now' for current usage with full precision
-                limit_type=LimitType(limit.limit_type),
-                interval_unit=TimeInterval(limit.interval_unit), # Pass the interval_unit
-                model=final_usage_query_model,
-                username=final_usage_query_username,
-                caller_name=final_usage_query_caller_name,
-                project_name=final_usage_query_project_name,
-                filter_project_null=final_usage_query_filter_project_null,
-            )
-            logger.debug(f"Current usage calculated: {current_usage}")
-
-            limit_type_enum = LimitType(limit.limit_type)
-            request_value_optional = self._calculate_request_value(limit_type_enum, request_input_tokens, request_completion_tokens, request_cost)
-            if request_value_optional is None:
-                logger.warning(f"Unknown or non-applicable limit type {limit_type_enum} for limit ID {limit.id if limit.id else 'N/A'}. Skipping.")
+            period_key = prepared.period_key
+            interval_unit_enum = period_key[0]
+            period_start_time = period_starts.get(period_key)
+            if period_start_time is None:
+                period_start_time = _utc_period_start(now_seconds, interval_unit_enum, limit.interval_value)
+                if period_start_time is None:
+                    period_start_time = self._get_period_start(now, interval_unit_enum, limit.interval_value)
+                period_starts[period_key] = period_start_time
+            planned.append((prepared, self._build_usage_query_spec(prepared, period_start_time, now)))
+
+        headroom_cache = self.headroom_cache
+        if headroom_cache is not None and self._fits_known_headroom(
+            planned, headroom_cache, request_input_tokens, request_completion_tokens, request_cost
+        ):
+            return True, None, None
+
+        known_usage: Dict[UsageQuerySpec, float] = {}
+        usage_window = self.usage_window
+        if usage_window is not None:
+            for prepared, spec in planned:
+                if spec is not None and spec.interval_unit in ROLLING_INTERVALS:
+                    window_usage = usage_window.usage(spec, prepared.limit.interval_value)
+                    if window_usage is not None:
+                        known_usage[spec] = window_usage
+        usage_query_cache = self.usage_query_cache
+        if usage_query_cache is not None:
+            # Snapshot before fetching, so results racing a recorded entry are not stored
+            usage_generation = usage_query_cache.generation
+            for _, spec in planned:
+                if spec is not None and spec not in known_usage:
+                    cached_usage = usage_query_cache.get(spec)
+                    if cached_usage is not None:
+                        known_usage[spec] = cached_usage
+
+        rejection_stats = self.rejection_stats
+        if rejection_stats is not None:
+            planned = rejection_stats.order(planned)
+
+        backend = self.backend
+        # A single query gains nothing from batching
+        batch_pending = len(planned) > 1 and getattr(backend, "supports_batched_quota_queries", False) is True
+        # A limit that recently rejected is queried alone first, as it likely settles the request
+        query_first_alone = batch_pending and rejection_stats is not None and rejection_stats.has_rejected(planned[0][0].limit)
+        get_usage = backend.get_accounting_entries_for_quota
+
+        request_values = _request_values(request_input_tokens, request_completion_tokens, request_cost)
+        debug_enabled = logger.isEnabledFor(logging.DEBUG)
+        for position, (prepared, spec) in enumerate(planned):
+            if spec is None:
+                return True, None, None
+            limit = prepared.limit
+
+            if debug_enabled:
+                logger.debug("Evaluating limit: %s for %s (model: %s, user: %s, project: %s)",
+                             limit.limit_type, limit.scope, limit.model, limit.username, limit.project_name)
+                logger.debug("Period start: %s, Query end (now): %s", spec.start_time, now)
+
+            current_usage: Optional[float] = known_usage.get(spec)
+            if current_usage is None and batch_pending and not (query_first_alone and position == 0):
+                batch_pending = False
+                specs = [
+                    pending for _, pending in planned[position:] if pending is not None and pending not in known_usage
+                ]
+                if len(specs) > 1:
+                    # One roundtrip for the remaining limits instead of one query per limit
+                    known_usage.update(backend.get_accounting_entries_for_quota_batch(specs))
+                    current_usage = known_usage.get(spec)
+            if current_usage is None:
+                # Limits sharing a query (same window, type and filters) reuse its result
+                current_usage = known_usage[spec] = get_usage(**spec._asdict())
+            if debug_enabled:
+                logger.debug("Current usage calculated: %s", current_usage)
+            if headroom_cache is not None:
+                headroom_cache.store(limit, spec, current_usage, prepared.usage_filter)
+            if usage_query_cache is not None:
+                usage_query_cache.store(spec, current_usage, usage_generation)
+
+            request_value_index = prepared.request_value_index
+            if request_value_index is None:
+                logger.warning("Unknown or non-applicable limit type %s for limit ID %s. Skipping.",
+                               spec.limit_type, limit.id if limit.id else "N/A")
                 continue
-            request_value = request_value_optional
+            request_value = request_values[request_value_index]
 
             potential_usage = current_usage + request_value
+            limit_max_value_float = prepared.max_value_rounded
 
-            # Convert to float for comparison, and round to avoid floating point inaccuracies
-            # Using a precision of 6 decimal places should be sufficient for most cases.
-            potential_usage_float = round(float(potential_usage), 6)
-            limit_max_value_float = round(float(limit.max_value), 6)
-
-            # Compare with a small epsilon to account for floating point inaccuracies
-            comparison_result = potential_usage_float > limit_max_value_float
+            if request_value_index == _COST_VALUE_INDEX:
+                # Round cost sums to 6 decimal places to absorb floating point inaccuracies
+                comparison_result = round(potential_usage, 6) > limit_max_value_float
+            else:
+                # Request and token counts are whole numbers, which rounding leaves unchanged
+                comparison_result = potential_usage > limit_max_value_float
 
             if comparison_result:
+                if rejection_stats is not None:
+                    rejection_stats.record(limit)
+                reset_timestamp = self._calculate_reset_timestamp(spec.start_time, limit, spec.interval_unit)
                 reason_message = self._format_exceeded_reason_message(limit, limit_scope_for_message, current_usage, request_value)
                 return False, reason_message, reset_timestamp # Return reset_timestamp
         return True, None, None # Return None for reset_timestamp if allowed
 
+    def _fits_known_headroom(
+        self,
+        planned: List[Tuple[PreparedLimit, Optional[UsageQuerySpec]]],
+        headroom_cache: LimitHeadroomCache,
+        request_input_tokens: int,
+        request_completion_tokens: int,
+        request_cost: float,
+    ) -> bool:
+        """Whether the request fits the cached headroom of every planned limit."""
+        request_values = _request_values(request_input_tokens, request_completion_tokens, request_cost)
+        for prepared, spec in planned:
+            if spec is None:
+                return True  # Unlimited limit reached; the evaluation would allow it too
+            request_value_index = prepared.request_value_index
+            if request_value_index is None:
+                continue
+            request_value = request_values[request_value_index]
+            remaining = headroom_cache.remaining(prepared.limit, spec.start_time)
+            if remaining is None or request_value >= remaining:
+                return False
+        return True
+
+    def _build_usage_query_spec(self, prepared: PreparedLimit, period_start_time: datetime,
+                                now: datetime) -> UsageQuerySpec:
+        """Describe the usage query needed to evaluate a prepared limit for the current period."""
+        (final_usage_query_model, final_usage_query_username, final_usage_query_caller_name,
+         final_usage_query_project_name, final_usage_query_filter_project_null) = prepared.usage_filter
+        return UsageQuerySpec(
+            start_time=period_start_time,
+            end_time=now,  # Always query up to 'now' for current usage with full precision
+            limit_type=prepared.limit_type,
+            interval_unit=prepared.interval_unit,
+            model=final_usage_query_model,
+            username=final_usage_query_username,
+            caller_name=final_usage_query_caller_name,
+            project_name=final_usage_query_project_name,
+            filter_project_null=final_usage_query_filter_project_null,
+        )
+
     def calculate_remaining_after_usage(
         self,
         limit: UsageLimitDTO,
@@ -231,49 +532,37 @@ class QuotaServiceLimitEvaluator:
         request_input_tokens: int = 0,
         request_completion_tokens: int = 0,
         request_cost: float = 0.0,
+        now: Optional[datetime] = None,
     ) -> Optional[float]:
-        """Return remaining quota for ``limit`` considering current usage."""
-        if self._should_skip_limit(
+        """Return remaining quota for ``limit`` considering current usage.
+
+        ``now`` defaults to the current UTC time; pass one timestamp to keep
+        several limits consistent.
+        """
+        prepared = prepared_limit(self._prepared_limits(), limit)
+        usage_filter = self._classify_limit(
             limit,
             request_model,
             request_username,
             request_caller_name,
             project_name_for_usage_sum,
-        ):
+            prepared,
+        )
+        if usage_filter is None:
             return None
 
         if limit.max_value == -1:
             return float("inf")
 
-        now = datetime.now(timezone.utc)
-        limit_scope_enum = LimitScope(limit.scope)
-        interval_unit_enum = TimeInterval(limit.interval_unit)
-        period_start_time = self._get_period_start(now, interval_unit_enum, limit.interval_value)
-
-        (
-            final_usage_query_model,
-            final_usage_query_username,
-            final_usage_query_caller_name,
-            final_usage_query_project_name,
-            final_usage_query_filter_project_null,
-        ) = self._prepare_usage_query_params(limit, limit_scope_enum)
-
-        current_usage = self.backend.get_accounting_entries_for_quota(
-            start_time=period_start_time,
-            end_time=now,
-            limit_type=LimitType(limit.limit_type),
-            interval_unit=interval_unit_enum,
-            model=final_usage_query_model,
-            username=final_usage_query_username,
-            caller_name=final_usage_query_caller_name,
-            project_name=final_usage_query_project_name,
-            filter_project_null=final_usage_query_filter_project_null,
-        )
+        if now is None:
+            now = datetime.now(timezone.utc)
+        period_start_time = self._get_period_start(now, prepared.interval_unit, limit.interval_value)
+        spec = self._build_usage_query_spec(prepared, period_start_time, now)
+        current_usage = self.backend.get_accounting_entries_for_quota(**spec._asdict())
 
         # Calculate request value
-        limit_type_enum = LimitType(limit.limit_type)
         request_value = self._calculate_request_value(
-            limit_type_enum,
+            spec.limit_type,
             request_input_tokens,
             request_completion_tokens,
             request_cost
@@ -290,57 +579,14 @@ class QuotaServiceLimitEvaluator:
         if current_time.tzinfo is None:
             current_time = current_time.replace(tzinfo=timezone.utc)
 
-        # Truncate current_time to second precision for consistent rolling window calculations
-        current_time_truncated = current_time.replace(microsecond=0)
-
-        # Fixed interval calculations
-        if interval_unit == TimeInterval.SECOND:
-            return current_time_truncated.replace(second=current_time_truncated.second - (current_time_truncated.second % interval_value), microsecond=0)
-        if interval_unit == TimeInterval.MINUTE:
-            return current_time_truncated.replace(minute=current_time_truncated.minute - (current_time_truncated.minute % interval_value), second=0, microsecond=0)
-        if interval_unit == TimeInterval.HOUR:
-            return current_time_truncated.replace(hour=current_time_truncated.hour - (current_time_truncated.hour % interval_value), minute=0, second=0, microsecond=0)
-        if interval_unit == TimeInterval.DAY:
-            start_of_current_day = current_time_truncated.replace(hour=0, minute=0, second=0, microsecond=0)
-            epoch_start = datetime(1970, 1, 1, tzinfo=timezone.utc)
-            days_since_epoch = (start_of_current_day - epoch_start).days
-            days_offset = days_since_epoch % interval_value
-            return start_of_current_day - timedelta(days=days_offset)
-        if interval_unit == TimeInterval.WEEK:
-            start_of_day = current_time_truncated.replace(hour=0, minute=0, second=0, microsecond=0)
-            start_of_current_iso_week = start_of_day - timedelta(days=start_of_day.weekday())
-            if interval_value == 1:
-                return start_of_current_iso_week
-            epoch_week_start = datetime(1970, 1, 5, tzinfo=timezone.utc)  # A Monday
-            weeks_since_epoch = (start_of_current_iso_week - epoch_week_start).days // 7
-            weeks_offset = weeks_since_epoch % interval_value
-            return start_of_current_iso_week - timedelta(weeks=weeks_offset)
-        if interval_unit == TimeInterval.MONTH:
-            year, month = current_time_truncated.year, current_time_truncated.month
-            total_months_since_epoch = year * 12 + month - 1
-            interval_start_month_index = (total_months_since_epoch // interval_value) * interval_value
-            start_year, start_month = divmod(interval_start_month_index, 12)
-            return current_time_truncated.replace(year=start_year, month=start_month + 1, day=1, hour=0, minute=0, second=0, microsecond=0)
-
-        # Rolling interval calculations
-        if interval_unit.is_rolling():
-            delta_map = {
-                TimeInterval.SECOND_ROLLING: timedelta(seconds=interval_value),
-                TimeInterval.MINUTE_ROLLING: timedelta(minutes=interval_value),
-                TimeInterval.HOUR_ROLLING: timedelta(hours=interval_value),
-                TimeInterval.DAY_ROLLING: timedelta(days=interval_value),
-                TimeInterval.WEEK_ROLLING: timedelta(weeks=interval_value),
-            }
-            if interval_unit == TimeInterval.MONTH_ROLLING:
-                year, month = current_time_truncated.year, current_time_truncated.month
-                target_month_val = month - interval_value
-                target_year_val = year
-                while target_month_val <= 0:
-                    target_month_val += 12
-                    target_year_val -= 1
-                return current_time_truncated.replace(year=target_year_val, month=target_month_val, day=1, hour=0, minute=0, second=0, microsecond=0)
-            if interval_unit in delta_map:
-                return current_time_truncated - delta_map[interval_unit]
-            raise ValueError(f"Unsupported rolling time interval unit in _get_period_start: {interval_unit}")
-
-        raise ValueError(f"Unsupported time interval unit: {interval_unit}")
+        if current_time.tzinfo is timezone.utc:
+            # Whole epoch seconds truncate the microseconds like the datetime path does
+            period_start = _utc_period_start(int(current_time.timestamp() // 1), interval_unit, interval_value)
+            if period_start is not None:
+                return period_start
+
+        period_start_fn = _PERIOD_START.get(interval_unit)
+        if period_start_fn is None:
+            raise ValueError(f"Unsupported time interval unit: {interval_unit}")
+        # Truncate current_time to second precision for consistent period calculations
+        return period_start_fn(current_time.replace(microsecond=0), interval_value)
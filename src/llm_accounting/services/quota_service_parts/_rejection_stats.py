@@ -0,0 +1,61 @@
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from ...backends.base import UsageQuerySpec
+from ...models.limits import UsageLimitDTO
+from ._cache_manager import PreparedLimit
+
+# Rejection counts are halved once per period so the order follows recent traffic.
+REJECTION_DECAY_SECONDS = 3600.0
+
+PlannedLimit = Tuple[PreparedLimit, Optional[UsageQuerySpec]]
+
+
+class LimitRejectionStats:
+    """Recent rejection counts per limit, used to evaluate likely rejections first.
+
+    Evaluation stops at the first exceeded limit, so when usage is queried one
+    limit at a time, checking the limits that rejected most often first tends
+    to settle a denied request after a single query. When several limits are
+    exceeded, the one reported is then the most frequently rejecting rather
+    than the most specific.
+    """
+
+    __slots__ = ("_lock", "_counts", "_decay_at")
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counts: Dict[int, int] = {}
+        self._decay_at = time.monotonic() + REJECTION_DECAY_SECONDS
+
+    def record(self, limit: UsageLimitDTO) -> None:
+        """Count a rejection by ``limit``."""
+        if limit.id is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if now >= self._decay_at:
+                self._decay(now)
+            self._counts[limit.id] = self._counts.get(limit.id, 0) + 1
+
+    def _decay(self, now: float) -> None:
+        periods = int((now - self._decay_at) // REJECTION_DECAY_SECONDS) + 1
+        shift = min(periods, 63)
+        self._counts = {limit_id: count >> shift for limit_id, count in self._counts.items() if count >> shift}
+        self._decay_at += periods * REJECTION_DECAY_SECONDS
+
+    def has_rejected(self, limit: UsageLimitDTO) -> bool:
+        """Whether ``limit`` rejected a request recently."""
+        return self._counts.get(limit.id, 0) > 0
+
+    def order(self, planned: List[PlannedLimit]) -> List[PlannedLimit]:
+        """``planned`` with the most frequently rejecting limits first.
+
+        The sort is stable, so limits without rejections keep their order and an
+        unlimited marker, which never rejects, stays last.
+        """
+        counts = self._counts
+        if not counts or len(planned) < 2:
+            return planned
+        return sorted(planned, key=lambda item: -counts.get(item[0].limit.id, 0))
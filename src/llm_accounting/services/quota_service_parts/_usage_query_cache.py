@@ -0,0 +1,44 @@
+import threading
+from typing import Optional
+
+from cachetools import LRUCache
+
+from ...backends.base import UsageQuerySpec
+
+# Upper bound on the number of usage query results kept between writes.
+USAGE_QUERY_CACHE_SIZE = 1024
+
+
+class UsageQueryCache:
+    """Usage query results reused until the next tracked usage entry.
+
+    A query's result only changes when usage is written, so results are keyed
+    by the query without its end time and all of them are dropped whenever
+    usage is recorded through this process. Like the other in-memory usage
+    state, this only holds if all usage is written through this process.
+
+    ``generation`` changes with every invalidation; results fetched before an
+    invalidation are discarded instead of stored.
+    """
+
+    __slots__ = ("_lock", "_results", "generation")
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._results: "LRUCache[UsageQuerySpec, float]" = LRUCache(maxsize=USAGE_QUERY_CACHE_SIZE)
+        self.generation = 0
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._results.clear()
+            self.generation += 1
+
+    def get(self, spec: UsageQuerySpec) -> Optional[float]:
+        with self._lock:
+            return self._results.get(spec._replace(end_time=None))
+
+    def store(self, spec: UsageQuerySpec, usage: float, generation: int) -> None:
+        """Remember ``usage`` for ``spec`` if no usage was recorded since ``generation``."""
+        with self._lock:
+            if generation == self.generation:
+                self._results[spec._replace(end_time=None)] = usage
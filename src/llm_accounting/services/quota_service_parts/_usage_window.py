@@ -0,0 +1,281 @@
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from cachetools import LRUCache
+
+from ...backends.base import UsageEntry, UsageQuerySpec
+from ...models.limits import LimitType, TimeInterval
+
+# (model, username, caller_name, project) of recorded usage entries.
+UsageKey = Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]
+
+# (model, username, caller_name, project_name, filter_project_null) of a usage query.
+UsageFilter = Tuple[Optional[str], Optional[str], Optional[str], Optional[str], Optional[bool]]
+
+# Upper bound on the number of (filter, interval) running sums kept up to date.
+RUNNING_SUMS_SIZE = 1024
+
+
+class BucketAgg(NamedTuple):
+    """Usage recorded for one key within one second."""
+
+    ts_bucket: int
+    requests: int
+    input_tokens: int
+    output_tokens: int
+    total_tokens: int
+    cost: float
+
+
+def _combine(a: BucketAgg, b: BucketAgg) -> BucketAgg:
+    """``a`` plus the usage in ``b``, keeping ``a``'s bucket timestamp."""
+    return BucketAgg(
+        a.ts_bucket,
+        a.requests + b.requests,
+        a.input_tokens + b.input_tokens,
+        a.output_tokens + b.output_tokens,
+        a.total_tokens + b.total_tokens,
+        a.cost + b.cost,
+    )
+
+
+def _uncombine(a: BucketAgg, b: BucketAgg) -> BucketAgg:
+    """``a`` minus the usage in ``b``; all aggregates are sums, so this is exact."""
+    return BucketAgg(
+        a.ts_bucket,
+        a.requests - b.requests,
+        a.input_tokens - b.input_tokens,
+        a.output_tokens - b.output_tokens,
+        a.total_tokens - b.total_tokens,
+        a.cost - b.cost,
+    )
+
+
+def _add_to_buckets(buckets: Deque[BucketAgg], addition: BucketAgg) -> None:
+    """Merge ``addition`` into the time-ordered ``buckets``."""
+    ts_bucket = addition.ts_bucket
+    # Entries almost always land in the newest bucket; scan backwards otherwise.
+    position = len(buckets)
+    while position and buckets[position - 1].ts_bucket > ts_bucket:
+        position -= 1
+    if position and buckets[position - 1].ts_bucket == ts_bucket:
+        buckets[position - 1] = _combine(buckets[position - 1], addition)
+    else:
+        buckets.insert(position, addition)
+
+
+def usage_matches_filter(usage_filter: UsageFilter, key: UsageKey) -> bool:
+    """Whether usage recorded under ``key`` is counted by a query with ``usage_filter``."""
+    model, username, caller_name, project_name, filter_project_null = usage_filter
+    entry_model, entry_username, entry_caller_name, entry_project = key
+    if model and entry_model != model:
+        return False
+    if username and entry_username != username:
+        return False
+    if caller_name and entry_caller_name != caller_name:
+        return False
+    if project_name is not None:
+        return entry_project == project_name
+    if filter_project_null is True:
+        return entry_project is None
+    if filter_project_null is False:
+        return entry_project is not None
+    return True
+
+
+def entry_epoch(entry: UsageEntry) -> float:
+    """Epoch seconds of ``entry``; naive timestamps are local time, as backends store them."""
+    timestamp = entry.timestamp or datetime.now(timezone.utc)
+    return timestamp.astimezone(timezone.utc).timestamp()
+
+
+def entry_aggregate(entry: UsageEntry) -> Tuple[UsageKey, BucketAgg]:
+    """The key and one-request aggregate recorded for a usage entry."""
+    key: UsageKey = (entry.model, entry.username, entry.caller_name, entry.project)
+    return key, BucketAgg(
+        int(entry_epoch(entry) // 1),
+        1,
+        entry.prompt_tokens or 0,
+        entry.completion_tokens or 0,
+        entry.total_tokens or 0,
+        entry.cost or 0.0,
+    )
+
+
+class _RunningSum:
+    """Aggregate of one query's window, advanced by adding new and removing expired usage."""
+
+    __slots__ = ("usage_filter", "window_seconds", "start", "total", "contributions")
+
+    def __init__(self, usage_filter: UsageFilter, window_seconds: int, start: int) -> None:
+        self.usage_filter = usage_filter
+        self.window_seconds = window_seconds
+        self.start = start
+        self.total = BucketAgg(start, 0, 0, 0, 0, 0.0)
+        self.contributions: Deque[BucketAgg] = deque()
+
+    def add(self, addition: BucketAgg) -> None:
+        if addition.ts_bucket >= self.start:
+            self.total = _combine(self.total, addition)
+            _add_to_buckets(self.contributions, addition)
+
+    def advance(self, start: int) -> None:
+        contributions = self.contributions
+        while contributions and contributions[0].ts_bucket < start:
+            self.total = _uncombine(self.total, contributions.popleft())
+        if not contributions:
+            # Drop any rounding residue left by float subtraction
+            self.total = BucketAgg(start, 0, 0, 0, 0, 0.0)
+        self.start = start
+
+
+# Longest span covered by one unit of each rolling interval. MONTH_ROLLING
+# windows start on the 1st of the month, so allow one extra month for them.
+_ROLLING_UNIT_SECONDS = {
+    TimeInterval.SECOND_ROLLING: 1,
+    TimeInterval.MINUTE_ROLLING: 60,
+    TimeInterval.HOUR_ROLLING: 3600,
+    TimeInterval.DAY_ROLLING: 86400,
+    TimeInterval.WEEK_ROLLING: 7 * 86400,
+    TimeInterval.MONTH_ROLLING: 31 * 86400,
+}
+
+
+def rolling_window_seconds(interval_unit: TimeInterval, interval_value: int) -> int:
+    """Upper bound on the length of a rolling window; 0 for fixed intervals."""
+    unit_seconds = _ROLLING_UNIT_SECONDS.get(interval_unit)
+    if unit_seconds is None:
+        return 0
+    if interval_unit == TimeInterval.MONTH_ROLLING:
+        interval_value += 1
+    return unit_seconds * interval_value
+
+
+# BucketAgg field holding the aggregate for each limit type.
+LIMIT_TYPE_FIELD = {
+    LimitType.REQUESTS: 1,
+    LimitType.INPUT_TOKENS: 2,
+    LimitType.OUTPUT_TOKENS: 3,
+    LimitType.TOTAL_TOKENS: 4,
+    LimitType.COST: 5,
+}
+
+
+class RollingUsageWindow:
+    """In-memory, per-second usage buckets for answering rolling quota queries.
+
+    Usage is recorded as it is tracked and summed from buckets instead of being
+    re-read from the backend. A query can only be answered when every entry in
+    its window is known, i.e. the window starts after tracking began (and after
+    any pruned buckets) and no entry recorded so far lies beyond its end. This
+    only holds if all usage is written through this process, so the window is
+    opt-in.
+    """
+
+    __slots__ = ("_lock", "_buckets", "_running_sums", "_covered_from", "_latest_recorded")
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._buckets: Dict[UsageKey, Deque[BucketAgg]] = {}
+        # Keyed by (usage filter, interval unit, interval value); window starts
+        # only move forward for a given key, so each read is O(expired buckets).
+        self._running_sums: "LRUCache[Tuple[UsageFilter, TimeInterval, int], _RunningSum]" = LRUCache(
+            maxsize=RUNNING_SUMS_SIZE
+        )
+        # Epoch second from which every tracked entry is present in the buckets.
+        # The current second may already hold untracked entries, so start after it.
+        self._covered_from = int(time.time()) + 1
+        self._latest_recorded = float("-inf")
+
+    def reset(self) -> None:
+        """Forget all buckets; coverage restarts from now."""
+        with self._lock:
+            self._buckets.clear()
+            self._running_sums.clear()
+            self._covered_from = int(time.time()) + 1
+            self._latest_recorded = float("-inf")
+
+    def record(self, entry: UsageEntry, horizon_seconds: float) -> None:
+        """Add a tracked usage entry to its per-second bucket.
+
+        Buckets of the entry's key older than ``horizon_seconds`` are dropped,
+        as is usage that has left the window of a running sum it is added to.
+        """
+        key, addition = entry_aggregate(entry)
+        ts_bucket = addition.ts_bucket
+        epoch = entry_epoch(entry)
+        with self._lock:
+            if ts_bucket < self._covered_from:
+                return  # Outside the covered range; queries reaching it use the backend.
+            if epoch > self._latest_recorded:
+                self._latest_recorded = epoch
+            buckets = self._buckets.get(key)
+            if buckets is None:
+                buckets = self._buckets[key] = deque()
+            _add_to_buckets(buckets, addition)
+            now = int(time.time())
+            self._prune(buckets, now - int(horizon_seconds))
+            for running_sum in self._running_sums.values():
+                if usage_matches_filter(running_sum.usage_filter, key):
+                    # Later reads start no earlier, so sums nobody reads stay bounded
+                    expired_before = now - running_sum.window_seconds
+                    if expired_before > running_sum.start:
+                        running_sum.advance(expired_before)
+                    running_sum.add(addition)
+
+    def _prune(self, buckets: Deque[BucketAgg], cutoff: int) -> None:
+        if buckets and buckets[0].ts_bucket < cutoff:
+            while buckets and buckets[0].ts_bucket < cutoff:
+                buckets.popleft()
+            if cutoff > self._covered_from:
+                self._covered_from = cutoff
+
+    def usage(self, spec: UsageQuerySpec, interval_value: int) -> Optional[float]:
+        """Sum of ``spec.limit_type`` over the window, or None if not fully covered.
+
+        ``interval_value`` identifies the limit's window together with
+        ``spec.interval_unit``; repeated reads for the same window reuse a
+        running sum instead of re-adding every bucket.
+        """
+        start_time = spec.start_time
+        if start_time.microsecond:
+            return None
+        start = int(start_time.timestamp())
+        end = spec.end_time.timestamp()
+        field_index = LIMIT_TYPE_FIELD.get(spec.limit_type)
+        if field_index is None:
+            return None
+
+        usage_filter: UsageFilter = (
+            spec.model, spec.username, spec.caller_name, spec.project_name, spec.filter_project_null
+        )
+        running_key = (usage_filter, spec.interval_unit, interval_value)
+        with self._lock:
+            if start < self._covered_from or end < self._latest_recorded:
+                return None
+            running_sum = self._running_sums.get(running_key)
+            if running_sum is None or start < running_sum.start:
+                window_seconds = rolling_window_seconds(spec.interval_unit, interval_value)
+                running_sum = self._build_running_sum(usage_filter, window_seconds, start)
+                self._running_sums[running_key] = running_sum
+            else:
+                running_sum.advance(start)
+            return float(running_sum.total[field_index])
+
+    def _build_running_sum(self, usage_filter: UsageFilter, window_seconds: int, start: int) -> _RunningSum:
+        running_sum = _RunningSum(usage_filter, window_seconds, start)
+        contributions: List[BucketAgg] = []
+        for key, buckets in self._buckets.items():
+            if not usage_matches_filter(usage_filter, key):
+                continue
+            for bucket in reversed(buckets):
+                if bucket.ts_bucket < start:
+                    break
+                contributions.append(bucket)
+        contributions.sort(key=lambda bucket: bucket.ts_bucket)
+        for bucket in contributions:
+            running_sum.add(bucket)
+        return running_sum
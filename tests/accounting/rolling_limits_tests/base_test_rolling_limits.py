@@ -1,6 +1,6 @@
 import unittest
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Any, Dict, List, Optional
 import logging
 
 logger = logging.getLogger(__name__)
@@ -52,8 +52,16 @@ class BaseTestRollingLimits(unittest.TestCase):
         self.backend.insert_usage_limit(limit_dto)
         self.quota_service.refresh_limits_cache()
 
-    def _add_accounting_entry(
-        self,
+    def _add_accounting_entry(self, timestamp: datetime, **kwargs: Any):
+        self._add_accounting_entries([dict(timestamp=timestamp, **kwargs)])
+
+    def _add_accounting_entries(self, entries: List[Dict[str, Any]]):
+        """Insert entries, given as ``_accounting_entry_row`` arguments, in one transaction."""
+        self.session.bulk_insert_mappings(AccountingEntry, [self._accounting_entry_row(**entry) for entry in entries])
+        self.session.commit()
+
+    @staticmethod
+    def _accounting_entry_row(
         timestamp: datetime,
         model: str = "test-model",
         username: str = "test-user",
@@ -63,8 +71,8 @@ class BaseTestRollingLimits(unittest.TestCase):
         project_name: Optional[str] = None,
         caller_name: Optional[str] = None,
         execution_time: float = 0.1,
-    ):
-        entry = AccountingEntry(
+    ) -> Dict[str, Any]:
+        return dict(
             timestamp=timestamp.replace(microsecond=0, tzinfo=None), # Ensure timezone-naive for SQLite
             model=model,
             username=username,
@@ -75,8 +83,3 @@ class BaseTestRollingLimits(unittest.TestCase):
             caller_name=caller_name,
             execution_time=execution_time,
         )
-        self.session.add(entry)
-        self.session.commit()
-        # Debugging: Verify the inserted entry
-        # This will print the entry as it is in the session, not necessarily what's in DB
-        # print(f"Added entry: {entry.timestamp}, {entry.project}, {entry.completion_tokens}")
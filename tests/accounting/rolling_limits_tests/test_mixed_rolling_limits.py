@@ -20,8 +20,9 @@ class TestMixedRollingLimits(BaseTestRollingLimits):
         self._add_usage_limit(limit_user_tokens)
 
         # Add 6 requests for "test-user" in the last 5 seconds (violates global requests limit)
-        for i in range(6):
-            self._add_accounting_entry(timestamp=self.now - timedelta(seconds=i+1), username="test-user", input_tokens=10)
+        self._add_accounting_entries([
+            dict(timestamp=self.now - timedelta(seconds=i+1), username="test-user", input_tokens=10) for i in range(6)
+        ])
 
         allowed, message = self.quota_service.check_quota(
             model="test-model", username="test-user", caller_name="test-caller",
@@ -49,10 +50,12 @@ class TestMixedRollingLimits(BaseTestRollingLimits):
         self._add_usage_limit(limit_rolling_minute)
 
         # Add 2 requests in the last 30 seconds
-        self._add_accounting_entry(timestamp=self.now - timedelta(seconds=10))
-        self._add_accounting_entry(timestamp=self.now - timedelta(seconds=20))
-        # Add 1 request 2 hours ago (counts for fixed daily, not for 1-min rolling)
-        self._add_accounting_entry(timestamp=self.now - timedelta(hours=2))
+        self._add_accounting_entries([
+            dict(timestamp=self.now - timedelta(seconds=10)),
+            dict(timestamp=self.now - timedelta(seconds=20)),
+            # Add 1 request 2 hours ago (counts for fixed daily, not for 1-min rolling)
+            dict(timestamp=self.now - timedelta(hours=2)),
+        ])
 
         # Current state:
         # Fixed daily: 3 requests (10, 20 secs ago, 2 hrs ago) + 1 current = 4. Limit 10. OK.
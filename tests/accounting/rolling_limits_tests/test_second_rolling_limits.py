@@ -16,9 +16,11 @@ class TestSecondRollingLimits(BaseTestRollingLimits):
         self._add_usage_limit(limit_dto)
 
         # Add usage within the last 10 seconds
-        self._add_accounting_entry(timestamp=self.now - timedelta(seconds=1))
-        self._add_accounting_entry(timestamp=self.now - timedelta(seconds=3))
-        self._add_accounting_entry(timestamp=self.now - timedelta(seconds=5))
+        self._add_accounting_entries([
+            dict(timestamp=self.now - timedelta(seconds=1)),
+            dict(timestamp=self.now - timedelta(seconds=3)),
+            dict(timestamp=self.now - timedelta(seconds=5)),
+        ])
 
         allowed, message = self.quota_service.check_quota(
             model="test-model",
@@ -43,9 +45,11 @@ class TestSecondRollingLimits(BaseTestRollingLimits):
         self._add_usage_limit(limit_dto)
 
         # Add usage within the last 10 seconds
-        self._add_accounting_entry(timestamp=self.now - timedelta(seconds=1))
-        self._add_accounting_entry(timestamp=self.now - timedelta(seconds=3))
-        self._add_accounting_entry(timestamp=self.now - timedelta(seconds=5)) # This is the 3rd request
+        self._add_accounting_entries([
+            dict(timestamp=self.now - timedelta(seconds=1)),
+            dict(timestamp=self.now - timedelta(seconds=3)),
+            dict(timestamp=self.now - timedelta(seconds=5)), # This is the 3rd request
+        ])
 
         allowed, message = self.quota_service.check_quota(
             model="test-model",
@@ -73,8 +77,10 @@ class TestSecondRollingLimits(BaseTestRollingLimits):
         self._add_usage_limit(limit_dto)
 
         # This usage is outside the 5-second window from `self.now`
-        self._add_accounting_entry(timestamp=self.now - timedelta(seconds=10))
-        self._add_accounting_entry(timestamp=self.now - timedelta(seconds=7))
+        self._add_accounting_entries([
+            dict(timestamp=self.now - timedelta(seconds=10)),
+            dict(timestamp=self.now - timedelta(seconds=7)),
+        ])
 
         # This usage is within the window
         self._add_accounting_entry(timestamp=self.now - timedelta(seconds=1))
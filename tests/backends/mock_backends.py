@@ -74,7 +74,9 @@ class MockBackend(BaseBackend):
     def get_accounting_entries_for_quota(
         self,
         start_time: datetime,
+        end_time: datetime,
         limit_type: LimitType,
+        interval_unit: Any,
         model: Optional[str] = None,
         username: Optional[str] = None,
         caller_name: Optional[str] = None,
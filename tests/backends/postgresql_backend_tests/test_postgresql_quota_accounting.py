@@ -4,7 +4,7 @@ import os
 from datetime import datetime, timezone, timedelta
 
 from src.llm_accounting.backends.postgresql import PostgreSQLBackend
-from src.llm_accounting.backends.base import UsageEntry, UsageStats, AuditLogEntry
+from src.llm_accounting.backends.base import UsageEntry, UsageStats, AuditLogEntry, UsageQuerySpec
 from src.llm_accounting.models.limits import UsageLimitDTO, LimitScope, LimitType, TimeInterval
 from typing import List, Optional
 
@@ -51,6 +51,18 @@ class TestPostgreSQLQuotaAccounting(BaseTestPostgreSQL):
         )
         self.assertEqual(output_tokens_val, 20000)
 
+    def test_get_accounting_entries_for_quota_total_tokens(self):
+        self.backend.initialize()
+        start_time = datetime(2023, 1, 1, 0, 0, 0)
+
+        self.mock_cursor.fetchone.return_value = (30000,)
+        total_tokens_val = self.backend.get_accounting_entries_for_quota(start_time, LimitType.TOTAL_TOKENS, username='user1')
+        self.mock_cursor.execute.assert_called_with(
+            "SELECT COALESCE(SUM(total_tokens), 0) AS aggregated_value FROM accounting_entries WHERE timestamp >= %s AND username = %s;",
+            (start_time, 'user1')
+        )
+        self.assertEqual(total_tokens_val, 30000)
+
     def test_get_accounting_entries_for_quota_no_data(self):
         self.backend.initialize()
         self.mock_cursor.fetchone.return_value = (0.0,)
@@ -71,3 +83,32 @@ class TestPostgreSQLQuotaAccounting(BaseTestPostgreSQL):
         self.backend.initialize()
         with self.assertRaisesRegex(ValueError, "'unsupported' is not a valid LimitType"):
             self.backend.get_accounting_entries_for_quota(datetime.now(), LimitType("unsupported"))
+
+    def test_get_accounting_entries_for_quota_batch_single_roundtrip(self):
+        self.backend.initialize()
+        start_time = datetime(2023, 1, 1, 0, 0, 0)
+        end_time = datetime(2023, 1, 2, 0, 0, 0)
+        cost_spec = UsageQuerySpec(start_time, end_time, LimitType.COST, TimeInterval.DAY, username='user1')
+        requests_spec = UsageQuerySpec(start_time, end_time, LimitType.REQUESTS, TimeInterval.DAY,
+                                       project_name=None, filter_project_null=True)
+
+        self.mock_cursor.fetchall.return_value = [(1, 7), (0, 1.5)]
+        results = self.backend.get_accounting_entries_for_quota_batch([cost_spec, requests_spec, cost_spec])
+
+        self.mock_cursor.execute.assert_called_once_with(
+            "SELECT 0 AS spec_index, COALESCE(SUM(cost), 0.0) AS aggregated_value FROM accounting_entries "
+            "WHERE timestamp >= %s AND username = %s UNION ALL "
+            "SELECT 1 AS spec_index, COUNT(*) AS aggregated_value FROM accounting_entries "
+            "WHERE timestamp >= %s AND project IS NULL;",
+            (start_time, 'user1', start_time)
+        )
+        self.assertEqual(results, {cost_spec: 1.5, requests_spec: 7.0})
+        self.assertTrue(self.backend.supports_batched_quota_queries)
+
+    def test_get_accounting_entries_for_quota_batch_unexpected_error_rolls_back(self):
+        self.backend.initialize()
+        spec = UsageQuerySpec(datetime(2023, 1, 1), datetime(2023, 1, 2), LimitType.COST, TimeInterval.DAY)
+        self.mock_cursor.execute.side_effect = RuntimeError("Unexpected failure")
+        with self.assertRaises(RuntimeError):
+            self.backend.get_accounting_entries_for_quota_batch([spec])
+        self.mock_conn.rollback.assert_called_once()
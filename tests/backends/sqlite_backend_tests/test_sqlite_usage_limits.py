@@ -5,7 +5,7 @@ from typing import List
 
 import pytest
 
-from llm_accounting.backends.base import UsageEntry
+from llm_accounting.backends.base import UsageEntry, UsageQuerySpec
 from llm_accounting.backends.sqlite import SQLiteBackend
 from llm_accounting.models.limits import UsageLimitDTO, LimitScope, LimitType, TimeInterval
 
@@ -95,6 +95,96 @@ def test_get_accounting_entries_for_quota_with_project_filter(sqlite_backend: SQ
     )
     assert cost_no_project == 0.5
 
+
+def test_get_accounting_entries_for_quota_batch_matches_single_queries(sqlite_backend: SQLiteBackend):
+    """The batched quota query returns the same values as one query per spec."""
+    now = datetime.now(timezone.utc)
+    sqlite_backend.insert_usage(UsageEntry(model="batch-model", username="batch_user", prompt_tokens=10, cost=1.0, execution_time=1, project="BatchProject", timestamp=now - timedelta(minutes=10)))
+    sqlite_backend.insert_usage(UsageEntry(model="batch-model", username="batch_user", prompt_tokens=5, cost=0.5, execution_time=1, timestamp=now - timedelta(minutes=5)))
+    sqlite_backend.insert_usage(UsageEntry(model="other-batch-model", username="batch_user", prompt_tokens=7, cost=2.0, execution_time=1, timestamp=now - timedelta(minutes=5)))
+
+    start_time = now - timedelta(hours=1)
+    specs = [
+        UsageQuerySpec(start_time, now, LimitType.COST, TimeInterval.DAY, username="batch_user"),
+        UsageQuerySpec(start_time, now, LimitType.REQUESTS, TimeInterval.DAY, model="batch-model"),
+        UsageQuerySpec(start_time, now, LimitType.INPUT_TOKENS, TimeInterval.DAY, model="batch-model", filter_project_null=True),
+        UsageQuerySpec(start_time, now, LimitType.COST, TimeInterval.DAY, project_name="BatchProject"),
+        UsageQuerySpec(start_time, now, LimitType.COST, TimeInterval.DAY, model="missing-model"),
+        UsageQuerySpec(start_time, now, LimitType.COST, TimeInterval.DAY, username="batch_user"),  # duplicate
+    ]
+
+    results = sqlite_backend.get_accounting_entries_for_quota_batch(specs)
+
+    assert len(results) == 5
+    for spec in specs:
+        assert results[spec] == sqlite_backend.get_accounting_entries_for_quota(*spec)
+    assert results[specs[0]] == 3.5
+    assert results[specs[1]] == 2.0
+    assert results[specs[2]] == 5.0
+    assert results[specs[4]] == 0.0
+
+
+def test_get_accounting_entries_for_quota_batch_shares_scans_across_limit_types(sqlite_backend: SQLiteBackend):
+    """Specs over the same window and filters are answered by a single scan."""
+    from sqlalchemy import event
+
+    now = datetime.now(timezone.utc)
+    sqlite_backend.insert_usage(UsageEntry(model="scan-model", username="scan_user", prompt_tokens=10, completion_tokens=4, total_tokens=14, cost=1.5, execution_time=1, timestamp=now - timedelta(minutes=1)))
+    start_time = now - timedelta(hours=1)
+    specs = [
+        UsageQuerySpec(start_time, now, limit_type, TimeInterval.HOUR, username="scan_user")
+        for limit_type in (LimitType.REQUESTS, LimitType.INPUT_TOKENS, LimitType.OUTPUT_TOKENS, LimitType.TOTAL_TOKENS, LimitType.COST)
+    ]
+    statements = []
+    engine = sqlite_backend.connection_manager.engine
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        results = sqlite_backend.get_accounting_entries_for_quota_batch(specs)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    assert [results[spec] for spec in specs] == [1.0, 10.0, 4.0, 14.0, 1.5]
+    assert len(statements) == 1
+    assert "UNION ALL" not in statements[0]
+
+
+def test_get_accounting_entries_for_quota_batch_shares_scans_across_windows(sqlite_backend: SQLiteBackend):
+    """Windows with the same filters and end time are summed by one scan."""
+    from sqlalchemy import event
+
+    now = datetime.now(timezone.utc)
+    for minutes_ago, cost in ((2, 1.0), (30, 2.0), (300, 4.0)):
+        sqlite_backend.insert_usage(UsageEntry(model="window-model", username="window_user", prompt_tokens=1, cost=cost, execution_time=1, timestamp=now - timedelta(minutes=minutes_ago)))
+    specs = [
+        UsageQuerySpec(now - timedelta(minutes=5), now, LimitType.COST, TimeInterval.MINUTE_ROLLING, username="window_user"),
+        UsageQuerySpec(now - timedelta(hours=1), now, LimitType.REQUESTS, TimeInterval.HOUR_ROLLING, username="window_user"),
+        UsageQuerySpec(now - timedelta(days=1), now, LimitType.COST, TimeInterval.DAY_ROLLING, username="window_user"),
+        UsageQuerySpec(now - timedelta(minutes=5), now, LimitType.INPUT_TOKENS, TimeInterval.MINUTE_ROLLING, username="window_user"),
+        # A single-window scan in the same statement
+        UsageQuerySpec(now - timedelta(hours=1), now, LimitType.COST, TimeInterval.HOUR_ROLLING, model="window-model"),
+    ]
+    statements = []
+    engine = sqlite_backend.connection_manager.engine
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        results = sqlite_backend.get_accounting_entries_for_quota_batch(specs)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    assert [results[spec] for spec in specs] == [1.0, 2.0, 7.0, 1.0, 3.0]
+    for spec in specs:
+        assert results[spec] == sqlite_backend.get_accounting_entries_for_quota(*spec)
+    assert len(statements) == 1
+    assert statements[0].count("UNION ALL") == 1
+
 def test_insert_and_get_usage_limits(sqlite_backend: SQLiteBackend, now_utc: datetime):
     limit1_created_at = (now_utc - timedelta(days=1)).replace(tzinfo=None)
     limit1_updated_at = (now_utc - timedelta(hours=12)).replace(tzinfo=None)
@@ -291,3 +381,43 @@ def test_datetime_precision_and_timezone_handling(sqlite_backend: SQLiteBackend)
     current_utc_aware = datetime.now(timezone.utc)
     assert (current_utc_aware - retrieved_none_dt.created_at).total_seconds() < 10
     assert (current_utc_aware - retrieved_none_dt.updated_at).total_seconds() < 10
+
+
+def test_quota_query_statement_reused_per_filter_combination(sqlite_backend: SQLiteBackend):
+    """Single quota queries reuse one statement per combination of filters."""
+    from sqlalchemy import event
+
+    now = datetime.now(timezone.utc)
+    start_time = now - timedelta(hours=1)
+    statements = []
+    engine = sqlite_backend.connection_manager.engine
+
+    def capture(conn, clauseelement, multiparams, params, execution_options):
+        statements.append(clauseelement)
+
+    event.listen(engine, "before_execute", capture)
+    try:
+        sqlite_backend.get_accounting_entries_for_quota(start_time, now, LimitType.COST, TimeInterval.HOUR, username="alice")
+        sqlite_backend.get_accounting_entries_for_quota(start_time, now, LimitType.COST, TimeInterval.HOUR, username="bob")
+        sqlite_backend.get_accounting_entries_for_quota(start_time, now, LimitType.COST, TimeInterval.HOUR, model="gpt-4")
+    finally:
+        event.remove(engine, "before_execute", capture)
+
+    assert statements[0] is statements[1]
+    assert statements[2] is not statements[0]
+
+
+def test_quota_query_uses_timestamp_index(sqlite_backend: SQLiteBackend):
+    """Quota queries range-scan the timestamp index instead of the whole table."""
+    from sqlalchemy import text
+    from llm_accounting.backends.sqlite_backend_parts.usage_manager import SQLiteUsageManager
+
+    sqlite_backend.initialize()
+    now = datetime.now(timezone.utc)
+    select_clause, where_clause, params = SQLiteUsageManager._build_quota_query(
+        now - timedelta(hours=1), now, LimitType.COST, None, "alice", None, None, None
+    )
+    conn = sqlite_backend.connection_manager.get_connection()
+    plan = conn.execute(text(f"EXPLAIN QUERY PLAN SELECT {select_clause} FROM accounting_entries WHERE {where_clause}"), params).all()
+
+    assert "USING INDEX ix_accounting_entries_timestamp_scope" in plan[0][3]
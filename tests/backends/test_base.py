@@ -1,6 +1,10 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
 import pytest
 
-from llm_accounting.backends.base import BaseBackend, UsageEntry
+from llm_accounting.backends.base import BaseBackend, UsageEntry, UsageQuerySpec
+from llm_accounting.models.limits import LimitType, TimeInterval
 from tests.backends.mock_backends import IncompleteBackend, MockBackend
 
 
@@ -28,3 +32,15 @@ def test_backend_abstract_methods():
     for method in abstract_methods:
         assert hasattr(MockBackend, method), f"MockBackend missing {method}"
         assert callable(getattr(MockBackend, method)), f"{method} is not callable"
+
+
+def test_default_quota_batch_passes_spec_fields_by_name():
+    """The default batch binds every spec field to the parameter of the same name."""
+    backend = MockBackend()
+    now = datetime.now(timezone.utc)
+    spec = UsageQuerySpec(now - timedelta(hours=1), now, LimitType.COST, TimeInterval.HOUR, username="alice")
+
+    with patch.object(backend, "get_accounting_entries_for_quota", return_value=2.5) as get_usage:
+        assert backend.get_accounting_entries_for_quota_batch([spec, spec]) == {spec: 2.5}
+
+    get_usage.assert_called_once_with(**spec._asdict())
@@ -1,8 +1,10 @@
+import sys
 from datetime import datetime
 
 import pytest
 
 from llm_accounting.backends.base import UsageEntry, UsageStats
+from llm_accounting.models.limits import LimitScope, LimitType, TimeInterval, UsageLimitDTO
 
 
 def test_usage_entry_creation():
@@ -117,3 +119,12 @@ def test_usage_stats_creation():
     assert stats.avg_local_total_tokens == 0.0
     assert stats.avg_cost == 0.0
     assert stats.avg_execution_time == 0.0
+
+
+@pytest.mark.skipif(sys.version_info < (3, 10), reason="dataclass slots require Python 3.10+")
+def test_usage_limit_dto_rejects_unknown_attributes():
+    limit = UsageLimitDTO(scope=LimitScope.GLOBAL.value, limit_type=LimitType.REQUESTS.value, max_value=1,
+                          interval_unit=TimeInterval.MINUTE.value, interval_value=1)
+
+    with pytest.raises(AttributeError):
+        limit.unexpected = True
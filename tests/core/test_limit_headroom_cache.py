@@ -0,0 +1,120 @@
+from dataclasses import replace
+from unittest.mock import MagicMock
+
+import pytest
+from freezegun import freeze_time
+
+from llm_accounting.backends.base import TransactionalBackend, UsageEntry
+from llm_accounting.models.limits import LimitScope, LimitType, TimeInterval, UsageLimitDTO
+from llm_accounting.services.quota_service import QuotaService
+
+
+@pytest.fixture
+def mock_backend() -> MagicMock:
+    backend = MagicMock(spec=TransactionalBackend)
+    backend.get_usage_limits.return_value = [
+        UsageLimitDTO(id=1, scope=LimitScope.USER.value, limit_type=LimitType.COST.value, max_value=10.0,
+                      interval_unit=TimeInterval.HOUR.value, interval_value=1, username="alice"),
+        UsageLimitDTO(id=2, scope=LimitScope.GLOBAL.value, limit_type=LimitType.REQUESTS.value, max_value=100,
+                      interval_unit=TimeInterval.MINUTE_ROLLING.value, interval_value=5),
+    ]
+    backend.get_accounting_entries_for_quota.return_value = 4.0
+    return backend
+
+
+def _check(quota_service: QuotaService, cost: float):
+    return quota_service.check_quota_enhanced("gpt-4", "alice", "app", input_tokens=1, cost=cost)
+
+
+@freeze_time("2024-03-15 10:30:00", tz_offset=0)
+def test_request_within_headroom_skips_usage_queries(mock_backend: MagicMock):
+    quota_service = QuotaService(mock_backend, cache_limit_headroom=True)
+
+    assert _check(quota_service, 1.0) == (True, None, None)
+    assert mock_backend.get_accounting_entries_for_quota.call_count == 2
+
+    assert _check(quota_service, 5.0) == (True, None, None)
+    assert mock_backend.get_accounting_entries_for_quota.call_count == 2
+
+
+@freeze_time("2024-03-15 10:30:00", tz_offset=0)
+def test_recorded_usage_reduces_headroom(mock_backend: MagicMock):
+    quota_service = QuotaService(mock_backend, cache_limit_headroom=True)
+    _check(quota_service, 1.0)  # headroom: cost 6.0, requests 96
+
+    quota_service.record_usage(UsageEntry(model="gpt-4", username="alice", cost=3.0))
+    quota_service.record_usage(UsageEntry(model="gpt-4", username="bob", cost=3.0))  # other user's limit only
+    assert _check(quota_service, 2.5) == (True, None, None)
+    assert mock_backend.get_accounting_entries_for_quota.call_count == 2
+
+    # 3.5 no longer fits the remaining 3.0, so usage is queried again.
+    mock_backend.get_accounting_entries_for_quota.return_value = 7.0
+    allowed, reason, _ = _check(quota_service, 3.5)
+    assert allowed is False
+    assert "USER (user: alice)" in reason
+    assert mock_backend.get_accounting_entries_for_quota.call_count == 3
+
+
+def test_fixed_period_rollover_requeries_usage(mock_backend: MagicMock):
+    with freeze_time("2024-03-15 10:59:59", tz_offset=0) as frozen:
+        quota_service = QuotaService(mock_backend, cache_limit_headroom=True)
+        _check(quota_service, 1.0)
+        calls = mock_backend.get_accounting_entries_for_quota.call_count
+
+        frozen.tick(2)
+        _check(quota_service, 1.0)
+
+    # The hourly limit's period changed; the rolling limit's headroom still holds.
+    assert mock_backend.get_accounting_entries_for_quota.call_count > calls
+
+
+@freeze_time("2024-03-15 10:30:00", tz_offset=0)
+def test_headroom_from_previous_limits_not_applied_after_refresh(mock_backend: MagicMock):
+    quota_service = QuotaService(mock_backend, cache_limit_headroom=True)
+    previous_limits = quota_service.cache_manager.sorted_limits_cache
+    mock_backend.get_usage_limits.return_value = [replace(limit) for limit in previous_limits]
+    quota_service.refresh_limits_cache()
+    _check(quota_service, 1.0)  # headroom of the reloaded limits: cost 6.0
+
+    # A check that was still running against the previous limits stores its headroom last
+    mock_backend.get_accounting_entries_for_quota.return_value = 0.0
+    quota_service.limit_evaluator._evaluate_limits_enhanced(previous_limits, "gpt-4", "alice", "app", None, 1, 6.5, 0)
+    mock_backend.get_accounting_entries_for_quota.return_value = 4.0
+    calls = mock_backend.get_accounting_entries_for_quota.call_count
+
+    # 7.0 only fits the stale headroom of 10.0, so usage is queried again and the request denied
+    allowed, reason, _ = _check(quota_service, 7.0)
+    assert allowed is False
+    assert "USER (user: alice)" in reason
+    assert mock_backend.get_accounting_entries_for_quota.call_count > calls
+
+
+@freeze_time("2024-03-15 10:30:00", tz_offset=0)
+def test_headroom_cleared_on_limit_refresh(mock_backend: MagicMock):
+    quota_service = QuotaService(mock_backend, cache_limit_headroom=True)
+    _check(quota_service, 1.0)
+
+    quota_service.refresh_limits_cache()
+    _check(quota_service, 1.0)
+
+    assert mock_backend.get_accounting_entries_for_quota.call_count == 4
+
+
+@freeze_time("2024-03-15 10:30:00", tz_offset=0)
+def test_headroom_cache_disabled_by_default(mock_backend: MagicMock):
+    quota_service = QuotaService(mock_backend)
+    _check(quota_service, 1.0)
+    _check(quota_service, 1.0)
+
+    assert quota_service.headroom_cache is None
+    assert mock_backend.get_accounting_entries_for_quota.call_count == 4
+
+
+@freeze_time("2024-03-15 10:30:00", tz_offset=0)
+def test_headroom_reuses_prepared_usage_filter(mock_backend: MagicMock):
+    quota_service = QuotaService(mock_backend, cache_limit_headroom=True)
+    _check(quota_service, 1.0)
+
+    limit = quota_service.cache_manager.limits_cache[0]
+    prepared = quota_service.cache_manager.prepared_limits[id(limit)]
+    assert quota_service.headroom_cache._headroom[limit.id].usage_filter is prepared.usage_filter
@@ -0,0 +1,112 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from llm_accounting.backends.base import TransactionalBackend
+from llm_accounting.models.limits import LimitScope, LimitType, TimeInterval, UsageLimitDTO
+from llm_accounting.services.quota_service import QuotaService
+from llm_accounting.services.quota_service_parts._cache_manager import PreparedLimit, _prepare_limit
+from llm_accounting.services.quota_service_parts._rejection_stats import REJECTION_DECAY_SECONDS, LimitRejectionStats
+
+MONOTONIC_PATH = "llm_accounting.services.quota_service_parts._rejection_stats.time.monotonic"
+
+
+def _limit(limit_id: int, **kwargs) -> UsageLimitDTO:
+    kwargs.setdefault("scope", LimitScope.GLOBAL.value)
+    kwargs.setdefault("limit_type", LimitType.REQUESTS.value)
+    kwargs.setdefault("max_value", 100)
+    return UsageLimitDTO(id=limit_id, interval_unit=TimeInterval.DAY.value, interval_value=1, **kwargs)
+
+
+def _prepared(limit_id: int, **kwargs) -> PreparedLimit:
+    return _prepare_limit(_limit(limit_id, **kwargs))
+
+
+@pytest.fixture
+def mock_backend() -> MagicMock:
+    backend = MagicMock(spec=TransactionalBackend)
+    backend.get_usage_limits.return_value = [
+        _limit(1, scope=LimitScope.USER.value, limit_type=LimitType.COST.value, max_value=10.0, username="alice"),
+        _limit(2),
+    ]
+    # Only the global request limit is exhausted
+    backend.get_accounting_entries_for_quota.side_effect = (
+        lambda **spec: 100.0 if spec["limit_type"] is LimitType.REQUESTS else 0.0
+    )
+    return backend
+
+
+def _check(quota_service: QuotaService):
+    quota_service._denial_cache.clear()
+    return quota_service.check_quota_enhanced("gpt-4", "alice", "app", input_tokens=1, cost=1.0)
+
+
+def test_rejecting_limit_evaluated_first(mock_backend: MagicMock):
+    quota_service = QuotaService(mock_backend, order_limits_by_rejections=True)
+
+    assert _check(quota_service)[0] is False
+    assert mock_backend.get_accounting_entries_for_quota.call_count == 2
+
+    allowed, reason, _ = _check(quota_service)
+    assert allowed is False
+    assert reason.startswith("GLOBAL limit: 100.00 requests")
+    assert mock_backend.get_accounting_entries_for_quota.call_count == 3
+
+
+def test_rejecting_limit_queried_before_batch(mock_backend: MagicMock):
+    mock_backend.get_usage_limits.return_value.append(_limit(3, limit_type=LimitType.COST.value, max_value=50.0))
+    mock_backend.supports_batched_quota_queries = True
+    mock_backend.get_accounting_entries_for_quota_batch.side_effect = lambda specs: {
+        spec: mock_backend.get_accounting_entries_for_quota.side_effect(**spec._asdict()) for spec in specs
+    }
+    quota_service = QuotaService(mock_backend, order_limits_by_rejections=True)
+
+    assert _check(quota_service)[0] is False
+    assert mock_backend.get_accounting_entries_for_quota_batch.call_count == 1
+    assert mock_backend.get_accounting_entries_for_quota.call_count == 0
+
+    # The global request limit now rejects on its own query, without a batch
+    assert _check(quota_service)[0] is False
+    assert mock_backend.get_accounting_entries_for_quota_batch.call_count == 1
+    assert mock_backend.get_accounting_entries_for_quota.call_count == 1
+
+    # Once it allows the request, the remaining limits are fetched in one batch
+    mock_backend.get_accounting_entries_for_quota.side_effect = lambda **spec: 0.0
+    assert _check(quota_service)[0] is True
+    assert mock_backend.get_accounting_entries_for_quota_batch.call_count == 2
+    assert len(mock_backend.get_accounting_entries_for_quota_batch.call_args.args[0]) == 2
+    assert mock_backend.get_accounting_entries_for_quota.call_count == 2
+
+
+def test_ordering_disabled_by_default(mock_backend: MagicMock):
+    quota_service = QuotaService(mock_backend)
+    _check(quota_service)
+    _check(quota_service)
+
+    assert quota_service.rejection_stats is None
+    assert mock_backend.get_accounting_entries_for_quota.call_count == 4
+
+
+def test_order_is_stable_and_keeps_unlimited_marker_last():
+    stats = LimitRejectionStats()
+    planned = [(_prepared(1), MagicMock()), (_prepared(2), MagicMock()), (_prepared(3), MagicMock()),
+               (_prepared(4, max_value=-1), None)]
+    assert stats.order(planned) is planned
+
+    stats.record(planned[2][0].limit)
+    assert [prepared.limit.id for prepared, _ in stats.order(planned)] == [3, 1, 2, 4]
+
+
+def test_rejection_counts_decay():
+    with patch(MONOTONIC_PATH, return_value=0.0):
+        stats = LimitRejectionStats()
+        for _ in range(4):
+            stats.record(_limit(1))
+        stats.record(_limit(2))
+
+    planned = [(_prepared(2), MagicMock()), (_prepared(1), MagicMock())]
+    with patch(MONOTONIC_PATH, return_value=2 * REJECTION_DECAY_SECONDS):
+        # Two periods later the counts are quartered: limit 1 keeps 1, limit 2 drops out.
+        stats.record(_limit(3))
+    assert [prepared.limit.id for prepared, _ in stats.order(planned)] == [1, 2]
+    assert stats._counts == {1: 1, 3: 1}
@@ -1,11 +1,19 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
 from datetime import datetime, timedelta, timezone
+from itertools import count
 from unittest.mock import MagicMock, call, patch
 import pytest
-from typing import Optional, Dict, Tuple
+from typing import Optional, Dict, List, Tuple
 
-from llm_accounting.models.limits import (LimitScope, LimitType, TimeInterval,
-                                          UsageLimitDTO)
+from llm_accounting.models.limits import (ROLLING_INTERVALS, LimitScope, LimitType,
+                                          TimeInterval, UsageLimitDTO)
 from llm_accounting.services.quota_service import QuotaService
+from llm_accounting.services.quota_service_parts import _cache_manager, _limit_evaluator
+from llm_accounting.services.quota_service_parts._limit_evaluator import (
+    _FIXED_PERIOD_START, _ROLLING_PERIOD_START, _cached_fixed_period_start, _fixed_period_start)
 from llm_accounting.backends.base import TransactionalBackend
 from llm_accounting import LLMAccounting # Added import
 
@@ -14,9 +22,26 @@ def mock_backend() -> MagicMock:
     """Provides a MagicMock instance for TransactionalBackend."""
     backend = MagicMock(spec=TransactionalBackend)
     backend.get_usage_limits.return_value = []
+    backend.get_accounting_entries_for_quota.return_value = 0.0
     return backend
 
 
+def _limit(limit_id: Optional[int] = None, scope: LimitScope = LimitScope.GLOBAL,
+           limit_type: LimitType = LimitType.REQUESTS, max_value: float = 10,
+           interval_unit: TimeInterval = TimeInterval.MINUTE, interval_value: int = 1, **fields) -> UsageLimitDTO:
+    return UsageLimitDTO(id=limit_id, scope=scope.value, limit_type=limit_type.value, max_value=max_value,
+                         interval_unit=interval_unit.value, interval_value=interval_value, **fields)
+
+
+def _limits() -> List[UsageLimitDTO]:
+    """A global request limit plus daily cost limits for alice and bob."""
+    return [
+        _limit(1, max_value=100),
+        _limit(2, LimitScope.USER, LimitType.COST, 10, TimeInterval.DAY, username="alice"),
+        _limit(3, LimitScope.USER, LimitType.COST, 10, TimeInterval.DAY, username="bob"),
+    ]
+
+
 def test_check_quota_no_limits(mock_backend: MagicMock):
     """Test check_quota when no limits are configured (cache is empty)."""
     quota_service = QuotaService(mock_backend)
@@ -338,6 +363,21 @@ def test_check_quota_enhanced_no_limits(mock_backend: MagicMock):
     mock_backend.get_usage_limits.assert_called_once()
 
 
+def test_check_quota_enhanced_no_limits_skips_evaluator(mock_backend: MagicMock):
+    """With an empty limits cache the evaluator is not invoked at all."""
+    quota_service = QuotaService(mock_backend)
+
+    with patch.object(quota_service.limit_evaluator, '_evaluate_limits_enhanced', autospec=True) as mock_evaluate_enhanced:
+        result = quota_service.check_quota_enhanced(
+            model="gpt-4", username="test_user", caller_name="test_caller",
+            input_tokens=100, cost=0.01
+        )
+
+    assert result == (True, None, None)
+    mock_evaluate_enhanced.assert_not_called()
+    mock_backend.get_accounting_entries_for_quota.assert_not_called()
+
+
 def test_check_quota_enhanced_allowed_single_limit(mock_backend: MagicMock):
     """Test check_quota_enhanced when usage is within a single configured limit."""
     now = datetime.now(timezone.utc)
@@ -699,6 +739,38 @@ def test_check_quota_enhanced_cache_expires(mock_backend: MagicMock):
             assert cache_key not in quota_service._denial_cache # Assert cache entry is gone
 
 
+@freeze_time("2024-01-01T10:00:00Z")
+def test_check_quota_enhanced_denial_cache_separates_none_and_empty_project(mock_backend: MagicMock):
+    """A denial cached for ``project_name=None`` must not answer requests for ``""``."""
+    now = datetime.now(timezone.utc)
+    mock_backend.get_usage_limits.return_value = [UsageLimitDTO(
+        id=1, scope=LimitScope.USER.value, limit_type=LimitType.COST.value,
+        max_value=10.0, interval_unit=TimeInterval.MINUTE.value, interval_value=1,
+        username="test_user", created_at=now, updated_at=now
+    )]
+    quota_service = QuotaService(mock_backend)
+    quota_service.refresh_limits_cache()
+    reset_time = now + timedelta(seconds=60)
+
+    with patch.object(quota_service.limit_evaluator, '_evaluate_limits_enhanced', autospec=True) as mock_evaluate_enhanced:
+        mock_evaluate_enhanced.return_value = (False, "Denied by test limit", reset_time)
+        is_allowed, _, _ = quota_service.check_quota_enhanced(
+            model="gpt-4", username="test_user", caller_name="test_caller",
+            input_tokens=0, cost=0.01, project_name=None
+        )
+        assert is_allowed is False
+
+        mock_evaluate_enhanced.reset_mock()
+        mock_evaluate_enhanced.return_value = (True, None, None)
+        is_allowed, reason, retry_after = quota_service.check_quota_enhanced(
+            model="gpt-4", username="test_user", caller_name="test_caller",
+            input_tokens=0, cost=0.01, project_name=""
+        )
+        assert (is_allowed, reason, retry_after) == (True, None, None)
+        mock_evaluate_enhanced.assert_called_once()
+        assert len(quota_service._denial_cache) == 1
+
+
 def test_cache_rebuild_after_inserting_limit(memory_sqlite_backend):
     accounting = LLMAccounting(backend=memory_sqlite_backend)
     # Define request parameters
@@ -792,3 +864,747 @@ def test_cache_rebuild_after_deleting_limit(memory_sqlite_backend):
     # 3. Check again (should be allowed as the limit is gone)
     allowed, reason = accounting.check_quota(model, username, caller_name, input_tokens, cost, project_name=project_name)
     assert allowed is True, f"Request should be allowed after deleting limit, but was denied: {reason}"
+
+
+# --- Tests for the limits cache ---
+
+def test_applicable_limits_are_filtered_and_sorted(mock_backend: MagicMock):
+    mock_backend.get_usage_limits.return_value = _limits()
+    quota_service = QuotaService(mock_backend)
+
+    applicable = quota_service._get_applicable_limits("gpt-4", "alice", "app", None)
+
+    assert [limit.id for limit in applicable] == [2, 1]
+
+
+def test_applicable_limits_index_is_reused_per_fingerprint(mock_backend: MagicMock):
+    mock_backend.get_usage_limits.return_value = _limits()
+    quota_service = QuotaService(mock_backend)
+
+    first = quota_service._get_applicable_limits("gpt-4", "alice", "app", None)
+    with patch.object(quota_service.limit_evaluator, "_should_skip_limit", autospec=True) as mock_skip:
+        second = quota_service._get_applicable_limits("gpt-4", "alice", "app", None)
+
+    assert second is first
+    mock_skip.assert_not_called()
+
+
+def test_applicable_limits_rebuilt_on_refresh(mock_backend: MagicMock):
+    mock_backend.get_usage_limits.return_value = _limits()
+    quota_service = QuotaService(mock_backend)
+    assert [limit.id for limit in quota_service._get_applicable_limits("gpt-4", "alice", "app", None)] == [2, 1]
+
+    mock_backend.get_usage_limits.return_value = _limits()[:1]
+    quota_service.refresh_limits_cache()
+
+    assert [limit.id for limit in quota_service._get_applicable_limits("gpt-4", "alice", "app", None)] == [1]
+
+
+def test_applicable_limits_index_survives_concurrent_eviction(mock_backend: MagicMock, monkeypatch):
+    # A tiny index makes every thread evict entries other threads are reading
+    monkeypatch.setattr(_cache_manager, "APPLICABLE_LIMITS_INDEX_SIZE", 2)
+    mock_backend.get_usage_limits.return_value = _limits()
+    quota_service = QuotaService(mock_backend)
+    start = threading.Barrier(8, timeout=5)
+
+    def check(worker):
+        start.wait()
+        return [
+            [limit.id for limit in quota_service._get_applicable_limits("gpt-4", user, f"app-{worker}-{i}", None)]
+            for i in range(200)
+            for user in ("alice", "bob", "carol")
+        ]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(check, range(8)))
+
+    for result in results:
+        assert result == [[2, 1], [3, 1], [1]] * 200
+
+
+def test_wildcard_fields_rank_as_unconstrained(mock_backend: MagicMock):
+    mock_backend.get_usage_limits.return_value = [
+        _limit(1),
+        _limit(2, LimitScope.USER, username="alice", model="*"),
+        _limit(3, LimitScope.CALLER, username="alice", caller_name="app"),
+    ]
+    quota_service = QuotaService(mock_backend)
+
+    # "*" constrains nothing, so the caller limit is the more specific one
+    assert [limit.id for limit in quota_service._get_applicable_limits("gpt-4", "alice", "app", None)] == [3, 2, 1]
+
+
+def test_project_limit_without_project_applies_to_requests_without_project(mock_backend: MagicMock):
+    mock_backend.get_usage_limits.return_value = _limits() + [_limit(4, LimitScope.PROJECT, model="*")]
+    quota_service = QuotaService(mock_backend)
+
+    assert [limit.id for limit in quota_service._get_applicable_limits("gpt-4", "alice", "app", None)] == [2, 1, 4]
+    assert [limit.id for limit in quota_service._get_applicable_limits("gpt-4", "alice", "app", "p1")] == [2, 1]
+    assert [limit.id for limit in quota_service._get_applicable_limits("gpt-4", "bob", None, None)] == [3, 1, 4]
+
+
+def test_get_remaining_limits_uses_applicable_index(mock_backend: MagicMock):
+    mock_backend.get_usage_limits.return_value = _limits()
+    quota_service = QuotaService(mock_backend)
+    quota_service._get_applicable_limits("gpt-4", "alice", "app", None)
+
+    with patch.object(quota_service.limit_evaluator, "_should_skip_limit", autospec=True) as mock_skip:
+        mock_skip.return_value = False
+        remaining = quota_service.get_remaining_limits("gpt-4", "alice", "app", None)
+
+    assert [(limit.id, value) for limit, value in remaining] == [(2, 10.0), (1, 100.0)]
+    # Only the two applicable limits are evaluated; bob's limit is never considered.
+    assert mock_skip.call_count == 2
+
+
+def test_candidate_limits_match_full_scan(mock_backend: MagicMock):
+    limits = [
+        _limit(1, LimitScope.GLOBAL, model="ignored-for-global"),
+        _limit(2, LimitScope.MODEL, model="gpt-4"),
+        _limit(3, LimitScope.MODEL, model="*"),
+        _limit(4, LimitScope.USER, username="alice", model="gpt-4"),
+        _limit(5, LimitScope.CALLER, caller_name="app", username="bob"),
+        _limit(6, LimitScope.PROJECT, project_name="p1"),
+        _limit(7, LimitScope.PROJECT),
+        _limit(8, LimitScope.USER, username=""),
+    ]
+    mock_backend.get_usage_limits.return_value = limits
+    quota_service = QuotaService(mock_backend)
+    should_skip = quota_service.limit_evaluator._should_skip_limit
+
+    for request in [("gpt-4", "alice", "app", None), ("gpt-4", "bob", "app", "p1"), (None, None, None, None),
+                    ("claude", "alice", None, "p2")]:
+        expected = [lim.id for lim in quota_service.cache_manager.sorted_limits_cache if not should_skip(lim, *request)]
+        actual = [lim.id for lim in quota_service._get_applicable_limits(*request)]
+        assert actual == expected
+
+    candidates = quota_service.cache_manager.candidate_limits("claude", "carol", None, None)
+    assert 2 not in [lim.id for lim in candidates]
+    assert 4 not in [lim.id for lim in candidates]
+
+
+def test_limits_reloaded_after_ttl(mock_backend: MagicMock):
+    mock_backend.get_usage_limits.return_value = _limits()
+    with patch.object(_cache_manager.time, "monotonic", return_value=100.0):
+        quota_service = QuotaService(mock_backend, limits_ttl_seconds=60)
+    quota_service._denial_cache["stale"] = ("reason", MagicMock())
+    mock_backend.get_usage_limits.return_value = _limits()[:1]
+
+    with patch.object(_cache_manager.time, "monotonic", return_value=150.0):
+        assert [limit.id for limit in quota_service._get_applicable_limits("gpt-4", "alice", "app", None)] == [2, 1]
+    assert mock_backend.get_usage_limits.call_count == 1
+
+    with patch.object(_cache_manager.time, "monotonic", return_value=161.0):
+        assert [limit.id for limit in quota_service._get_applicable_limits("gpt-4", "alice", "app", None)] == [1]
+    assert mock_backend.get_usage_limits.call_count == 2
+    assert quota_service._denial_cache == {}
+
+
+def test_limits_not_reloaded_without_ttl(mock_backend: MagicMock):
+    mock_backend.get_usage_limits.return_value = _limits()
+    quota_service = QuotaService(mock_backend)
+
+    with patch.object(_cache_manager.time, "monotonic", return_value=1e9):
+        quota_service._get_applicable_limits("gpt-4", "alice", "app", None)
+
+    assert mock_backend.get_usage_limits.call_count == 1
+
+
+def test_refresh_keeps_previous_limits_readable_until_swap(mock_backend: MagicMock):
+    mock_backend.get_usage_limits.return_value = _limits()
+    quota_service = QuotaService(mock_backend)
+    cache_manager = quota_service.cache_manager
+    seen_during_load = []
+
+    def load_limits():
+        seen_during_load.append([limit.id for limit in quota_service._get_applicable_limits("gpt-4", "alice", "app", None)])
+        return _limits()[:1]
+
+    mock_backend.get_usage_limits.side_effect = load_limits
+    generation = cache_manager.limits_generation
+    quota_service.refresh_limits_cache()
+
+    assert seen_during_load == [[2, 1]]
+    assert cache_manager.limits_generation == generation + 1
+    assert [limit.id for limit in quota_service._get_applicable_limits("gpt-4", "alice", "app", None)] == [1]
+
+
+def test_checks_run_concurrently_with_refresh(mock_backend: MagicMock):
+    loads = count()
+
+    def load_limits():
+        # Every load hands out new limits whose ids record which load they came from
+        load = next(loads)
+        return [
+            _limit(load * 10 + 1, max_value=100),
+            _limit(load * 10 + 2, LimitScope.USER, LimitType.COST, 10, TimeInterval.DAY, username="alice"),
+        ]
+
+    mock_backend.get_usage_limits.side_effect = load_limits
+    quota_service = QuotaService(mock_backend, cache_limit_headroom=True)
+    refreshing = threading.Event()
+    refreshing.set()
+
+    def check(_):
+        seen = []
+        while refreshing.is_set():
+            assert quota_service.check_quota_enhanced("gpt-4", "alice", "app", input_tokens=1, cost=1.0)[0] is True
+            seen.append([limit.id for limit in quota_service._get_applicable_limits("gpt-4", "alice", "app", None)])
+        return seen
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        checks = [pool.submit(check, worker) for worker in range(4)]
+        for _ in range(200):
+            quota_service.refresh_limits_cache()
+        refreshing.clear()
+        seen = [ids for result in checks for ids in result.result()]
+
+    # Each answer came from one load, most specific limit first
+    assert seen
+    assert all(len(ids) == 2 and ids[0] == ids[1] + 1 and ids[0] % 10 == 2 for ids in seen)
+    last_load = next(loads) - 1
+    assert [limit.id for limit in quota_service._get_applicable_limits("gpt-4", "alice", "app", None)] == [
+        last_load * 10 + 2, last_load * 10 + 1,
+    ]
+
+
+def test_background_refresh_swaps_in_new_limits(mock_backend: MagicMock):
+    mock_backend.get_usage_limits.return_value = _limits()
+    reloaded = threading.Event()
+
+    def reload_limits():
+        reloaded.set()
+        return _limits()[:1]
+
+    quota_service = QuotaService(mock_backend, limits_ttl_seconds=0.01, refresh_limits_in_background=True)
+    quota_service._denial_cache["stale"] = ("reason", MagicMock())
+    mock_backend.get_usage_limits.side_effect = reload_limits
+    try:
+        assert reloaded.wait(5)
+        for _ in range(500):
+            applicable = quota_service._get_applicable_limits("gpt-4", "alice", "app", None)
+            if [limit.id for limit in applicable] == [1]:
+                break
+            threading.Event().wait(0.01)
+        assert [limit.id for limit in applicable] == [1]
+        assert quota_service._denial_cache == {}
+    finally:
+        quota_service.close()
+
+
+def test_background_refresh_requires_ttl(mock_backend: MagicMock):
+    with pytest.raises(ValueError, match="limits_ttl_seconds"):
+        QuotaService(mock_backend, refresh_limits_in_background=True)
+
+
+def test_background_refresh_failure_keeps_cached_limits(mock_backend: MagicMock):
+    mock_backend.get_usage_limits.return_value = _limits()
+    failed = threading.Event()
+
+    def fail():
+        failed.set()
+        raise RuntimeError("database unavailable")
+
+    quota_service = QuotaService(mock_backend, limits_ttl_seconds=0.01, refresh_limits_in_background=True)
+    mock_backend.get_usage_limits.side_effect = fail
+    try:
+        assert failed.wait(5)
+        assert [limit.id for limit in quota_service._get_applicable_limits("gpt-4", "alice", "app", None)] == [2, 1]
+    finally:
+        quota_service.close()
+
+
+def test_get_period_start_fixed_intervals_match_uncached(mock_backend: MagicMock):
+    quota_service = QuotaService(mock_backend)
+    fixed_units = [TimeInterval.SECOND, TimeInterval.MINUTE, TimeInterval.HOUR,
+                   TimeInterval.DAY, TimeInterval.WEEK, TimeInterval.MONTH]
+    current_time = datetime(2023, 12, 29, 22, 59, 58, 999999, tzinfo=timezone.utc)
+    for _ in range(40):
+        current_time += timedelta(hours=7, minutes=13, seconds=1)
+        for unit in fixed_units:
+            for value in (1, 2, 3, 5):
+                expected = _fixed_period_start(current_time.replace(microsecond=0), unit, value)
+                assert quota_service.limit_evaluator._get_period_start(current_time, unit, value) == expected
+
+
+def test_get_period_start_fixed_interval_is_memoized(mock_backend: MagicMock):
+    quota_service = QuotaService(mock_backend)
+    first = quota_service.limit_evaluator._get_period_start(datetime(2024, 3, 15, 10, 30, 1, tzinfo=timezone.utc), TimeInterval.HOUR, 1)
+    second = quota_service.limit_evaluator._get_period_start(datetime(2024, 3, 15, 10, 45, 59, tzinfo=timezone.utc), TimeInterval.HOUR, 1)
+
+    assert first == datetime(2024, 3, 15, 10, 0, 0, tzinfo=timezone.utc)
+    # Both times fall in the same bucket, so the memoized start is handed out again
+    assert second is first
+
+
+def test_get_period_start_rolling_intervals(mock_backend: MagicMock):
+    quota_service = QuotaService(mock_backend)
+    current_time = datetime(2024, 3, 15, 10, 37, 45, 123456, tzinfo=timezone.utc)
+    truncated = current_time.replace(microsecond=0)
+    expected = {
+        TimeInterval.SECOND_ROLLING: truncated - timedelta(seconds=3),
+        TimeInterval.MINUTE_ROLLING: truncated - timedelta(minutes=3),
+        TimeInterval.HOUR_ROLLING: truncated - timedelta(hours=3),
+        TimeInterval.DAY_ROLLING: truncated - timedelta(days=3),
+        TimeInterval.WEEK_ROLLING: truncated - timedelta(weeks=3),
+        TimeInterval.MONTH_ROLLING: datetime(2023, 12, 1, tzinfo=timezone.utc),
+    }
+    for unit, period_start in expected.items():
+        assert quota_service.limit_evaluator._get_period_start(current_time, unit, 3) == period_start
+
+
+def test_get_period_start_epoch_math_matches_datetime_rules(mock_backend: MagicMock):
+    _cached_fixed_period_start.cache_clear()
+    quota_service = QuotaService(mock_backend)
+    current_time = datetime(1969, 12, 20, 3, 4, 5, 678901, tzinfo=timezone.utc)
+    for _ in range(60):
+        current_time += timedelta(days=3, hours=5, minutes=17, seconds=11)
+        truncated = current_time.replace(microsecond=0)
+        for unit, period_start_fn in list(_FIXED_PERIOD_START.items()) + list(_ROLLING_PERIOD_START.items()):
+            for value in (1, 2, 3, 7):
+                assert quota_service.limit_evaluator._get_period_start(current_time, unit, value) == period_start_fn(truncated, value), (unit, value, current_time)
+
+
+@freeze_time("2024-03-15 10:30:45.250000", tz_offset=0)
+def test_evaluation_derives_period_starts_from_epoch_seconds(mock_backend: MagicMock):
+    mock_backend.get_usage_limits.return_value = [
+        UsageLimitDTO(id=1, scope=LimitScope.GLOBAL.value, limit_type=LimitType.REQUESTS.value, max_value=100,
+                      interval_unit=TimeInterval.HOUR.value, interval_value=1),
+        UsageLimitDTO(id=2, scope=LimitScope.GLOBAL.value, limit_type=LimitType.COST.value, max_value=100,
+                      interval_unit=TimeInterval.MINUTE_ROLLING.value, interval_value=5),
+    ]
+    mock_backend.get_accounting_entries_for_quota.return_value = 0.0
+    quota_service = QuotaService(mock_backend)
+
+    with patch.object(quota_service.limit_evaluator, "_get_period_start",
+                      wraps=quota_service.limit_evaluator._get_period_start) as period_start_spy:
+        assert quota_service.check_quota_enhanced("gpt-4", "alice", "app", input_tokens=1, cost=1.0)[0] is True
+
+    period_start_spy.assert_not_called()
+    start_times = [mock_call.kwargs["start_time"] for mock_call in mock_backend.get_accounting_entries_for_quota.call_args_list]
+    assert start_times == [
+        datetime(2024, 3, 15, 10, 0, 0, tzinfo=timezone.utc),
+        datetime(2024, 3, 15, 10, 25, 45, tzinfo=timezone.utc),
+    ]
+
+
+@pytest.mark.parametrize("current_time, unit, value, expected", [
+    (datetime(2024, 1, 31, 23, 59, 59, tzinfo=timezone.utc), TimeInterval.MONTH_ROLLING, 1, datetime(2023, 12, 1, tzinfo=timezone.utc)),
+    (datetime(2024, 3, 1, 0, 0, 0, tzinfo=timezone.utc), TimeInterval.MONTH_ROLLING, 14, datetime(2023, 1, 1, tzinfo=timezone.utc)),
+    (datetime(2024, 2, 29, 12, 0, 0, tzinfo=timezone.utc), TimeInterval.MONTH, 5, datetime(2023, 10, 1, tzinfo=timezone.utc)),
+    (datetime(2024, 12, 31, 23, 59, 59, tzinfo=timezone.utc), TimeInterval.MONTH, 12, datetime(2024, 1, 1, tzinfo=timezone.utc)),
+])
+def test_get_period_start_month_lookups(mock_backend: MagicMock, current_time, unit, value, expected):
+    quota_service = QuotaService(mock_backend)
+
+    assert quota_service.limit_evaluator._get_period_start(current_time, unit, value) == expected
+
+
+@freeze_time("2024-03-15 10:30:45", tz_offset=0)
+def test_period_start_resolved_once_per_interval_within_check(mock_backend: MagicMock):
+    mock_backend.get_usage_limits.return_value = [
+        UsageLimitDTO(id=limit_id, scope=LimitScope.GLOBAL.value, limit_type=limit_type.value, max_value=100,
+                      interval_unit=TimeInterval.MINUTE_ROLLING.value, interval_value=5)
+        for limit_id, limit_type in enumerate((LimitType.REQUESTS, LimitType.COST, LimitType.INPUT_TOKENS))
+    ]
+    mock_backend.get_accounting_entries_for_quota.return_value = 0.0
+    quota_service = QuotaService(mock_backend)
+
+    with patch.object(_limit_evaluator, "_utc_period_start", wraps=_limit_evaluator._utc_period_start) as spy:
+        assert quota_service.check_quota_enhanced("gpt-4", "alice", "app", input_tokens=1, cost=1.0)[0] is True
+
+    assert spy.call_count == 1
+    assert mock_backend.get_accounting_entries_for_quota.call_count == 3
+
+
+def test_get_period_start_non_utc_inputs_keep_calendar_rules(mock_backend: MagicMock):
+    quota_service = QuotaService(mock_backend)
+    cest = timezone(timedelta(hours=2))
+    current_time = datetime(2024, 3, 31, 23, 59, 59, 500000, tzinfo=cest)
+    for unit, period_start_fn in list(_FIXED_PERIOD_START.items()) + list(_ROLLING_PERIOD_START.items()):
+        for value in (1, 3):
+            period_start = quota_service.limit_evaluator._get_period_start(current_time, unit, value)
+            assert period_start == period_start_fn(current_time.replace(microsecond=0), value), (unit, value)
+            assert period_start.tzinfo is cest
+
+
+@pytest.mark.parametrize("value, expected", [
+    (2, datetime(2024, 1, 1, tzinfo=timezone(timedelta(hours=2)))),
+    (3, datetime(2023, 12, 1, tzinfo=timezone(timedelta(hours=2)))),
+    (27, datetime(2021, 12, 1, tzinfo=timezone(timedelta(hours=2)))),
+])
+def test_month_rolling_period_start_crosses_years(mock_backend: MagicMock, value, expected):
+    current_time = datetime(2024, 3, 10, 8, 0, 0, tzinfo=timezone(timedelta(hours=2)))
+
+    assert QuotaService(mock_backend).limit_evaluator._get_period_start(
+        current_time, TimeInterval.MONTH_ROLLING, value
+    ) == expected
+
+
+@pytest.mark.parametrize("unit, value, expected", [
+    (TimeInterval.SECOND, 10, datetime(2024, 3, 15, 10, 0, 10, tzinfo=timezone.utc)),
+    (TimeInterval.DAY, 2, datetime(2024, 3, 17, 10, 0, 0, tzinfo=timezone.utc)),
+    (TimeInterval.WEEK, 1, datetime(2024, 3, 22, 10, 0, 0, tzinfo=timezone.utc)),
+    (TimeInterval.MONTH, 10, datetime(2025, 1, 1, tzinfo=timezone.utc)),
+    (TimeInterval.MONTH, 34, datetime(2027, 1, 1, tzinfo=timezone.utc)),
+    (TimeInterval.MINUTE_ROLLING, 5, datetime(2024, 3, 15, 10, 5, 0, tzinfo=timezone.utc)),
+    (TimeInterval.WEEK_ROLLING, 2, datetime(2024, 3, 29, 10, 0, 0, tzinfo=timezone.utc)),
+    (TimeInterval.MONTH_ROLLING, 10, datetime(2025, 1, 15, 10, 0, 0, tzinfo=timezone.utc)),
+    (TimeInterval.MONTH_ROLLING, 25, datetime(2026, 4, 15, 10, 0, 0, tzinfo=timezone.utc)),
+])
+def test_calculate_reset_timestamp_per_unit(mock_backend: MagicMock, unit, value, expected):
+    limit = UsageLimitDTO(scope=LimitScope.GLOBAL.value, limit_type=LimitType.REQUESTS.value, max_value=1,
+                          interval_unit=unit.value, interval_value=value)
+    period_start = datetime(2024, 3, 15, 10, 0, 0, 123456, tzinfo=timezone.utc)
+
+    assert QuotaService(mock_backend).limit_evaluator._calculate_reset_timestamp(period_start, limit, unit) == expected
+
+
+@pytest.mark.parametrize("limit_type, expected", [
+    (LimitType.REQUESTS, 1.0),
+    (LimitType.INPUT_TOKENS, 10.0),
+    (LimitType.OUTPUT_TOKENS, 4.0),
+    (LimitType.TOTAL_TOKENS, 14.0),
+    (LimitType.COST, 0.5),
+])
+def test_calculate_request_value_per_limit_type(mock_backend: MagicMock, limit_type, expected):
+    evaluator = QuotaService(mock_backend).limit_evaluator
+
+    assert evaluator._calculate_request_value(limit_type, 10, 4, 0.5) == expected
+
+
+def test_rolling_intervals_match_is_rolling():
+    assert ROLLING_INTERVALS == {unit for unit in TimeInterval if unit.value.endswith("_rolling")}
+    assert all(unit.is_rolling() == (unit in ROLLING_INTERVALS) for unit in TimeInterval)
+
+
+def test_evaluation_uses_supplied_now(mock_backend: MagicMock):
+    limit = UsageLimitDTO(id=1, scope=LimitScope.GLOBAL.value, limit_type=LimitType.REQUESTS.value, max_value=1,
+                          interval_unit=TimeInterval.HOUR.value, interval_value=1)
+    mock_backend.get_accounting_entries_for_quota.return_value = 1.0
+    evaluator = QuotaService(mock_backend).limit_evaluator
+    now = datetime(2024, 3, 15, 12, 30, 0, tzinfo=timezone(timedelta(hours=2)))
+
+    with patch("llm_accounting.services.quota_service_parts._limit_evaluator.datetime") as mock_datetime:
+        allowed, _, reset_timestamp = evaluator._evaluate_limits_enhanced(
+            [limit], "gpt-4", "alice", "app", None, 1, 1.0, 0, now=now
+        )
+
+    mock_datetime.now.assert_not_called()
+    assert allowed is False
+    assert reset_timestamp == datetime(2024, 3, 15, 11, 0, 0, tzinfo=timezone.utc)
+    query = mock_backend.get_accounting_entries_for_quota.call_args.kwargs
+    assert query["start_time"] == datetime(2024, 3, 15, 10, 0, 0, tzinfo=timezone.utc)
+    assert query["end_time"] == now
+
+
+def test_get_remaining_limits_reads_clock_once(mock_backend: MagicMock):
+    mock_backend.get_usage_limits.return_value = [
+        UsageLimitDTO(id=limit_id, scope=LimitScope.GLOBAL.value, limit_type=LimitType.REQUESTS.value, max_value=10,
+                      interval_unit=unit.value, interval_value=1)
+        for limit_id, unit in enumerate((TimeInterval.HOUR, TimeInterval.DAY, TimeInterval.MINUTE_ROLLING))
+    ]
+    mock_backend.get_accounting_entries_for_quota.return_value = 4.0
+    quota_service = QuotaService(mock_backend)
+
+    remaining = quota_service.get_remaining_limits("gpt-4", "alice", "app", None)
+
+    assert [value for _, value in remaining] == [6.0, 6.0, 6.0]
+    end_times = {mock_call.kwargs["end_time"] for mock_call in mock_backend.get_accounting_entries_for_quota.call_args_list}
+    assert len(end_times) == 1
+
+
+# --- Tests for limit evaluation ---
+
+def test_allowed_path_does_not_read_clock(mock_backend: MagicMock):
+    mock_backend.get_usage_limits.return_value = _limits()
+    quota_service = QuotaService(mock_backend)
+
+    with patch.object(quota_service.limit_evaluator, "_evaluate_limits_enhanced", autospec=True) as mock_evaluate, \
+         patch("llm_accounting.services.quota_service.datetime") as mock_datetime:
+        mock_evaluate.return_value = (True, None, None)
+        result = quota_service.check_quota_enhanced("gpt-4", "alice", "app", input_tokens=1, cost=0.0)
+
+    assert result == (True, None, None)
+    mock_datetime.now.assert_not_called()
+
+
+def test_no_limits_allows_without_evaluation(mock_backend: MagicMock):
+    quota_service = QuotaService(mock_backend)
+
+    with patch.object(_limit_evaluator, "datetime") as mock_datetime:
+        assert quota_service.limit_evaluator._evaluate_limits_enhanced(
+            [], "gpt-4", "alice", "app", None, 1, 1.0, 0
+        ) == (True, None, None)
+
+    mock_datetime.now.assert_not_called()
+
+
+def test_batched_backend_fetches_usage_in_one_call(mock_backend: MagicMock):
+    mock_backend.get_usage_limits.return_value = _limits()
+    mock_backend.supports_batched_quota_queries = True
+    mock_backend.get_accounting_entries_for_quota_batch.side_effect = lambda specs: {spec: 0.0 for spec in specs}
+    quota_service = QuotaService(mock_backend)
+
+    allowed, reason, retry_after = quota_service.check_quota_enhanced("gpt-4", "alice", "app", input_tokens=1, cost=1.0)
+
+    assert (allowed, reason, retry_after) == (True, None, None)
+    mock_backend.get_accounting_entries_for_quota_batch.assert_called_once()
+    specs = mock_backend.get_accounting_entries_for_quota_batch.call_args.args[0]
+    assert [(spec.limit_type, spec.username) for spec in specs] == [
+        (LimitType.COST, "alice"),
+        (LimitType.REQUESTS, None),
+    ]
+    mock_backend.get_accounting_entries_for_quota.assert_not_called()
+
+
+def test_single_limit_queries_usage_directly(mock_backend: MagicMock):
+    mock_backend.get_usage_limits.return_value = _limits()[:1]
+    mock_backend.supports_batched_quota_queries = True
+    quota_service = QuotaService(mock_backend)
+
+    assert quota_service.check_quota_enhanced("gpt-4", "alice", "app", input_tokens=1, cost=1.0)[0] is True
+
+    mock_backend.get_accounting_entries_for_quota_batch.assert_not_called()
+    mock_backend.get_accounting_entries_for_quota.assert_called_once()
+
+
+def test_batched_backend_denial_uses_prefetched_usage(mock_backend: MagicMock):
+    mock_backend.get_usage_limits.return_value = _limits()
+    mock_backend.supports_batched_quota_queries = True
+    mock_backend.get_accounting_entries_for_quota_batch.side_effect = lambda specs: {spec: 9.5 for spec in specs}
+    quota_service = QuotaService(mock_backend)
+
+    allowed, reason, retry_after = quota_service.check_quota_enhanced("gpt-4", "alice", "app", input_tokens=1, cost=1.0)
+
+    assert allowed is False
+    assert "USER (user: alice) limit: 10.00 cost per 1 day" in reason
+    assert retry_after is not None and retry_after > 0
+    mock_backend.get_accounting_entries_for_quota.assert_not_called()
+
+
+def test_backend_queries_stop_at_first_exceeded_limit(mock_backend: MagicMock):
+    mock_backend.get_usage_limits.return_value = _limits()
+    mock_backend.get_accounting_entries_for_quota.return_value = 9.5
+    quota_service = QuotaService(mock_backend)
+
+    allowed, _, _ = quota_service.check_quota_enhanced("gpt-4", "alice", "app", input_tokens=1, cost=1.0)
+
+    assert allowed is False
+    # Evaluation stopped at the first exceeded limit
+    assert mock_backend.get_accounting_entries_for_quota.call_count == 1
+
+
+def test_identical_usage_queries_issued_once_per_check(mock_backend: MagicMock):
+    # Same user, window and limit type; only the thresholds differ
+    mock_backend.get_usage_limits.return_value = [
+        _limit(1, LimitScope.USER, LimitType.COST, 10.0, TimeInterval.DAY, username="alice"),
+        _limit(2, LimitScope.USER, LimitType.COST, 20.0, TimeInterval.DAY, username="alice", caller_name="*"),
+    ]
+    mock_backend.get_accounting_entries_for_quota.return_value = 5.0
+    quota_service = QuotaService(mock_backend)
+
+    assert quota_service.check_quota_enhanced("gpt-4", "alice", "app", input_tokens=1, cost=1.0) == (True, None, None)
+    assert mock_backend.get_accounting_entries_for_quota.call_count == 1
+
+
+def test_usage_queries_filter_by_limit_fields(mock_backend: MagicMock):
+    mock_backend.get_usage_limits.return_value = _limits() + [
+        _limit(4, LimitScope.PROJECT, LimitType.COST, 2.0000004, TimeInterval.DAY)
+    ]
+    mock_backend.get_accounting_entries_for_quota.return_value = 1.0
+    quota_service = QuotaService(mock_backend)
+
+    # 1.0 + 1.0 fits the project limit once it is rounded to 2.0
+    assert quota_service.check_quota_enhanced("gpt-4", "alice", None, input_tokens=1, cost=1.0)[0] is True
+    calls = mock_backend.get_accounting_entries_for_quota.call_args_list
+    assert [(mock_call.kwargs["limit_type"], mock_call.kwargs["interval_unit"], mock_call.kwargs["username"],
+             mock_call.kwargs["filter_project_null"]) for mock_call in calls] == [
+        (LimitType.COST, TimeInterval.DAY, "alice", None),
+        (LimitType.REQUESTS, TimeInterval.MINUTE, None, None),
+        (LimitType.COST, TimeInterval.DAY, None, True),
+    ]
+
+
+def test_violation_message_names_scope_and_limit(mock_backend: MagicMock):
+    mock_backend.get_usage_limits.return_value = _limits()
+    mock_backend.get_accounting_entries_for_quota.return_value = 9.5
+    quota_service = QuotaService(mock_backend)
+
+    allowed, reason, _ = quota_service.check_quota_enhanced("gpt-4", "alice", "app", input_tokens=1, cost=1.0)
+    assert allowed is False
+    assert reason == "USER (user: alice) limit: 10.00 cost per 1 day exceeded. Current usage: 9.50, request: 1.00."
+
+
+@pytest.mark.parametrize("scope, fields, expected", [
+    (LimitScope.GLOBAL, {}, "GLOBAL"),
+    (LimitScope.USER, {"username": "alice"}, "USER (user: alice)"),
+    (LimitScope.USER, {}, "USER"),
+    (LimitScope.MODEL, {"model": "gpt-4"}, "MODEL (model: gpt-4)"),
+    (LimitScope.CALLER, {"username": "alice", "caller_name": "app"}, "CALLER (user: alice, caller: app)"),
+    (LimitScope.CALLER, {"caller_name": "app"}, "CALLER (caller: app)"),
+    (LimitScope.CALLER, {}, "CALLER"),
+    (LimitScope.PROJECT, {"project_name": "p1"}, "PROJECT (project: p1)"),
+    (LimitScope.PROJECT, {}, "PROJECT (no project)"),
+])
+def test_violation_message_per_scope(mock_backend: MagicMock, scope, fields, expected):
+    mock_backend.get_usage_limits.return_value = [_limit(1, scope, LimitType.COST, 1.0, TimeInterval.DAY, **fields)]
+    mock_backend.get_accounting_entries_for_quota.return_value = 1.0
+    quota_service = QuotaService(mock_backend)
+
+    allowed, reason, _ = quota_service.check_quota_enhanced("gpt-4", "alice", "app", input_tokens=1, cost=0.5,
+                                                            project_name=fields.get("project_name"))
+
+    assert allowed is False
+    assert reason.startswith(f"{expected} limit: 1.00 cost per 1 day exceeded.")
+
+
+@pytest.mark.parametrize("scope, fields, request_fields, applies", [
+    (LimitScope.GLOBAL, {"model": "other"}, ("gpt-4", "alice", "app", "p1"), True),
+    (LimitScope.MODEL, {"model": "gpt-4"}, ("gpt-4", None, None, None), True),
+    (LimitScope.MODEL, {"model": "gpt-4"}, ("claude", None, None, None), False),
+    (LimitScope.USER, {"username": "*", "model": ""}, ("claude", "bob", None, None), True),
+    (LimitScope.CALLER, {"username": "alice", "caller_name": "app"}, ("gpt-4", "alice", "cli", None), False),
+    (LimitScope.PROJECT, {"project_name": "p1"}, ("gpt-4", "alice", "app", "p2"), False),
+    (LimitScope.PROJECT, {}, ("gpt-4", "alice", "app", "p1"), False),
+    (LimitScope.PROJECT, {}, ("gpt-4", "alice", "app", None), True),
+    (LimitScope.USER, {}, ("gpt-4", "alice", "app", "p1"), True),
+])
+def test_limit_applies_only_to_matching_requests(mock_backend: MagicMock, scope, fields, request_fields, applies):
+    mock_backend.get_accounting_entries_for_quota.return_value = 1.0
+    model, username, caller_name, project_name = request_fields
+
+    # Limits that were never loaded through the cache manager are handled too
+    limit = _limit(1, scope, max_value=1, **fields)
+    evaluator = QuotaService(mock_backend).limit_evaluator
+    allowed, _, _ = evaluator._evaluate_limits_enhanced([limit], model, username, caller_name, project_name, 1, 0.0, 0)
+    assert allowed is not applies
+
+    mock_backend.get_usage_limits.return_value = [_limit(1, scope, max_value=1, **fields)]
+    quota_service = QuotaService(mock_backend)
+    allowed, _, _ = quota_service.check_quota_enhanced(model, username, caller_name, input_tokens=1, cost=0.0,
+                                                       project_name=project_name)
+    assert allowed is not applies
+
+
+def test_should_skip_limit_accepts_prepared_limit(mock_backend: MagicMock):
+    evaluator = QuotaService(mock_backend).limit_evaluator
+    limit = _limit(scope=LimitScope.USER, limit_type=LimitType.COST, username="alice")
+    prepared = _cache_manager._prepare_limit(limit)
+
+    assert evaluator._should_skip_limit(limit, "gpt-4", "bob", None, None) is True
+    assert evaluator._should_skip_limit(limit, "gpt-4", "bob", None, None, prepared) is True
+    assert evaluator._should_skip_limit(limit, "gpt-4", "alice", None, None, prepared) is False
+
+
+def test_loaded_limits_keep_their_dataclass_fields(mock_backend: MagicMock):
+    mock_backend.get_usage_limits.return_value = _limits()
+    cache_manager = QuotaService(mock_backend).cache_manager
+    limit = cache_manager.limits_cache[0]
+
+    # Derived values live beside the limits, so the DTOs are left untouched
+    assert asdict(limit) == asdict(_limits()[0])
+    assert cache_manager.prepared_limits[id(limit)].limit is limit
+
+
+def test_limits_built_outside_cache_evaluate_consistently(mock_backend: MagicMock):
+    evaluator = QuotaService(mock_backend).limit_evaluator
+    limit = _limit(scope=LimitScope.USER, limit_type=LimitType.COST, max_value=1, interval_unit=TimeInterval.DAY,
+                   username="alice")
+
+    for _ in range(2):
+        assert evaluator._evaluate_limits_enhanced([limit], "gpt-4", "alice", "app", None, 1, 0.5, 0)[0] is True
+        assert evaluator._evaluate_limits_enhanced([limit], "gpt-4", "bob", "app", None, 1, 5.0, 0)[0] is True
+
+    # Only alice's requests query usage, always filtered to her entries
+    calls = mock_backend.get_accounting_entries_for_quota.call_args_list
+    assert [(mock_call.kwargs["username"], mock_call.kwargs["interval_unit"]) for mock_call in calls] == [
+        ("alice", TimeInterval.DAY), ("alice", TimeInterval.DAY),
+    ]
+
+
+def test_evaluation_skips_applicability_checks_for_indexed_limits(mock_backend: MagicMock):
+    mock_backend.get_usage_limits.return_value = _limits()
+    quota_service = QuotaService(mock_backend)
+    quota_service._get_applicable_limits("gpt-4", "alice", "app", None)
+
+    with patch.object(quota_service.limit_evaluator, "_should_skip_limit", autospec=True) as mock_skip:
+        assert quota_service.check_quota_enhanced("gpt-4", "alice", "app", input_tokens=1, cost=1.0)[0] is True
+
+    mock_skip.assert_not_called()
+    assert mock_backend.get_accounting_entries_for_quota.call_count == 2
+
+
+def test_unlimited_global_limit_allows_without_applicability_checks(mock_backend: MagicMock):
+    unlimited = _limit(9, LimitScope.GLOBAL, LimitType.COST, -1, TimeInterval.DAY)
+    evaluator = QuotaService(mock_backend).limit_evaluator
+
+    with patch.object(evaluator, "_should_skip_limit", autospec=True) as mock_skip:
+        result = evaluator._evaluate_limits_enhanced([unlimited] + _limits(), "gpt-4", "alice", "app", None, 1, 1.0, 0)
+
+    assert result == (True, None, None)
+    mock_skip.assert_not_called()
+    mock_backend.get_accounting_entries_for_quota.assert_not_called()
+
+
+def test_unlimited_limit_for_other_user_does_not_allow(mock_backend: MagicMock):
+    unlimited_bob = _limit(9, LimitScope.USER, LimitType.COST, -1, TimeInterval.DAY, username="bob")
+    mock_backend.get_accounting_entries_for_quota.return_value = 9.5
+    evaluator = QuotaService(mock_backend).limit_evaluator
+
+    allowed, reason, _ = evaluator._evaluate_limits_enhanced([unlimited_bob] + _limits()[1:2], "gpt-4", "alice", "app",
+                                                             None, 1, 1.0, 0)
+
+    assert allowed is False
+    assert "USER (user: alice)" in reason
+
+
+@pytest.mark.parametrize("limit_type, max_value, allowed", [
+    (LimitType.REQUESTS, 1, True),
+    (LimitType.INPUT_TOKENS, 10, True),
+    (LimitType.INPUT_TOKENS, 9, False),
+    (LimitType.OUTPUT_TOKENS, 4, False),
+    (LimitType.TOTAL_TOKENS, 15, True),
+    (LimitType.TOTAL_TOKENS, 14, False),
+    (LimitType.COST, 0.25, True),
+])
+def test_request_value_selected_per_limit_type(mock_backend: MagicMock, limit_type, max_value, allowed):
+    mock_backend.get_usage_limits.return_value = [_limit(1, limit_type=limit_type, max_value=max_value)]
+    quota_service = QuotaService(mock_backend)
+
+    result = quota_service.check_quota_enhanced("gpt-4", "alice", "app", input_tokens=10, cost=0.25,
+                                                completion_tokens=5)
+    assert result[0] is allowed
+
+
+@pytest.mark.parametrize("limit_type, current_usage, max_value, allowed", [
+    (LimitType.COST, 0.1, 0.3, True),  # 0.1 + 0.2 is 0.30000000000000004
+    (LimitType.COST, 0.1, 0.29, False),
+    (LimitType.INPUT_TOKENS, 90.0, 100, True),
+    (LimitType.INPUT_TOKENS, 91.0, 100, False),
+])
+def test_comparison_tolerance_only_applies_to_cost(mock_backend: MagicMock, limit_type, current_usage, max_value,
+                                                   allowed):
+    mock_backend.get_usage_limits.return_value = [_limit(1, limit_type=limit_type, max_value=max_value)]
+    mock_backend.get_accounting_entries_for_quota.return_value = current_usage
+    quota_service = QuotaService(mock_backend)
+
+    result = quota_service.check_quota_enhanced("gpt-4", "alice", "app", input_tokens=10, cost=0.2)
+    assert result[0] is allowed
+
+
+def test_debug_logging_formats_lazily(mock_backend: MagicMock):
+    mock_backend.get_usage_limits.return_value = _limits()[:1]
+    quota_service = QuotaService(mock_backend)
+
+    with patch.object(_limit_evaluator, "logger") as mock_logger:
+        mock_logger.isEnabledFor.return_value = False
+        quota_service.check_quota_enhanced("gpt-4", "alice", "app", input_tokens=1, cost=1.0)
+        mock_logger.debug.assert_not_called()
+
+        mock_logger.isEnabledFor.return_value = True
+        quota_service.check_quota_enhanced("gpt-4", "alice", "app", input_tokens=1, cost=1.0)
+
+    mock_logger.isEnabledFor.assert_called_with(logging.DEBUG)
+    # Arguments are passed through for the logger to format
+    mock_logger.debug.assert_any_call("Current usage calculated: %s", 0.0)
@@ -0,0 +1,141 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from llm_accounting import LLMAccounting
+from llm_accounting.backends.base import UsageEntry, UsageQuerySpec
+from llm_accounting.models.limits import LimitScope, LimitType, TimeInterval
+from llm_accounting.services.quota_service_parts._usage_window import RollingUsageWindow, rolling_window_seconds
+
+NOW = datetime(2024, 3, 15, 10, 30, 0, tzinfo=timezone.utc)
+TIME_PATH = "llm_accounting.services.quota_service_parts._usage_window.time.time"
+
+
+def _entry(seconds_ago: float, **kwargs) -> UsageEntry:
+    kwargs.setdefault("model", "gpt-4")
+    return UsageEntry(timestamp=NOW - timedelta(seconds=seconds_ago), **kwargs)
+
+
+def _spec(window_seconds: int, limit_type: LimitType = LimitType.COST, **filters) -> UsageQuerySpec:
+    return UsageQuerySpec(NOW - timedelta(seconds=window_seconds), NOW, limit_type, TimeInterval.MINUTE_ROLLING, **filters)
+
+
+def _window() -> RollingUsageWindow:
+    with patch(TIME_PATH, return_value=(NOW - timedelta(minutes=10)).timestamp()):
+        return RollingUsageWindow()
+
+
+def test_usage_sums_matching_buckets_in_window():
+    window = _window()
+    with patch(TIME_PATH, return_value=NOW.timestamp()):
+        window.record(_entry(90, username="alice", cost=5.0, prompt_tokens=1), horizon_seconds=3600)
+        window.record(_entry(30, username="alice", cost=1.0, prompt_tokens=10, project="p1"), horizon_seconds=3600)
+        window.record(_entry(30.5, username="alice", cost=2.0, prompt_tokens=20), horizon_seconds=3600)
+        window.record(_entry(10, username="bob", cost=4.0, prompt_tokens=40), horizon_seconds=3600)
+
+    assert window.usage(_spec(60), 1) == 7.0
+    assert window.usage(_spec(60, username="alice"), 1) == 3.0
+    assert window.usage(_spec(120, username="alice"), 1) == 8.0
+    assert window.usage(_spec(60, LimitType.REQUESTS, username="alice"), 1) == 2.0
+    assert window.usage(_spec(60, LimitType.INPUT_TOKENS, filter_project_null=True), 1) == 60.0
+    assert window.usage(_spec(60, LimitType.INPUT_TOKENS, project_name="p1"), 1) == 10.0
+    assert window.usage(_spec(60, model="other"), 1) == 0.0
+
+
+def test_usage_unknown_before_coverage_or_after_pruning():
+    window = _window()
+    assert window.usage(_spec(60 * 60), 1) is None
+
+    with patch(TIME_PATH, return_value=NOW.timestamp()):
+        window.record(_entry(5, cost=1.0), horizon_seconds=60)
+    assert window.usage(_spec(60), 1) == 1.0
+
+    with patch(TIME_PATH, return_value=NOW.timestamp() + 120):
+        window.record(_entry(-120, cost=1.0), horizon_seconds=60)
+    # The first bucket was pruned, so windows reaching back to it are unknown.
+    assert window.usage(_spec(60), 1) is None
+
+
+def test_usage_unknown_when_entries_recorded_after_window_end():
+    window = _window()
+    with patch(TIME_PATH, return_value=NOW.timestamp()):
+        window.record(_entry(-5, cost=1.0), horizon_seconds=60)
+
+    assert window.usage(_spec(60), 1) is None
+
+
+def test_rolling_window_seconds():
+    assert rolling_window_seconds(TimeInterval.MINUTE_ROLLING, 5) == 300
+    assert rolling_window_seconds(TimeInterval.MONTH_ROLLING, 1) == 2 * 31 * 86400
+    assert rolling_window_seconds(TimeInterval.DAY, 1) == 0
+
+
+def test_accounting_checks_rolling_limits_from_memory(sqlite_backend):
+    accounting = LLMAccounting(backend=sqlite_backend, track_rolling_usage_in_memory=True)
+    accounting.set_usage_limit(
+        scope=LimitScope.USER,
+        limit_type=LimitType.REQUESTS,
+        max_value=2,
+        interval_unit=TimeInterval.MINUTE_ROLLING,
+        interval_value=1,
+        username="window_user",
+    )
+    # Pretend tracking started long enough ago to cover the whole window
+    accounting.quota_service.usage_window._covered_from = 0
+
+    with patch.object(sqlite_backend, "get_accounting_entries_for_quota_batch",
+                      wraps=sqlite_backend.get_accounting_entries_for_quota_batch) as batch_spy:
+        assert accounting.check_quota("gpt-4", "window_user", "app", input_tokens=1)[0] is True
+        accounting.track_usage(model="gpt-4", username="window_user", caller_name="app", prompt_tokens=1)
+        accounting.track_usage(model="gpt-4", username="window_user", caller_name="app", prompt_tokens=1)
+        allowed, reason = accounting.check_quota("gpt-4", "window_user", "app", input_tokens=1)
+
+    assert allowed is False
+    assert "USER (user: window_user)" in reason
+    batch_spy.assert_not_called()
+    assert sqlite_backend.get_accounting_entries_for_quota(
+        datetime.now(timezone.utc) - timedelta(minutes=1), datetime.now(timezone.utc),
+        LimitType.REQUESTS, TimeInterval.MINUTE_ROLLING, username="window_user",
+    ) == 2.0
+
+
+def test_running_sum_adds_new_and_drops_expired_usage():
+    window = _window()
+
+    def spec_at(offset: int) -> UsageQuerySpec:
+        end = NOW + timedelta(seconds=offset)
+        return UsageQuerySpec(end - timedelta(seconds=60), end, LimitType.COST, TimeInterval.MINUTE_ROLLING, username="alice")
+
+    with patch(TIME_PATH, return_value=NOW.timestamp()):
+        window.record(_entry(50, username="alice", cost=1.0), horizon_seconds=3600)
+        window.record(_entry(20, username="alice", cost=2.0), horizon_seconds=3600)
+    assert window.usage(spec_at(0), 1) == 3.0
+    # The entry from 50 seconds before NOW leaves the window.
+    assert window.usage(spec_at(12), 1) == 2.0
+
+    with patch(TIME_PATH, return_value=NOW.timestamp() + 15):
+        window.record(_entry(-15, username="alice", cost=4.0), horizon_seconds=3600)
+        window.record(_entry(-15, username="bob", cost=8.0), horizon_seconds=3600)
+    assert window.usage(spec_at(15), 1) == 6.0
+    assert window.usage(spec_at(45), 1) == 4.0
+    assert window.usage(spec_at(200), 1) == 0.0
+    # Moving the window start backwards rebuilds the sum from the buckets.
+    assert window.usage(spec_at(15), 1) == 6.0
+
+
+def test_running_sum_drops_expired_usage_when_recording():
+    window = _window()
+    spec = _spec(60, username="alice")
+    with patch(TIME_PATH, return_value=NOW.timestamp()):
+        window.record(_entry(10, username="alice", cost=1.0), horizon_seconds=3600)
+    assert window.usage(spec, 1) == 1.0
+    running_sum = window._running_sums[((None, "alice", None, None, None), TimeInterval.MINUTE_ROLLING, 1)]
+
+    # Recording without reading still drops usage that left the minute window
+    for offset in range(1, 600):
+        with patch(TIME_PATH, return_value=NOW.timestamp() + offset):
+            window.record(_entry(-offset, username="alice", cost=1.0), horizon_seconds=3600)
+    assert len(running_sum.contributions) <= 61
+
+    end = NOW + timedelta(seconds=599)
+    spec = UsageQuerySpec(end - timedelta(seconds=60), end, LimitType.COST, TimeInterval.MINUTE_ROLLING, username="alice")
+    assert window.usage(spec, 1) == 61.0
@@ -0,0 +1,95 @@
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+import pytest
+from freezegun import freeze_time
+
+from llm_accounting import LLMAccounting
+from llm_accounting.backends.base import TransactionalBackend, UsageEntry, UsageQuerySpec
+from llm_accounting.models.limits import LimitScope, LimitType, TimeInterval, UsageLimitDTO
+from llm_accounting.services.quota_service import QuotaService
+from llm_accounting.services.quota_service_parts._usage_query_cache import UsageQueryCache
+
+
+@pytest.fixture
+def mock_backend() -> MagicMock:
+    backend = MagicMock(spec=TransactionalBackend)
+    backend.get_usage_limits.return_value = [
+        UsageLimitDTO(id=1, scope=LimitScope.USER.value, limit_type=LimitType.COST.value, max_value=10.0,
+                      interval_unit=TimeInterval.HOUR.value, interval_value=1, username="alice"),
+        UsageLimitDTO(id=2, scope=LimitScope.GLOBAL.value, limit_type=LimitType.REQUESTS.value, max_value=100,
+                      interval_unit=TimeInterval.DAY.value, interval_value=1),
+    ]
+    backend.get_accounting_entries_for_quota.return_value = 4.0
+    return backend
+
+
+def _check(quota_service: QuotaService):
+    return quota_service.check_quota_enhanced("gpt-4", "alice", "app", input_tokens=1, cost=1.0)
+
+
+def test_results_reused_until_usage_recorded(mock_backend: MagicMock):
+    with freeze_time("2024-03-15 10:30:00", tz_offset=0) as frozen:
+        quota_service = QuotaService(mock_backend, cache_usage_queries=True)
+        assert _check(quota_service) == (True, None, None)
+        frozen.tick(5)
+        assert _check(quota_service) == (True, None, None)
+        assert mock_backend.get_accounting_entries_for_quota.call_count == 2
+
+        quota_service.record_usage(UsageEntry(model="gpt-4", username="alice", cost=1.0))
+        _check(quota_service)
+        assert mock_backend.get_accounting_entries_for_quota.call_count == 4
+
+
+def test_period_rollover_queries_again(mock_backend: MagicMock):
+    with freeze_time("2024-03-15 10:59:59", tz_offset=0) as frozen:
+        quota_service = QuotaService(mock_backend, cache_usage_queries=True)
+        _check(quota_service)
+        frozen.tick(2)
+        _check(quota_service)
+
+    # Only the hourly limit's window moved on
+    assert mock_backend.get_accounting_entries_for_quota.call_count == 3
+
+
+@freeze_time("2024-03-15 10:30:00", tz_offset=0)
+def test_usage_query_cache_disabled_by_default(mock_backend: MagicMock):
+    quota_service = QuotaService(mock_backend)
+    _check(quota_service)
+    _check(quota_service)
+
+    assert quota_service.usage_query_cache is None
+    assert mock_backend.get_accounting_entries_for_quota.call_count == 4
+
+
+def test_results_fetched_before_invalidation_are_not_stored():
+    cache = UsageQueryCache()
+    now = datetime(2024, 3, 15, 10, 30, tzinfo=timezone.utc)
+    spec = UsageQuerySpec(now.replace(minute=0), now, LimitType.COST, TimeInterval.HOUR)
+    generation = cache.generation
+
+    cache.invalidate()
+    cache.store(spec, 4.0, generation)
+    assert cache.get(spec) is None
+
+    cache.store(spec, 4.0, cache.generation)
+    assert cache.get(spec._replace(end_time=now.replace(minute=45))) == 4.0
+
+
+def test_tracked_usage_invalidates_cached_results(sqlite_backend):
+    accounting = LLMAccounting(backend=sqlite_backend, cache_usage_queries=True)
+    accounting.set_usage_limit(
+        scope=LimitScope.USER,
+        limit_type=LimitType.REQUESTS,
+        max_value=1,
+        interval_unit=TimeInterval.DAY,
+        interval_value=1,
+        username="cached_user",
+    )
+
+    assert accounting.check_quota("gpt-4", "cached_user", "app", input_tokens=1)[0] is True
+    accounting.track_usage(model="gpt-4", username="cached_user", caller_name="app", prompt_tokens=1)
+    allowed, reason = accounting.check_quota("gpt-4", "cached_user", "app", input_tokens=1)
+
+    assert allowed is False
+    assert "USER (user: cached_user)" in reason
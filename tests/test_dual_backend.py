@@ -10,6 +10,7 @@ def test_separate_audit_backend_usage():
     # Configure list_users on the mock to return an empty list (iterable)
     usage_backend.list_users.return_value = []
     usage_backend.list_projects.return_value = [] # Also for projects cache
+    usage_backend.get_usage_limits.return_value = []  # And for the limits cache indices
 
     audit_backend = Mock(spec=AuditBackend)
 